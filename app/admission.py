@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException, Request
+
+from app.settings import (
+    INGEST_MAX_CONCURRENT,
+    INGEST_MAX_QUEUE,
+    INGEST_QUEUE_TIMEOUT_SECS,
+    INGEST_RETRY_AFTER_SECS,
+    INGEST_SOURCE_BURST,
+    INGEST_SOURCE_RATE,
+)
+
+log = logging.getLogger(__name__)
+
+SOURCE_HEADER = "X-Ingest-Source"
+_MAX_SOURCES = 1024  # rate-limit buckets kept; the least recently used are dropped
+
+
+def too_busy(detail: str, retry_after: float) -> HTTPException:
+    """429 with a Retry-After hint (whole seconds, at least 1)."""
+    return HTTPException(429, detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class TokenBucket:
+    """
+    Records-per-second limit for one source. A request is admitted while the
+    bucket is not empty and then pays for all its records, possibly going into
+    debt; big batches are never refused outright, they just delay the next one.
+    """
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def take(self, n: int) -> float:
+        """Charge `n` records; returns 0, or the seconds to wait before retrying (nothing charged)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens <= 0:
+            return -self.tokens / self.rate + 1e-3
+        self.tokens -= n
+        return 0.0
+
+
+class AdmissionController:
+    """
+    Back-pressure for ingest endpoints.
+
+    * At most `max_concurrent` ingests write at a time; up to `max_queue` more
+      wait (on the event loop, not on a worker thread) for `queue_timeout` seconds.
+      Beyond that requests get 429 + Retry-After, so a burst of collectors can't
+      occupy the whole request thread pool and starve the read endpoints.
+    * Background ingest jobs take the same slots from their worker threads
+      (`acquire_blocking`), queued in the same line, but they wait instead of
+      getting 429.
+    * Optional per-source record rate (`rate` records/sec, `burst` bucket size);
+      rate <= 0 disables it.
+    """
+    def __init__(
+        self,
+        max_concurrent: int = INGEST_MAX_CONCURRENT,
+        max_queue: int = INGEST_MAX_QUEUE,
+        queue_timeout: float = INGEST_QUEUE_TIMEOUT_SECS,
+        retry_after: float = INGEST_RETRY_AFTER_SECS,
+        rate: float = INGEST_SOURCE_RATE,
+        burst: float = INGEST_SOURCE_BURST,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: "deque[asyncio.Future | threading.Event]" = deque()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.rejected = 0
+
+    # ----------------------------------------------------------------
+    # Concurrency slots
+    # ----------------------------------------------------------------
+    async def acquire(self) -> None:
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise too_busy("Ingest queue is full, retry later", self.retry_after)
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                queued = fut in self._waiters
+                if queued:
+                    self._waiters.remove(fut)
+            if not queued:
+                # a slot was handed over just as we gave up: pass it on
+                self.release()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.note_rejected()
+            raise too_busy(f"No ingest slot free after {self.queue_timeout:g}s, retry later", self.retry_after)
+
+    def note_rejected(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def acquire_blocking(self, timeout: float | None = None) -> bool:
+        """
+        Take a slot from a worker thread (ingest jobs), waiting up to `timeout`
+        seconds. Never refused: returns False on timeout so the caller can check
+        for cancellation and wait again.
+        """
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return True
+            event = threading.Event()
+            self._waiters.append(event)
+        if event.wait(timeout):
+            return True
+        with self._lock:
+            if event in self._waiters:
+                self._waiters.remove(event)
+                return False
+        return True  # a slot was handed over just as we gave up: keep it
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # hand the slot straight to the oldest waiter; _active is unchanged
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                else:
+                    waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+            else:
+                self._active -= 1
+
+    # ----------------------------------------------------------------
+    # Per-source record rate
+    # ----------------------------------------------------------------
+    def charge(self, source: str, records: int) -> float:
+        """Seconds `source` must wait before sending more (0 = admitted and charged)."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get(source)
+            if bucket is None:
+                bucket = self._buckets[source] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > _MAX_SOURCES:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(source)
+            return bucket.take(records)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active": self._active, "queued": len(self._waiters),
+                    "max_concurrent": self.max_concurrent, "max_queue": self.max_queue,
+                    "rejected": self.rejected}
+
+
+def _wake(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+@dataclass
+class IngestSlot:
+    """What an admitted ingest request holds: its source key and the controller."""
+    controller: AdmissionController
+    source: str
+
+    def charge(self, records: int) -> None:
+        """Rate-limit a whole payload up front: 429 if the source is over its rate."""
+        wait = self.controller.charge(self.source, records)
+        if wait:
+            self.controller.note_rejected()
+            raise too_busy(f"Ingest rate limit exceeded for source {self.source!r}", wait)
+
+    async def throttle(self, records: int) -> None:
+        """Rate-limit a stream chunk by pausing (TCP back-pressure); 429 if the wait is too long."""
+        waited = 0.0
+        while wait := self.controller.charge(self.source, records):
+            if waited + wait > self.controller.queue_timeout:
+                self.controller.note_rejected()
+                raise too_busy(f"Ingest rate limit exceeded for source {self.source!r}", wait)
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+# --------------------------------------------------------------------
+# Process-wide controller (FastAPI dependencies)
+# --------------------------------------------------------------------
+_controller: AdmissionController | None = None
+_controller_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
+
+
+def source_of(request: Request) -> str:
+    """Rate-limit key: the X-Ingest-Source header, else the client address."""
+    source = request.headers.get(SOURCE_HEADER, "").strip()
+    if source:
+        return source[:128]
+    return request.client.host if request.client else "unknown"
+
+
+async def ingest_slot(request: Request, controller: AdmissionController = Depends(get_admission)):
+    """Dependency: wait for (or be refused) a concurrency slot, held until the handler returns."""
+    await controller.acquire()
+    try:
+        yield IngestSlot(controller, source_of(request))
+    finally:
+        controller.release()
@@ -0,0 +1,258 @@
+"""
+Versioned response cache for the read endpoints.
+
+Every commit that wrote something bumps a process-wide data version (a
+Session event, like the app registry's publish-on-commit). GET responses
+of the read endpoints are kept in an LRU keyed by (path, query, version),
+so a repeated read between two ingests is answered from memory and never
+reaches SQLite; the first read after a write misses because the version
+moved. Each cached body has a content hash ETag: a client that sends it
+back in If-None-Match gets 304 Not Modified without a body.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from app.settings import (
+    RESPONSE_CACHE_MAX_BODY_BYTES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECS,
+)
+
+log = logging.getLogger(__name__)
+
+# GET paths served through the cache (everything in app/routers/read.py)
+CACHEABLE_PREFIXES = ("/users", "/devices", "/apps", "/ci/", "/search", "/stats", "/changes")
+
+_WROTE = "response_cache_wrote"  # Session.info key: this transaction executed a write
+
+
+# --------------------------------------------------------------------
+# Data version
+# --------------------------------------------------------------------
+_version = 0
+_version_lock = threading.Lock()
+
+
+def data_version() -> int:
+    return _version
+
+
+def bump_data_version() -> int:
+    """Invalidate every cached response (they are keyed by the old version)."""
+    global _version
+    with _version_lock:
+        _version += 1
+        return _version
+
+
+_READ_VERBS = ("select", "with", "pragma", "explain")
+
+
+def _is_write(statement) -> bool:
+    if isinstance(statement, TextClause):  # raw SQL: anything that isn't a read
+        return not statement.text.lstrip().lower().startswith(_READ_VERBS)
+    return statement.is_dml
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_write(state) -> None:
+    if _is_write(state.statement):  # ORM or Core DML through Session.execute
+        state.session.info[_WROTE] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _note_flush(session: Session, flush_context) -> None:
+    session.info[_WROTE] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session: Session) -> None:
+    if session.in_nested_transaction():
+        return  # a savepoint was released; the outer transaction can still roll back
+    if session.info.pop(_WROTE, False):
+        bump_data_version()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_write(session: Session) -> None:
+    if not session.in_nested_transaction():
+        session.info.pop(_WROTE, None)
+
+
+# --------------------------------------------------------------------
+# LRU of finished responses
+# --------------------------------------------------------------------
+@dataclass(frozen=True)
+class CachedResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+    stored_at: float
+
+
+class ResponseCache:
+    """
+    LRU of responses for one data version; a newer version empties it. Bounded
+    by entry count and by the total size of the cached bodies.
+    """
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_body_bytes: int = RESPONSE_CACHE_MAX_BODY_BYTES,
+                 ttl_secs: float = RESPONSE_CACHE_TTL_SECS,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self.max_bytes = max_bytes
+        self.ttl_secs = ttl_secs
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+        self._bytes = 0  # sum of len(body) over _entries
+        self._version = data_version()
+        self.hits = self.misses = self.not_modified = 0
+
+    def _sync_version(self, version: int) -> None:
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        self._bytes -= len(self._entries.pop(key).body)
+
+    def get(self, key: Tuple[str, str], version: int) -> Optional[CachedResponse]:
+        with self._lock:
+            self._sync_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_secs and time.monotonic() - entry.stored_at > self.ttl_secs:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple[str, str], version: int, entry: CachedResponse) -> None:
+        size = len(entry.body)
+        if self.max_entries <= 0 or size > self.max_body_bytes or size > self.max_bytes:
+            return
+        with self._lock:
+            if version < self._version:
+                return  # computed before a write that has since committed
+            self._sync_version(version)
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += size
+            # evict least recently used entries until both bounds hold
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"version": self._version, "entries": len(self._entries), "bytes": self._bytes,
+                "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+
+response_cache = ResponseCache()
+
+
+# --------------------------------------------------------------------
+# ASGI middleware
+# --------------------------------------------------------------------
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ResponseCacheMiddleware:
+    """Serve cacheable GETs from `cache` and answer If-None-Match with 304."""
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "GET"
+                or not scope["path"].startswith(CACHEABLE_PREFIXES)):
+            return await self.app(scope, receive, send)
+
+        # the same query in any parameter order is the same entry
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+        key = (scope["path"], query)
+        version = data_version()
+        if_none_match = _header(scope, b"if-none-match")
+
+        entry = self.cache.get(key, version)
+        if entry is None:
+            entry = await self._render(scope, receive, send, key, version)
+            if entry is None:
+                return  # not a 200: already sent as-is
+
+        if _etag_matches(if_none_match, entry.etag):
+            self.cache.not_modified += 1
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(b"etag", entry.etag.encode()), (b"cache-control", b"no-cache")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _render(self, scope, receive, send, key, version) -> Optional[CachedResponse]:
+        """Run the endpoint and buffer a 200 response; anything else is passed through."""
+        start: Dict = {}
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def capture(message):
+            nonlocal passthrough
+            if message["type"] == "http.response.start":
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start.update(message)
+            elif passthrough:
+                await send(message)
+            else:
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        if passthrough or not start:
+            return None
+
+        body = b"".join(chunks)
+        etag = _etag(body)
+        headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"etag", b"cache-control")]
+        headers += [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        entry = CachedResponse(200, headers, body, etag, time.monotonic())
+        self.cache.put(key, version, entry)
+        return entry
@@ -0,0 +1,140 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models import ChangeLog, ChangeLogState
+from app.settings import CHANGE_LOG_MAX_ENTRIES, CHANGE_LOG_RETENTION_DAYS
+
+log = logging.getLogger(__name__)
+
+PRUNED_THROUGH = "pruned_through"
+
+
+def _utcnow() -> datetime:
+    # naive UTC, like the timestamps ingest stores
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# --------------------------------------------------------------------
+# Writing (called from the ingest write paths, inside their transaction)
+# --------------------------------------------------------------------
+def record_changes(db: Session, kind: str, changes: Iterable[Tuple[str, str]]) -> int:
+    """
+    Append one entry per (ci_id, op) with a single executemany.
+    Runs in the caller's transaction/savepoint, so entries only exist for writes that commit.
+    """
+    now = _utcnow()
+    rows = [{"kind": kind, "ci_id": ci_id, "op": op, "changed_at": now} for ci_id, op in changes]
+    if rows:
+        db.execute(insert(ChangeLog.__table__), rows)
+    return len(rows)
+
+
+# --------------------------------------------------------------------
+# Reading (GET /changes)
+# --------------------------------------------------------------------
+def _pruned_through(db: Session) -> int:
+    return db.scalar(select(ChangeLogState.value).where(ChangeLogState.key == PRUNED_THROUGH)) or 0
+
+
+def read_changes(db: Session, since: int, limit: int) -> Dict[str, Any]:
+    """
+    Entries with seq > `since`, oldest first, at most `limit` of them.
+    Within a page each CI appears once, at its latest entry.
+    `reset` is True when entries after `since` were pruned: the consumer
+    missed changes and should do a full resync before continuing.
+    """
+    rows = db.execute(
+        select(ChangeLog.seq, ChangeLog.kind, ChangeLog.ci_id, ChangeLog.op, ChangeLog.changed_at)
+        .where(ChangeLog.seq > since)
+        .order_by(ChangeLog.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for seq, kind, ci_id, op, changed_at in rows:
+        key = (kind, ci_id)
+        first = latest.pop(key, None)
+        # a CI inserted and then updated within the page is still new to the consumer
+        latest[key] = {"seq": seq, "kind": kind, "id": ci_id,
+                       "op": "insert" if first and first["op"] == "insert" else op,
+                       "changed_at": changed_at}
+
+    return {
+        "changes": list(latest.values()),
+        "next_cursor": rows[-1].seq if rows else since,
+        "has_more": has_more,
+        "reset": since < _pruned_through(db),
+    }
+
+
+# --------------------------------------------------------------------
+# Compaction and retention
+# --------------------------------------------------------------------
+def compact_change_log(
+    db: Session,
+    retention_days: Optional[float] = CHANGE_LOG_RETENTION_DAYS,
+    max_entries: Optional[int] = CHANGE_LOG_MAX_ENTRIES,
+) -> Dict[str, int]:
+    """
+    1. Compaction: drop entries superseded by a newer entry for the same CI.
+       Safe for every consumer; whatever cursor they hold, they still reach
+       the newer entry.
+    2. Retention: drop entries older than `retention_days` and all but the
+       newest `max_entries`. Consumers whose cursor is behind the pruned
+       range get `reset: true` from read_changes. None disables either limit.
+    The caller commits.
+    """
+    latest = select(func.max(ChangeLog.seq)).group_by(ChangeLog.kind, ChangeLog.ci_id)
+    compacted = db.execute(delete(ChangeLog).where(ChangeLog.seq.not_in(latest))).rowcount
+
+    cutoff_seq = 0
+    if retention_days is not None:
+        cutoff = _utcnow() - timedelta(days=retention_days)
+        cutoff_seq = db.scalar(select(func.max(ChangeLog.seq)).where(ChangeLog.changed_at < cutoff)) or 0
+    if max_entries is not None:
+        over = db.scalar(
+            select(ChangeLog.seq).order_by(ChangeLog.seq.desc()).offset(max_entries).limit(1)
+        )
+        cutoff_seq = max(cutoff_seq, over or 0)
+
+    pruned = 0
+    if cutoff_seq:
+        pruned = db.execute(delete(ChangeLog).where(ChangeLog.seq <= cutoff_seq)).rowcount
+        if cutoff_seq > _pruned_through(db):
+            stmt = sqlite_insert(ChangeLogState.__table__).values(key=PRUNED_THROUGH, value=cutoff_seq)
+            db.execute(stmt.on_conflict_do_update(index_elements=[ChangeLogState.key],
+                                                  set_={"value": stmt.excluded.value}))
+
+    remaining = db.scalar(select(func.count()).select_from(ChangeLog))
+    log.info("change log compacted: superseded=%d pruned=%d remaining=%d", compacted, pruned, remaining)
+    return {"compacted": compacted, "pruned": pruned, "remaining": remaining}
+
+
+def run_compaction(session_factory) -> Dict[str, int]:
+    """Compact with the configured limits in a session of its own and commit."""
+    db = session_factory()
+    try:
+        result = compact_change_log(db)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def change_entries(rows: List[Dict[str, Any]], pk: str, existed) -> List[Tuple[str, str]]:
+    """(ci_id, op) per distinct written row; the first write of an unknown id is an insert."""
+    ops: Dict[str, str] = {}
+    for row in rows:
+        ci_id = row[pk]
+        ops.setdefault(ci_id, "update" if ci_id in existed else "insert")
+    return list(ops.items())
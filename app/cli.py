@@ -0,0 +1,303 @@
+"""
+Command-line entry point:  python -m app <command> ...
+
+  import           Load JSON / NDJSON / CSV dumps straight into the database,
+                   normalizing across a process pool with a single writer.
+  compact-changes  Compact the change log and apply its retention limits.
+  migrate          Apply pending schema migrations (or list them with --status).
+  rebuild-search   Re-index every CI for /search (e.g. after VACUUM).
+  rebuild-stats    Recount the /stats summary counters from the CI tables.
+"""
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+
+from app.changelog import compact_change_log
+from app.db import SessionLocal, engine
+from app.migrations import MIGRATIONS, applied_versions, run_migrations
+from app.normalizers import get_default_normalizer
+from app.normalizers.rules import norm_bool_from_phrase
+from app.repositories import (
+    kind_of, prepare_device_rows, prepare_okta_rows, upsert_device_rows, upsert_okta_rows,
+)
+from app.search import SEARCH_TABLES, rebuild_search_index
+from app.settings import CHANGE_LOG_MAX_ENTRIES, CHANGE_LOG_RETENTION_DAYS
+from app.setup_logging import setup_logging
+from app.stats import rebuild_stats
+
+log = logging.getLogger(__name__)
+
+# CSV cells holding lists use this separator, e.g. apps="Slack;Zoom"
+CSV_LIST_COLUMNS = {"apps", "groups"}
+CSV_LIST_SEP = ";"
+
+
+# --------------------------------------------------------------------
+# Readers: yield (format, chunk) pairs; parsing happens in the workers
+# --------------------------------------------------------------------
+def _detect_format(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if suffix == ".csv":
+        return "csv"
+    return "json"
+
+
+def _read_chunks(path: Path, fmt: str, size: int) -> Iterator[tuple[str, list[tuple[int, object]]]]:
+    """
+    Chunks of (line, raw record) pairs. `line` is the source line for NDJSON and
+    CSV (where the row ends) and the 1-based position in a JSON array; import
+    errors carry it so a bad row can be found in the dump.
+    """
+    if fmt == "json":
+        # a JSON array has to be parsed whole; workers still do the normalization
+        with path.open("rb") as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError(f"{path}: expected a JSON array of records")
+        for i in range(0, len(data), size):
+            yield "records", list(enumerate(data[i:i + size], i + 1))
+    elif fmt == "ndjson":
+        with path.open("rb") as f:
+            numbered = enumerate(f, 1)
+            while chunk := list(islice(numbered, size)):
+                yield "ndjson", chunk
+    elif fmt == "csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            numbered = ((reader.line_num, row) for row in reader)
+            while chunk := list(islice(numbered, size)):
+                yield "csv", chunk
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+
+def _from_csv(row: dict) -> dict:
+    """CSV cells are all strings: drop empty cells, split list cells, parse mfa_enabled."""
+    rec = {}
+    for k, v in row.items():
+        if k is None or v is None or v == "":
+            continue
+        if k in CSV_LIST_COLUMNS:
+            v = [x.strip() for x in v.split(CSV_LIST_SEP) if x.strip()]
+        elif k == "mfa_enabled":
+            v = norm_bool_from_phrase(v)
+        rec[k] = v
+    return rec
+
+
+# --------------------------------------------------------------------
+# Worker side: parse + validate + normalize one chunk
+# --------------------------------------------------------------------
+_normalizer = None
+
+
+def _prepare_chunk(item: tuple[str, list[tuple[int, object]]]) -> tuple[int, list[dict], list[dict], list[dict]]:
+    """Returns (records seen, device rows, okta rows, errors); every error carries its `line`."""
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = get_default_normalizer()
+
+    fmt, chunk = item
+    seen = 0
+    errors: list[dict] = []
+    hardware: list[dict] = []
+    okta: list[dict] = []
+    hardware_lines: list[int] = []
+    okta_lines: list[int] = []
+    for line, raw in chunk:
+        if fmt == "ndjson" and not raw.strip():
+            continue
+        seen += 1
+        if fmt == "ndjson":
+            try:
+                rec = json.loads(raw)
+            except ValueError as e:
+                errors.append({"line": line, "error": f"invalid JSON: {e}"})
+                continue
+        elif fmt == "csv":
+            rec = _from_csv(raw)
+        else:
+            rec = raw
+
+        kind = kind_of(rec) if isinstance(rec, dict) else None
+        if kind == "hardware":
+            hardware.append(rec)
+            hardware_lines.append(line)
+        elif kind == "okta":
+            okta.append(rec)
+            okta_lines.append(line)
+        else:
+            errors.append({"line": line, "error": "Unknown record (not hardware or okta)"})
+
+    device_rows, errs = prepare_device_rows(hardware, _normalizer, lines=hardware_lines)
+    errors.extend(errs)
+    okta_rows, errs = prepare_okta_rows(okta, _normalizer, lines=okta_lines)
+    errors.extend(errs)
+    return seen, device_rows, okta_rows, errors
+
+
+def _prepared(chunks: Iterator[tuple[str, list]], workers: int):
+    """Normalize chunks on `workers` processes, yielding results in input order."""
+    if workers <= 1:
+        yield from map(_prepare_chunk, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in chunks:
+            pending.append(pool.submit(_prepare_chunk, item))
+            # keep a bounded number of chunks in flight so memory stays flat
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# --------------------------------------------------------------------
+# Commands
+# --------------------------------------------------------------------
+def cmd_import(args) -> int:
+    run_migrations(engine)
+    totals = {"records": 0, "ingested": 0, "unchanged": 0, "failed": 0}
+    samples: list[dict] = []
+    started = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        pending = 0
+        for path in map(Path, args.paths):
+            fmt = args.format if args.format != "auto" else _detect_format(path)
+            log.info("importing %s as %s", path, fmt)
+            for seen, device_rows, okta_rows, errors in _prepared(
+                _read_chunks(path, fmt, args.chunk_size), args.workers
+            ):
+                # single writer: the same upsert code as /ingest, in large transactions
+                for rows, upsert in ((device_rows, upsert_device_rows), (okta_rows, upsert_okta_rows)):
+                    if rows:
+                        ok, errs, unchanged = upsert(db, rows)
+                        totals["ingested"] += ok
+                        totals["unchanged"] += unchanged
+                        errors = errors + errs
+                totals["records"] += seen
+                totals["failed"] += len(errors)
+                samples.extend(errors[: 10 - len(samples)])
+
+                pending += seen
+                if pending >= args.commit_every:
+                    db.commit()
+                    pending = 0
+                    log.info("committed %d records so far", totals["records"])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    totals["seconds"] = round(elapsed, 2)
+    totals["records_per_sec"] = round(totals["records"] / elapsed) if elapsed else None
+    totals["errors"] = samples
+    print(json.dumps(totals, indent=2, default=str))
+    return 0
+
+
+def cmd_compact_changes(args) -> int:
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        result = compact_change_log(
+            db,
+            retention_days=None if args.retention_days < 0 else args.retention_days,
+            max_entries=None if args.max_entries < 0 else args.max_entries,
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+def cmd_migrate(args) -> int:
+    if args.status:
+        done = applied_versions(engine)
+        for m in MIGRATIONS:
+            row = done.get(m.version)
+            state = f"applied {row.applied_at:%Y-%m-%d %H:%M}" if row else "pending"
+            print(f"{m.version:>4}  {state:<24}  {m.name}")
+        return 0
+    applied = run_migrations(engine, target=args.to)
+    print(json.dumps({"applied": applied}))
+    return 0
+
+
+def cmd_rebuild_search(args) -> int:
+    run_migrations(engine)
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        rebuild_search_index(conn)
+    print(json.dumps({"rebuilt": [t.fts for t in SEARCH_TABLES.values()],
+                      "seconds": round(time.perf_counter() - t0, 2)}))
+    return 0
+
+
+def cmd_rebuild_stats(args) -> int:
+    run_migrations(engine)
+    with engine.begin() as conn:
+        groups = rebuild_stats(conn)
+    print(json.dumps({"groups": groups}))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app", description="CMDB maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="bulk-load JSON / NDJSON / CSV dumps without going through HTTP")
+    p.add_argument("paths", nargs="+", help="files to load (format picked from the extension)")
+    p.add_argument("--format", choices=["auto", "json", "ndjson", "csv"], default="auto")
+    p.add_argument("--workers", type=int, default=4, help="normalization processes (1 = in-process)")
+    p.add_argument("--chunk-size", type=int, default=5000, help="records per worker task")
+    p.add_argument("--commit-every", type=int, default=100_000, help="records per transaction")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("compact-changes", help="drop superseded change-log entries and apply retention")
+    p.add_argument("--retention-days", type=float, default=CHANGE_LOG_RETENTION_DAYS,
+                   help="prune entries older than this (-1 = keep)")
+    p.add_argument("--max-entries", type=int, default=CHANGE_LOG_MAX_ENTRIES,
+                   help="keep at most this many newest entries (-1 = no limit)")
+    p.set_defaults(func=cmd_compact_changes)
+
+    p = sub.add_parser("migrate", help="apply pending schema migrations")
+    p.add_argument("--status", action="store_true", help="list migrations and whether they are applied")
+    p.add_argument("--to", type=int, default=None, help="stop after this version")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("rebuild-search", help="re-index every CI for /search")
+    p.set_defaults(func=cmd_rebuild_search)
+
+    p = sub.add_parser("rebuild-stats", help="recount the /stats summary counters")
+    p.set_defaults(func=cmd_rebuild_stats)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    setup_logging()
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,172 @@
-from sqlalchemy import create_engine
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-ENGINE_URL = "sqlite:///./cmdb.sqlite3"
-engine = create_engine(ENGINE_URL, future=True, echo=False)
+from app.settings import (
+    DATABASE_READ_URL,
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_READ_MAX_OVERFLOW,
+    DB_READ_POOL_SIZE,
+    SQLITE_PRAGMA_OVERRIDES,
+    SQLITE_PROFILE,
+)
+
+# --------------------------------------------------------------------
+# SQLite storage profiles (PRAGMAs run on every new connection)
+# --------------------------------------------------------------------
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    # SQLite's own defaults: rollback journal, fsync on every commit, no mmap, 2 MB cache
+    "legacy": {"journal_mode": "DELETE", "synchronous": "FULL", "mmap_size": 0,
+               "cache_size": -2000, "temp_store": "DEFAULT", "busy_timeout": 5000},
+    # readers never block the writer (or vice versa); fsync only at checkpoints
+    "wal": {"journal_mode": "WAL", "synchronous": "NORMAL", "mmap_size": 256 << 20,
+            "cache_size": -64000, "temp_store": "MEMORY", "busy_timeout": 5000},
+    # WAL, but every commit is fsynced (survives power loss, not just process crashes)
+    "durable": {"journal_mode": "WAL", "synchronous": "FULL", "mmap_size": 256 << 20,
+                "cache_size": -64000, "temp_store": "MEMORY", "busy_timeout": 10000},
+}
+
+_PRAGMA_CHOICES = {
+    "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "temp_store": {"DEFAULT", "FILE", "MEMORY"},
+}
+
+
+def sqlite_pragmas(profile: str = SQLITE_PROFILE, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """The PRAGMAs for `profile` with `overrides` applied, validated (they end up in SQL text)."""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"unknown SQLite profile {profile!r} (choose from {', '.join(SQLITE_PROFILES)})")
+    pragmas = {**SQLITE_PROFILES[profile], **(overrides or {})}
+    for name, value in pragmas.items():
+        choices = _PRAGMA_CHOICES.get(name)
+        if choices is not None:
+            pragmas[name] = str(value).upper()
+            if pragmas[name] not in choices:
+                raise ValueError(f"invalid PRAGMA {name}={value!r}")
+        else:
+            pragmas[name] = int(value)  # numeric PRAGMAs; booleans such as query_only are 0/1
+    return pragmas
+
+
+def use_sqlite_transactions(engine: Engine, pragmas: Optional[Dict[str, Any]] = None) -> Engine:
+    """
+    Let SQLAlchemy, not the sqlite3 driver, begin transactions, and run
+    `pragmas` on every new connection.
+    The driver only emits BEGIN before DML, so a SAVEPOINT issued first
+    (as ingest does per chunk) would open the transaction itself and its
+    RELEASE would commit everything; a later rollback then undoes nothing.
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        if pragmas:
+            cur = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cur.execute(f"PRAGMA {name}={value}")
+            finally:
+                cur.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        # "BEGIN IMMEDIATE" for sessions started with begin_write()
+        conn.exec_driver_sql(f"BEGIN {conn.get_execution_options().get('sqlite_begin', '')}".rstrip())
+
+    return engine
+
+
+def begin_write(db) -> None:
+    """
+    Start `db`'s transaction with BEGIN IMMEDIATE (a no-op if one is already open).
+    A writer that begins with a read and upgrades later can fail instantly with
+    "database is locked" when another writer got there first; taking the write
+    lock up front makes it wait for busy_timeout instead.
+    """
+    if not db.in_transaction() and db.get_bind().dialect.name == "sqlite":
+        db.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+
+
+def make_engine(url: URL | str = DATABASE_URL, profile: str = SQLITE_PROFILE,
+                overrides: Optional[Dict[str, Any]] = None, **kwargs) -> Engine:
+    """
+    Engine for `url` with the pool settings from the environment.
+    SQLite connections also get the storage profile and may be used from any
+    thread (FastAPI runs sync handlers on a thread pool).
+    """
+    parsed = make_url(url)
+    pool = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    if parsed.get_backend_name() != "sqlite":
+        return create_engine(url, future=True, **{**pool, "pool_pre_ping": True, **kwargs})
+
+    kwargs.setdefault("connect_args", {}).setdefault("check_same_thread", False)
+    if parsed.database not in (None, "", ":memory:"):
+        kwargs = {**pool, **kwargs}
+    engine = create_engine(parsed, future=True, **kwargs)
+    return use_sqlite_transactions(engine, sqlite_pragmas(profile, overrides))
+
+
+def read_only_url(url: str) -> URL:
+    """
+    The SQLite URL `url` opened read-only: file:<path>?mode=ro as an SQLite URI.
+    Writes fail in the driver ("attempt to write a readonly database").
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        raise ValueError(f"read-only mode needs an SQLite database file, got {url!r}")
+    path = sqlite_path(parsed)
+    return parsed.set(database=f"file:{path}", query={**parsed.query, "mode": "ro", "uri": "true"})
+
+
+def sqlite_path(url: URL | str) -> str:
+    """Absolute path of an SQLite file URL, with any file: URI prefix removed."""
+    database = make_url(url).database or ""
+    if database.startswith("file:"):
+        database = database[len("file:"):]
+    return os.path.abspath(database)
+
+
+def make_read_engine(url: str = DATABASE_URL, read_url: str = DATABASE_READ_URL,
+                     profile: str = SQLITE_PROFILE, overrides: Optional[Dict[str, Any]] = None,
+                     **kwargs) -> Engine:
+    """
+    Read-only engine with its own pool: an explicit `read_url`, else `url`
+    opened with mode=ro. SQLite connections are also put in query_only mode,
+    so even a statement that slips past the /ask guardrails can't write.
+    """
+    kwargs = {"pool_size": DB_READ_POOL_SIZE, "max_overflow": DB_READ_MAX_OVERFLOW, **kwargs}
+    if read_url:
+        return make_engine(read_url, profile, {**(overrides or {}), "query_only": 1}, **kwargs)
+    return make_engine(read_only_url(url), profile, {**(overrides or {}), "query_only": 1}, **kwargs)
+
+
+ENGINE_URL = DATABASE_URL
+engine = make_engine(ENGINE_URL, overrides=SQLITE_PRAGMA_OVERRIDES)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 Base = declarative_base()
 
+# Reads (list endpoints, /ci, /ask) never wait on ingest's write lock; in WAL mode
+# they see the last committed snapshot.
+read_engine = make_read_engine(ENGINE_URL, overrides=SQLITE_PRAGMA_OVERRIDES)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, future=True)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Like get_db, for handlers that only read."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,220 @@
+"""
+Bulk export behind GET /export/{users|devices|apps}.
+
+One SELECT per export: related rows come from correlated subqueries
+(json_group_array over an indexed lookup) and joins, never from a query
+per row. Rows are read from a streaming cursor EXPORT_CHUNK_ROWS at a time
+and each chunk is encoded and sent before the next is fetched, so memory
+stays flat however big the table is. The export reads one consistent
+snapshot of the database.
+
+Formats: NDJSON (default), CSV and Arrow IPC stream (needs pyarrow,
+imported only when asked for).
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+from app.models import App, Device, User, UserApp
+from app.settings import EXPORT_CHUNK_ROWS
+
+# format -> media type; the first media type of a format is the one sent. application/json
+# (most HTTP clients' default Accept) gets NDJSON: JSON values, one per line.
+EXPORT_FORMATS: Dict[str, Tuple[str, ...]] = {
+    "ndjson": ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json"),
+    "csv": ("text/csv",),
+    "arrow": ("application/vnd.apache.arrow.stream",),
+}
+EXPORT_EXTENSIONS = {"ndjson": "ndjson", "csv": "csv", "arrow": "arrows"}
+_WILDCARDS = {"*/*": "ndjson", "application/*": "ndjson", "text/*": "csv"}
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    kind: str
+    columns: Tuple[Tuple[str, str], ...]  # (name, type): str | int | bool | datetime | list
+    query: Callable[[], Select]
+
+    @property
+    def names(self) -> List[str]:
+        return [name for name, _ in self.columns]
+
+
+# --------------------------------------------------------------------
+# Queries (same fields as the list endpoints; device user details flattened)
+# Lists keep index order: apps by name, devices and users by rowid.
+# --------------------------------------------------------------------
+def _users_query() -> Select:
+    apps = select(func.json_group_array(UserApp.app_name)).where(UserApp.user_id == User.user_id)
+    devices = select(func.json_group_array(Device.device_id)).where(Device.assigned_user == User.user_id)
+    return select(
+        User.user_id, User.name, User.email, User.mfa_enabled, User.last_login, User.status, User.groups,
+        apps.scalar_subquery().label("apps"), devices.scalar_subquery().label("devices"),
+    ).order_by(User.user_id)
+
+
+def _devices_query() -> Select:
+    return (
+        select(
+            Device.device_id, Device.hostname, Device.ip_address, Device.os, Device.assigned_user,
+            User.name.label("assigned_user_name"), User.email.label("assigned_user_email"),
+            Device.location, Device.encryption, Device.status, Device.last_checkin,
+        )
+        .outerjoin(User, User.user_id == Device.assigned_user)
+        .order_by(Device.device_id)
+    )
+
+
+def _apps_query() -> Select:
+    users = select(func.json_group_array(UserApp.user_id)).where(UserApp.app_name == App.name)
+    return select(App.app_id, App.name, App.owner, App.type, users.scalar_subquery().label("users")).order_by(App.app_id)
+
+
+EXPORTS: Dict[str, ExportSpec] = {
+    "users": ExportSpec("users", (
+        ("user_id", "str"), ("name", "str"), ("email", "str"), ("mfa_enabled", "bool"),
+        ("last_login", "datetime"), ("status", "str"), ("groups", "str"), ("apps", "list"), ("devices", "list"),
+    ), _users_query),
+    "devices": ExportSpec("devices", (
+        ("device_id", "str"), ("hostname", "str"), ("ip_address", "str"), ("os", "str"),
+        ("assigned_user", "str"), ("assigned_user_name", "str"), ("assigned_user_email", "str"),
+        ("location", "str"), ("encryption", "bool"), ("status", "str"), ("last_checkin", "datetime"),
+    ), _devices_query),
+    "apps": ExportSpec("apps", (
+        ("app_id", "int"), ("name", "str"), ("owner", "str"), ("type", "str"), ("users", "list"),
+    ), _apps_query),
+}
+
+
+# --------------------------------------------------------------------
+# Content negotiation
+# --------------------------------------------------------------------
+def negotiate_format(fmt: Optional[str], accept: Optional[str]) -> str:
+    """
+    `format` wins; otherwise the Accept media type with the highest q that this
+    server can produce (NDJSON if none given). 406 if none of them fits.
+    """
+    if fmt:
+        return fmt
+    if not accept:
+        return "ndjson"
+    by_media = {m: f for f, medias in EXPORT_FORMATS.items() for m in medias}
+    candidates = []
+    for i, part in enumerate(accept.split(",")):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        chosen = by_media.get(media.lower()) or _WILDCARDS.get(media.lower())
+        if chosen == "arrow" and _pyarrow() is None:
+            continue  # listed, but not servable here: try the client's other types
+        if chosen and q > 0:
+            candidates.append((-q, i, chosen))
+    if not candidates:
+        raise HTTPException(406, f"supported media types: {', '.join(m[0] for m in EXPORT_FORMATS.values())}")
+    return min(candidates)[2]
+
+
+# --------------------------------------------------------------------
+# Row source
+# --------------------------------------------------------------------
+def _chunks(bind: Engine, spec: ExportSpec, chunk_rows: int) -> Iterator[List[List[Any]]]:
+    """Rows as value lists (JSON lists decoded), chunk_rows at a time from a server-side cursor."""
+    lists = [i for i, (_, typ) in enumerate(spec.columns) if typ == "list"]
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(spec.query())
+        for part in result.partitions():
+            rows = [list(r) for r in part]
+            for row in rows:
+                for i in lists:
+                    row[i] = json.loads(row[i])
+            yield rows
+
+
+# --------------------------------------------------------------------
+# Encoders
+# --------------------------------------------------------------------
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _ndjson(spec: ExportSpec, chunks: Iterator[List[List[Any]]]) -> Iterator[bytes]:
+    names = spec.names
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(names, row)), default=_json_default) + "\n" for row in rows).encode()
+
+
+def _csv_cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return json.dumps(value)
+    return value
+
+
+def _csv(spec: ExportSpec, chunks: Iterator[List[List[Any]]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(spec.names)
+    for rows in chunks:
+        writer.writerows([_csv_cell(v) for v in row] for row in rows)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():  # header of an empty export
+        yield buf.getvalue().encode()
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _arrow(spec: ExportSpec, chunks: Iterator[List[List[Any]]], pa) -> Iterator[bytes]:
+    types = {"str": pa.string(), "int": pa.int64(), "bool": pa.bool_(),
+             "datetime": pa.timestamp("us", tz="UTC"), "list": pa.list_(pa.string())}
+    schema = pa.schema([(name, types[typ]) for name, typ in spec.columns])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for rows in chunks:
+            arrays = [pa.array(col, type=field.type) for col, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()  # schema of an empty export, end-of-stream marker
+
+
+def export_stream(bind: Engine, kind: str, fmt: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Encoded chunks of the `kind` export; nothing is read until the first chunk is pulled."""
+    spec = EXPORTS[kind]
+    if fmt == "arrow":
+        pa = _pyarrow()
+        if pa is None:
+            raise HTTPException(406, "Arrow export needs pyarrow installed on the server (pip install pyarrow)")
+        return _arrow(spec, _chunks(bind, spec, chunk_rows), pa)
+    if fmt == "csv":
+        return _csv(spec, _chunks(bind, spec, chunk_rows))
+    return _ndjson(spec, _chunks(bind, spec, chunk_rows))
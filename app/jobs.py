@@ -0,0 +1,221 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from sqlalchemy.orm import Session
+
+from app.admission import AdmissionController, get_admission
+from app.db import SessionLocal
+from app.normalizers import get_default_normalizer
+from app.repositories import ingest_records
+from app.settings import INGEST_JOB_BATCH, INGEST_JOB_HISTORY, INGEST_JOB_WORKERS
+
+log = logging.getLogger(__name__)
+
+# Job lifecycle: queued -> running -> done | failed | cancelled
+FINISHED = {"done", "failed", "cancelled"}
+_SLOT_POLL_SECS = 0.5  # how often a job waiting for a write slot checks for cancellation
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class IngestJob:
+    """One accepted /ingest payload and its progress."""
+    job_id: str
+    records: list[dict] | None
+    total: int
+    status: str = "queued"
+    processed: int = 0
+    ingested: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    errors: list[dict] = field(default_factory=list)
+    error: str | None = None
+    cancel_requested: bool = False
+    created_at: datetime = field(default_factory=_now)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "progress": round(self.processed / self.total, 4) if self.total else 1.0,
+            "ingested": self.ingested,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "errors": self.errors[:10],
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestJobManager:
+    """
+    In-process job queue for large ingests.
+    Payloads are accepted immediately and processed by a small thread pool;
+    each worker commits every `batch_size` records with its own session,
+    and checks for cancellation between batches. Every batch holds an
+    admission slot while it writes, so jobs and /ingest requests together
+    stay within INGEST_MAX_CONCURRENT writers.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        workers: int = INGEST_JOB_WORKERS,
+        batch_size: int = INGEST_JOB_BATCH,
+        history: int = INGEST_JOB_HISTORY,
+        admission: AdmissionController | None = None,
+    ):
+        self.session_factory = session_factory
+        self.admission = admission  # None: the process-wide controller
+        self.batch_size = batch_size
+        self.history = history
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-job")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, records: list[dict]) -> IngestJob:
+        job = IngestJob(job_id=uuid.uuid4().hex, records=records, total=len(records))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._forget_old_jobs()
+        self._pool.submit(self._run, job)
+        log.info("ingest job queued: id=%s records=%d", job.job_id, job.total)
+        return job
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list[IngestJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def pending(self) -> int:
+        """Jobs queued or running."""
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status not in FINISHED)
+
+    def cancel(self, job_id: str) -> IngestJob | None:
+        """Queued jobs never start; running jobs stop after their current batch."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            job.cancel_requested = True
+            if job.status == "queued":
+                self._finish(job, "cancelled")
+        return job
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status not in FINISHED:
+                    job.cancel_requested = True
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    # ----------------------------------------------------------------
+    # internals
+    # ----------------------------------------------------------------
+    def _forget_old_jobs(self) -> None:
+        finished = [j.job_id for j in self._jobs.values() if j.status in FINISHED]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _finish(self, job: IngestJob, status: str, error: str | None = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = _now()
+        job.records = None  # release the payload; only the summary is kept
+
+    def _run(self, job: IngestJob) -> None:
+        with self._lock:
+            if job.cancel_requested or job.records is None:
+                return
+            job.status = "running"
+            job.started_at = _now()
+            records = job.records
+
+        normalizer = get_default_normalizer()
+        admission = self.admission or get_admission()
+        db = self.session_factory()
+        try:
+            for start in range(0, len(records), self.batch_size):
+                if not self._wait_for_slot(job, admission):
+                    break
+                batch = records[start:start + self.batch_size]
+                try:
+                    ok, errs, unchanged = ingest_records(db, batch, normalizer)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                finally:
+                    admission.release()
+                for e in errs:
+                    if "index" in e:
+                        e["index"] += start  # index in the batch -> index in the job's payload
+                with self._lock:
+                    job.processed += len(batch)
+                    job.ingested += ok
+                    job.unchanged += unchanged
+                    job.failed += len(errs)
+                    job.errors.extend(errs[: 10 - len(job.errors)])
+        except Exception as e:
+            log.exception("ingest job failed: id=%s", job.job_id)
+            with self._lock:
+                self._finish(job, "failed", str(e))
+            return
+        finally:
+            db.close()
+
+        with self._lock:
+            self._finish(job, "cancelled" if job.cancel_requested else "done")
+        log.info("ingest job %s: id=%s ingested=%d failed=%d",
+                 job.status, job.job_id, job.ingested, job.failed)
+
+    @staticmethod
+    def _wait_for_slot(job: IngestJob, admission: AdmissionController) -> bool:
+        """Block until a write slot is free; False (no slot held) if the job was cancelled meanwhile."""
+        while not job.cancel_requested:
+            if admission.acquire_blocking(timeout=_SLOT_POLL_SECS):
+                if not job.cancel_requested:
+                    return True
+                admission.release()
+        return False
+
+
+# --------------------------------------------------------------------
+# Process-wide manager (FastAPI dependency)
+# --------------------------------------------------------------------
+_manager: IngestJobManager | None = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> IngestJobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = IngestJobManager(SessionLocal)
+        return _manager
+
+
+def shutdown_job_manager() -> None:
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.shutdown()
+            _manager = None
@@ -1,26 +1,33 @@
 from contextlib import asynccontextmanager
-import os, asyncio
+import os, asyncio, logging
 from fastapi import FastAPI
 
-from .db import engine, Base
+from .db import engine, SessionLocal
+from .migrations import run_migrations
 from .routers.ingest import router as ingest_router
 from .routers.read import router as read_router
 from .routers.ask import router as ask_router
 from app.setup_logging import setup_logging
+from app.admission import get_admission
+from app.cache import ResponseCacheMiddleware, data_version, response_cache
+from app.changelog import run_compaction
+from app.jobs import shutdown_job_manager
 from app.nl.model_loader import load_model
+from app.settings import CHANGE_LOG_COMPACT_INTERVAL_SECS
 
 # --------------------------------------------------------------------
 # App bootstrap
 # --------------------------------------------------------------------
 setup_logging() # Init Logging
+log = logging.getLogger(__name__)
 
 # Flag to control whether model warmup blocks startup
 #   PRELOAD_BLOCKING=true  -> wait for model to load before serving
 #   PRELOAD_BLOCKING=false -> start server immediately and wait for model to load in background
 PRELOAD_BLOCKING = os.getenv("PRELOAD_BLOCKING", "true").lower() in ("1", "true", "yes")
 
-# Create database tables if they don’t exist.
-Base.metadata.create_all(bind=engine)
+# Create or upgrade the database schema (see app/migrations.py).
+run_migrations(engine)
 
 # --------------------------------------------------------------------
 # FastAPI application with lifespan hook
@@ -55,12 +62,28 @@ async def lifespan(app: FastAPI):
     else:
         asyncio.create_task(_warmup())
 
+    async def _compact_changes():
+        # periodic change-log compaction/retention, off the event loop
+        while True:
+            await asyncio.sleep(CHANGE_LOG_COMPACT_INTERVAL_SECS)
+            try:
+                await asyncio.to_thread(run_compaction, SessionLocal)
+            except Exception:
+                log.exception("change log compaction failed")
+
+    compactor = asyncio.create_task(_compact_changes()) if CHANGE_LOG_COMPACT_INTERVAL_SECS > 0 else None
+
     # Hand control back to FastAPI to serve requests
     yield
-    # No special shutdown logic needed
+    if compactor is not None:
+        compactor.cancel()
+    # Stop background ingest workers; jobs still queued are cancelled
+    shutdown_job_manager()
 
 # Create the FastAPI app instance
 app = FastAPI(title="AI-Ready CMDB (Step 1)", lifespan=lifespan)
+# GET read endpoints are served from memory until the next write commits (see app/cache.py)
+app.add_middleware(ResponseCacheMiddleware)
 
 # --------------------------------------------------------------------
 # Routes
@@ -73,6 +96,9 @@ def health():
       - ok: static True if the app is alive
       - model_ready: True when NL->SQL model finished loading
       - model_error: any load error message (None if healthy)
+      - ingest: admission control state (active/queued ingests, rejections)
+      - data_version: bumped by every committed write; read responses are cached per version
+      - response_cache: entries, hits, misses and 304s served
     """
     return {
         "ok": True,
@@ -80,6 +106,9 @@ def health():
         "version": 1,
         "model_ready": bool(getattr(app.state, "model_ready", False)),
         "model_error": getattr(app.state, "model_error", None),
+        "ingest": get_admission().stats(),
+        "data_version": data_version(),
+        "response_cache": response_cache.stats(),
     }
 
 # Register API routers:
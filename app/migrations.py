@@ -0,0 +1,167 @@
+"""
+Versioned schema migrations.
+
+Each migration has an increasing version and runs once per database, in its
+own transaction (SQLite DDL is transactional); applied versions are recorded
+in `schema_migrations`. Every migration spells out its own DDL instead of
+reading the models, so a new database and one upgraded from any older
+version go through the same steps and end up with the same schema.
+Migration 1 is the schema as it was before migrations existed; it and every
+later one are idempotent (IF NOT EXISTS), because databases created by older
+code already have some of those tables.
+
+Add a migration by appending to MIGRATIONS; never renumber or edit one that
+has shipped. Model changes need a migration of their own (tests check that
+the migrated schema matches the models).
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List
+
+from sqlalchemy import select
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import SchemaMigration
+from app.search import create_search_index
+from app.stats import rebuild_stats
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    up: Callable[[Connection], None]
+
+
+def _execute(conn: Connection, *statements: str) -> None:
+    for stmt in statements:
+        conn.exec_driver_sql(stmt)
+
+
+def _baseline(conn: Connection) -> None:
+    # the tables as the code before migrations created them (some may exist already)
+    _execute(
+        conn,
+        "CREATE TABLE IF NOT EXISTS users (user_id VARCHAR NOT NULL, name VARCHAR NOT NULL, "
+        "email VARCHAR NOT NULL, mfa_enabled BOOLEAN, last_login DATETIME, status VARCHAR, "
+        "groups VARCHAR, PRIMARY KEY (user_id))",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+        "CREATE TABLE IF NOT EXISTS apps (app_id INTEGER NOT NULL, name VARCHAR NOT NULL, "
+        "owner VARCHAR, type VARCHAR, PRIMARY KEY (app_id))",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_apps_name ON apps (name)",
+        "CREATE TABLE IF NOT EXISTS user_apps (user_id VARCHAR NOT NULL, app_name VARCHAR NOT NULL, "
+        "PRIMARY KEY (user_id, app_name), FOREIGN KEY(user_id) REFERENCES users (user_id), "
+        "FOREIGN KEY(app_name) REFERENCES apps (name))",
+        "CREATE TABLE IF NOT EXISTS devices (device_id VARCHAR NOT NULL, hostname VARCHAR NOT NULL, "
+        "ip_address VARCHAR, os VARCHAR, assigned_user VARCHAR, location VARCHAR, encryption BOOLEAN, "
+        "status VARCHAR, last_checkin DATETIME, PRIMARY KEY (device_id))",
+        "CREATE INDEX IF NOT EXISTS ix_devices_hostname ON devices (hostname)",
+        "CREATE TABLE IF NOT EXISTS ci_fingerprints (kind VARCHAR NOT NULL, ci_id VARCHAR NOT NULL, "
+        "digest VARCHAR NOT NULL, PRIMARY KEY (kind, ci_id))",
+        "CREATE TABLE IF NOT EXISTS change_log (seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+        "kind VARCHAR NOT NULL, ci_id VARCHAR NOT NULL, op VARCHAR NOT NULL, changed_at DATETIME NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_change_log_ci ON change_log (kind, ci_id, seq)",
+        'CREATE TABLE IF NOT EXISTS change_log_state ("key" VARCHAR NOT NULL, value INTEGER NOT NULL, '
+        'PRIMARY KEY ("key"))',
+    )
+
+
+def _secondary_indexes(conn: Connection) -> None:
+    # filters and joins used by the read endpoints on every request
+    _execute(
+        conn,
+        "CREATE INDEX IF NOT EXISTS ix_users_status ON users (status)",
+        "CREATE INDEX IF NOT EXISTS ix_users_mfa_enabled ON users (mfa_enabled)",
+        "CREATE INDEX IF NOT EXISTS ix_devices_status ON devices (status)",
+        "CREATE INDEX IF NOT EXISTS ix_devices_assigned_user ON devices (assigned_user)",
+        "CREATE INDEX IF NOT EXISTS ix_user_apps_app_name ON user_apps (app_name)",
+    )
+
+
+def _user_groups(conn: Connection) -> None:
+    # membership table, backfilled from the comma-joined users.groups column
+    _execute(
+        conn,
+        "CREATE TABLE IF NOT EXISTS user_groups (user_id VARCHAR NOT NULL, group_name VARCHAR NOT NULL, "
+        "PRIMARY KEY (user_id, group_name), FOREIGN KEY(user_id) REFERENCES users (user_id))",
+        "CREATE INDEX IF NOT EXISTS ix_user_groups_group ON user_groups (group_name, user_id)",
+    )
+    rows = [
+        (user_id, g)
+        for user_id, groups in conn.exec_driver_sql("SELECT user_id, groups FROM users WHERE groups IS NOT NULL")
+        for g in dict.fromkeys(g.strip() for g in groups.split(","))
+        if g
+    ]
+    if rows:
+        conn.exec_driver_sql("INSERT OR IGNORE INTO user_groups (user_id, group_name) VALUES (?, ?)", rows)
+
+
+def _ci_stats(conn: Connection) -> None:
+    # summary counters, seeded from the current tables and kept up to date by ingest
+    _execute(
+        conn,
+        "CREATE TABLE IF NOT EXISTS ci_stats (kind VARCHAR NOT NULL, dimension VARCHAR NOT NULL, "
+        "value VARCHAR NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (kind, dimension, value))",
+    )
+    rebuild_stats(conn)
+
+
+def _keyset_indexes(conn: Connection) -> None:
+    # (column, pk) composites replace the single-column indexes they cover
+    _execute(
+        conn,
+        *(f"DROP INDEX IF EXISTS {name}"
+          for name in ("ix_users_status", "ix_users_mfa_enabled", "ix_devices_status", "ix_devices_hostname")),
+        "CREATE INDEX IF NOT EXISTS ix_users_status_user_id ON users (status, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_users_mfa_enabled_user_id ON users (mfa_enabled, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_users_name_user_id ON users (name, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_users_last_login_user_id ON users (last_login, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_devices_status_device_id ON devices (status, device_id)",
+        "CREATE INDEX IF NOT EXISTS ix_devices_hostname_device_id ON devices (hostname, device_id)",
+        "CREATE INDEX IF NOT EXISTS ix_devices_last_checkin_device_id ON devices (last_checkin, device_id)",
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline schema", _baseline),
+    Migration(2, "secondary indexes on status, mfa, assigned_user, app_name", _secondary_indexes),
+    Migration(3, "user_groups membership table", _user_groups),
+    Migration(4, "full-text search index (FTS5 trigram)", create_search_index),
+    Migration(5, "ci_stats summary counters", _ci_stats),
+    Migration(6, "(sort column, pk) indexes for keyset pagination", _keyset_indexes),
+]
+
+
+def applied_versions(engine: Engine) -> dict[int, SchemaMigration]:
+    with engine.connect() as conn:
+        SchemaMigration.__table__.create(conn, checkfirst=True)
+        conn.commit()
+        rows = conn.execute(select(SchemaMigration.__table__)).all()
+    return {r.version: r for r in rows}
+
+
+def run_migrations(engine: Engine, target: int | None = None) -> List[int]:
+    """
+    Apply pending migrations up to `target` (default: all). Safe to call on
+    every start and from several processes: each migration re-checks its
+    version under the write lock (BEGIN IMMEDIATE) before running.
+    Returns the versions applied by this call.
+    """
+    done = set(applied_versions(engine))
+    applied: List[int] = []
+    for m in MIGRATIONS:
+        if m.version in done or (target is not None and m.version > target):
+            continue
+        with engine.connect().execution_options(sqlite_begin="IMMEDIATE") as conn:
+            with conn.begin():
+                if conn.scalar(select(SchemaMigration.version).where(SchemaMigration.version == m.version)):
+                    continue  # another process got there first
+                log.info("applying migration %d: %s", m.version, m.name)
+                m.up(conn)
+                conn.execute(SchemaMigration.__table__.insert().values(
+                    version=m.version, name=m.name, applied_at=datetime.now(timezone.utc)))
+        applied.append(m.version)
+    return applied
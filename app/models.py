@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Index
 from .db import Base
 
 # -----------------------------
@@ -6,6 +6,13 @@ from .db import Base
 # -----------------------------
 class User(Base):
     __tablename__ = "users"
+    # (column, user_id) indexes serve both the filter and keyset paging in that order
+    __table_args__ = (
+        Index("ix_users_status_user_id", "status", "user_id"),
+        Index("ix_users_mfa_enabled_user_id", "mfa_enabled", "user_id"),
+        Index("ix_users_name_user_id", "name", "user_id"),
+        Index("ix_users_last_login_user_id", "last_login", "user_id"),
+    )
     # Represents an Okta-style user record
     user_id    = Column(String, primary_key=True)           # unique user ID
     name       = Column(String, nullable=False)
@@ -13,7 +20,7 @@ class User(Base):
     mfa_enabled= Column(Boolean)                            # MFA on/off
     last_login = Column(DateTime(timezone=True))
     status     = Column(String)                              # active/inactive
-    groups     = Column(String)                              # comma-separated groups
+    groups     = Column(String)                              # comma-separated groups (as sent; see UserGroup)
 
 
 class App(Base):
@@ -29,17 +36,80 @@ class UserApp(Base):
     __tablename__ = "user_apps"
     # Link table for many-to-many User <-> App relationships
     user_id  = Column(String, ForeignKey("users.user_id"), primary_key=True)
-    app_name = Column(String, ForeignKey("apps.name"), primary_key=True)
+    app_name = Column(String, ForeignKey("apps.name"), primary_key=True, index=True)  # PK covers user_id lookups only
+
+
+class UserGroup(Base):
+    __tablename__ = "user_groups"
+    # One row per (user, group) membership, rewritten from users.groups by ingest.
+    # The PK serves "groups of a user"; ix_user_groups_group serves "members of a group".
+    __table_args__ = (Index("ix_user_groups_group", "group_name", "user_id"),)
+    user_id    = Column(String, ForeignKey("users.user_id"), primary_key=True)
+    group_name = Column(String, primary_key=True)
+
+
+class CIFingerprint(Base):
+    __tablename__ = "ci_fingerprints"
+    # Hash of the last normalized record written for each CI, used by ingest
+    # to skip records that haven't changed since the previous sync
+    kind   = Column(String, primary_key=True)                 # "device" | "user"
+    ci_id  = Column(String, primary_key=True)                 # device_id / user_id
+    digest = Column(String, nullable=False)
+
+
+class CIStat(Base):
+    __tablename__ = "ci_stats"
+    # Number of CIs per (kind, dimension, value), maintained by ingest with deltas (see app/stats.py)
+    kind      = Column(String, primary_key=True)              # "device" | "user"
+    dimension = Column(String, primary_key=True)              # column counted, e.g. "os"
+    value     = Column(String, primary_key=True)              # JSON-encoded value ("null" for NULL)
+    count     = Column(Integer, nullable=False, default=0)
+
+
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    # One entry per CI written by ingest; consumers page through it by `seq` (GET /changes).
+    # AUTOINCREMENT so sequence numbers are never reused after old entries are deleted.
+    __table_args__ = (
+        Index("ix_change_log_ci", "kind", "ci_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+    seq        = Column(Integer, primary_key=True, autoincrement=True)
+    kind       = Column(String, nullable=False)               # "device" | "user" | "app"
+    ci_id      = Column(String, nullable=False)               # device_id / user_id / app name
+    op         = Column(String, nullable=False)               # "insert" | "update"
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    # One row per applied migration (see app/migrations.py)
+    version    = Column(Integer, primary_key=True)
+    name       = Column(String, nullable=False)
+    applied_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class ChangeLogState(Base):
+    __tablename__ = "change_log_state"
+    # Bookkeeping for change-log retention, e.g. "pruned_through" = highest seq deleted by age
+    key   = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False)
 
 
 class Device(Base):
     __tablename__ = "devices"
+    # (column, device_id) indexes serve both the filter and keyset paging in that order
+    __table_args__ = (
+        Index("ix_devices_status_device_id", "status", "device_id"),
+        Index("ix_devices_hostname_device_id", "hostname", "device_id"),
+        Index("ix_devices_last_checkin_device_id", "last_checkin", "device_id"),
+    )
     # Represents a physical or virtual device in the CMDB
     device_id    = Column(String, primary_key=True)          # asset tag or ID
-    hostname     = Column(String, index=True, nullable=False)
+    hostname     = Column(String, nullable=False)
     ip_address   = Column(String)
     os           = Column(String)                             # normalized OS name
-    assigned_user= Column(String)                             # linked user_id (string)
+    assigned_user= Column(String, index=True)                 # linked user_id (string)
     location     = Column(String)
     encryption   = Column(Boolean)                            # True/False/NULL
     status       = Column(String)                             # e.g. active/retired
@@ -14,8 +14,7 @@ CREATE TABLE users (
   email TEXT NOT NULL UNIQUE,
   mfa_enabled BOOLEAN,
   last_login TIMESTAMP,
-  status TEXT,
-  groups TEXT
+  status TEXT
 );
 CREATE TABLE devices (
   device_id TEXT PRIMARY KEY,
@@ -39,10 +38,16 @@ CREATE TABLE user_apps (
   app_name TEXT,
   PRIMARY KEY (user_id, app_name)
 );
+CREATE TABLE user_groups (
+  user_id TEXT,
+  group_name TEXT,
+  PRIMARY KEY (user_id, group_name)
+);
+CREATE INDEX ix_user_groups_group ON user_groups (group_name, user_id);
 """
 
 # Restrict generated queries to these tables only.
-ALLOW_TABLES = {"users", "devices", "apps", "user_apps"}
+ALLOW_TABLES = {"users", "devices", "apps", "user_apps", "user_groups"}
 
 # Base system prompt
 SYSTEM = (
@@ -52,6 +57,7 @@ SYSTEM = (
     "Rules:\n"
     "- Exactly one SELECT statement (no INSERT/UPDATE/DELETE/DDL; no multiple statements).\n"
     "- Avoid Postgres-only syntax (ILIKE, ::type, NULLS FIRST/LAST).\n"
+    "- For group membership join user_groups on user_id and compare group_name with =.\n"
     "- Return ONLY the SQL; if you add fences, use ```sql ... ```.\n"
 )
 
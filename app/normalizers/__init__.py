@@ -1,15 +1,21 @@
 from .pipeline import get_default_normalizer, NormalizerPipeline
-from .rules import RuleNormalizer
-from .ai_stub import AINormalizer # MAKE THIS WORK LATER
+from .rules import RuleNormalizer, load_rules
+from .ai_stub import AINormalizer, CanonicalModel
 from .types import CITypes, Record
 from .base import Normalizer
+from .cache import configure_field_caches, clear_field_caches, field_cache_stats
 
 __all__ = [
     "get_default_normalizer",
     "NormalizerPipeline",
     "RuleNormalizer",
+    "load_rules",
     "AINormalizer",
+    "CanonicalModel",
     "CITypes",
     "Record",
     "Normalizer",
+    "configure_field_caches",
+    "clear_field_caches",
+    "field_cache_stats",
 ]
@@ -1,12 +1,235 @@
-from copy import deepcopy
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional, Protocol
+
+from app.settings import NORMALIZER_AI_CACHE_PATH, NORMALIZER_AI_MAX_VALUES
 from .base import Normalizer
+from .rule_tables import NO_MATCH, get_rulebook
 from .types import CITypes, Record
 
+log = logging.getLogger(__name__)
+
+
+class CanonicalModel(Protocol):
+    def canonicalize(self, kind: CITypes, field: str, values: list[str], examples: list) -> list[Any]:
+        """
+        One answer per value, in order: the canonical form, or None when the
+        model can't tell. `examples` are canonical values the rules already use.
+        """
+        ...
+
+
 class AINormalizer(Normalizer):
-    """Placeholder for an LLM-backed normalizer. Currently a no-op."""
-    def __init__(self, model_name: str | None = None):
-        self.model_name = model_name or "placeholder"
+    """
+    Model-backed pipeline stage that runs after `RuleNormalizer`.
+
+    Only field values the rules left unresolved are looked at (an OS name no
+    rule matches, an encryption phrase that is neither yes nor no). They are
+    de-duplicated across the batch, answered from a persistent value->canonical
+    cache when possible, and the rest go to the model in one batched call.
+    Every answer is cached, including "don't know", so each distinct value is
+    inferred once.
+    """
+    def __init__(self, model: CanonicalModel | None = None,
+                 cache_path: Path | str | None = NORMALIZER_AI_CACHE_PATH,
+                 max_values: int = NORMALIZER_AI_MAX_VALUES):
+        self.model = model or LocalModel()
+        self.cache = CanonicalCache(cache_path)
+        self.max_values = max_values
+        self._lock = threading.Lock()
 
     def normalize_record(self, kind: CITypes, rec: Record) -> Record:
-        # In future: call your model to infer/standardize fields.
-        return deepcopy(rec)
+        return self.normalize_owned(kind, [dict(rec)])[0]
+
+    def normalize_owned(self, kind: CITypes, records: list[Record]) -> list[Record]:
+        for spec in _FIELDS.get(kind, ()):
+            pending: dict[str, str] = {}   # cache key -> first raw value seen
+            for r in records:
+                value = spec.unresolved(r)
+                if value is not None:
+                    pending.setdefault(_cache_key(value), value)
+            if not pending:
+                continue
+            answers = self._resolve(kind, spec, pending)
+            for r in records:
+                value = spec.unresolved(r)
+                if value is not None:
+                    answer = answers.get(_cache_key(value))
+                    if answer is not None:
+                        r[spec.target] = answer
+        return records
+
+    def _resolve(self, kind: CITypes, spec: "_AIField", pending: dict[str, str]) -> dict[str, Any]:
+        name = f"{kind}.{spec.target}"
+        # the lock only guards the cache; inference runs outside it so concurrent
+        # batches aren't serialized behind one model call. Two batches racing on
+        # the same value both ask the model, which is harmless: answers are deterministic.
+        with self._lock:
+            known = self.cache.lookup(name, pending)
+        todo = [k for k in pending if k not in known]
+        if not todo:
+            return known
+        examples = spec.examples()
+        for start in range(0, len(todo), self.max_values):
+            keys = todo[start:start + self.max_values]
+            try:
+                raw = self.model.canonicalize(kind, spec.target, [pending[k] for k in keys], examples)
+            except Exception:
+                # leave these unresolved and uncached; they are retried next batch
+                log.exception("AI normalization failed for %d %s values", len(keys), name)
+                continue
+            answers = {key: spec.parse(answer) for key, answer in zip(keys, list(raw) + [None] * len(keys))}
+            with self._lock:
+                for key, answer in answers.items():
+                    known[key] = self.cache.put(name, key, answer)
+        with self._lock:
+            self.cache.save()
+        return known
+
+
+# --- Fields the model may fill in ---
+
+class _AIField:
+    """Where an unresolved value lives in a rule-normalized record, and how to read answers."""
+    def __init__(self, kind: str, source: str, target: str,
+                 unresolved: Callable[[Record], Optional[str]], parse: Callable[[Any], Any]):
+        self.kind, self.source, self.target = kind, source, target
+        self.unresolved = unresolved
+        self.parse = parse
+
+    def examples(self) -> list:
+        rules = get_rulebook().get(self.kind, self.source)
+        return list(rules.outputs) if rules else []
+
+
+def _unknown_os(r: Record) -> Optional[str]:
+    # norm_os passes unmatched names through unchanged
+    os_name = r.get("os")
+    if not isinstance(os_name, str) or not os_name.strip():
+        return None
+    rules = get_rulebook().get("device", "os")
+    if rules is None or rules.match(os_name) is not NO_MATCH or os_name in rules.outputs:
+        return None
+    return os_name
+
+
+def _unclear_encryption(r: Record) -> Optional[str]:
+    # norm_bool_from_phrase returns None when no rule matched
+    phrase = r.get("encryption_status")
+    if r.get("encryption") is None and isinstance(phrase, str) and phrase.strip():
+        return phrase
+    return None
+
+
+def _parse_label(answer: Any) -> Optional[str]:
+    if not isinstance(answer, str):
+        return None
+    answer = answer.strip().strip("\"'`").strip()
+    if not answer or len(answer) > 64 or "\n" in answer or answer.lower() in ("unknown", "none", "n/a"):
+        return None
+    return answer
+
+
+def _parse_bool(answer: Any) -> Optional[bool]:
+    if isinstance(answer, bool):
+        return answer
+    answer = (_parse_label(answer) or "").lower()
+    return {"true": True, "yes": True, "false": False, "no": False}.get(answer)
+
+
+_FIELDS: dict[str, tuple[_AIField, ...]] = {
+    "device": (
+        _AIField("device", "os", "os", _unknown_os, _parse_label),
+        _AIField("device", "encryption_status", "encryption", _unclear_encryption, _parse_bool),
+    ),
+}
+
+
+def _cache_key(value: str) -> str:
+    return " ".join(value.split()).lower()
+
+
+# --- Persistent answer cache ---
+
+class CanonicalCache:
+    """
+    {"device.os": {"ubuntu 22.04": "Linux", ...}} kept in a JSON file.
+    A None answer means the model didn't know; it is cached too so the value
+    isn't sent again. Pass path=None for an in-memory cache.
+    """
+    def __init__(self, path: Path | str | None):
+        self.path = Path(path) if path else None
+        self._data: dict[str, dict[str, Any]] = self._load()
+        self._dirty = False
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            with self.path.open(encoding="utf-8") as f:
+                data = json.load(f)
+            return {k: dict(v) for k, v in data.items() if isinstance(v, dict)}
+        except (OSError, ValueError) as e:
+            log.error("AI normalizer cache %s unreadable, starting empty: %s", self.path, e)
+            return {}
+
+    def lookup(self, field: str, keys) -> dict[str, Any]:
+        table = self._data.get(field, {})
+        return {k: table[k] for k in keys if k in table}
+
+    def put(self, field: str, key: str, answer: Any) -> Any:
+        self._data.setdefault(field, {})[key] = answer
+        self._dirty = True
+        return answer
+
+    def save(self) -> None:
+        if self.path is None or not self._dirty:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(self._data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)  # readers never see a half-written file
+            self._dirty = False
+        except OSError as e:
+            log.error("AI normalizer cache %s not saved: %s", self.path, e)
+
+    def __len__(self) -> int:
+        return sum(len(t) for t in self._data.values())
+
+
+# --- Default model: the local Hugging Face model used by /ask ---
+
+_ANSWER_LINE = re.compile(r"^\s*(\d+)\s*[:.)=-]\s*(.*?)\s*$")
+
+
+class LocalModel:
+    """Asks the local model (app.nl.model_loader) for all values in a single prompt."""
+    def canonicalize(self, kind: CITypes, field: str, values: list[str], examples: list) -> list[Any]:
+        from app.nl.model_loader import generate  # heavy import; only when the stage is used
+
+        answer_hint = "true or false" if field == "encryption" else "a short canonical name"
+        lines = [
+            f"Normalize these {kind} {field} values. Answer with one line per value,",
+            f"formatted '<number>: <answer>', where the answer is {answer_hint}, or 'unknown'.",
+        ]
+        if examples:
+            lines.append("Known canonical values: " + ", ".join(json.dumps(e) for e in examples))
+        lines += [f"{i}: {v}" for i, v in enumerate(values, 1)]
+        lines.append("Answers:")
+        text = generate("\n".join(lines), max_new_tokens=12 * len(values) + 16)
+        return parse_numbered_answers(text, len(values))
+
+
+def parse_numbered_answers(text: str, count: int) -> list[Optional[str]]:
+    """'1: macOS\\n2: Linux' -> ["macOS", "Linux"]; missing numbers become None."""
+    out: list[Optional[str]] = [None] * count
+    for line in text.splitlines():
+        m = _ANSWER_LINE.match(line)
+        if m and 1 <= int(m.group(1)) <= count and out[int(m.group(1)) - 1] is None:
+            out[int(m.group(1)) - 1] = m.group(2)
+    return out
@@ -1,7 +1,20 @@
-from typing import Protocol
+from typing import Iterable, Protocol
 from .types import CITypes, Record
 
 class Normalizer(Protocol):
     def normalize_record(self, kind: CITypes, rec: Record) -> Record:
         """Return a NEW normalized record. Do not mutate `rec`."""
         ...
+
+    def normalize_batch(self, kind: CITypes, records: Iterable[Record]) -> list[Record]:
+        """Return NEW normalized records, in input order. Do not mutate the inputs."""
+        # one shallow copy per record: normalizers only replace top-level keys
+        return self.normalize_owned(kind, [dict(r) for r in records])
+
+    def normalize_owned(self, kind: CITypes, records: list[Record]) -> list[Record]:
+        """
+        Normalize records the caller has already copied (see `normalize_batch`).
+        Stages may update these dicts in place and return them; nested values
+        (lists, dicts) are still shared with the original input and must not be mutated.
+        """
+        return [self.normalize_record(kind, r) for r in records]
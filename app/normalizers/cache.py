@@ -0,0 +1,77 @@
+from functools import lru_cache, update_wrapper
+from typing import Any, Callable, Dict
+
+from app.settings import NORMALIZER_CACHE_SIZE
+
+# name -> FieldCache, for every memoized field helper
+_FIELD_CACHES: Dict[str, "FieldCache"] = {}
+
+
+class FieldCache:
+    """
+    Bounded LRU memo around a single-argument field helper, with hit/miss counters.
+    Field values repeat heavily across syncs (a few dozen OS strings, the same
+    names every time), so hot values become a dictionary lookup.
+    Unhashable inputs (lists, dicts) bypass the cache.
+    """
+    def __init__(self, fn: Callable[[Any], Any], maxsize: int):
+        update_wrapper(self, fn)
+        self.resize(maxsize)
+
+    def resize(self, maxsize: int) -> None:
+        """Change the size limit (drops cached values and counters)."""
+        # typed: 1 and 1.0 hash alike but str() differently
+        self._cached = lru_cache(maxsize=maxsize, typed=True)(self.__wrapped__)
+
+    def clear(self) -> None:
+        self._cached.cache_clear()
+
+    def stats(self) -> Dict[str, Any]:
+        info = self._cached.cache_info()
+        calls = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+            "hit_rate": round(info.hits / calls, 4) if calls else None,
+        }
+
+    def __call__(self, value):
+        try:
+            return self._cached(value)
+        except TypeError:
+            # unhashable value; a genuine TypeError from the helper re-raises here
+            return self.__wrapped__(value)
+
+
+def field_cache(fn: Callable[[Any], Any]) -> FieldCache:
+    """Decorator: memoize a field helper and register it for stats/configuration."""
+    cache = FieldCache(fn, NORMALIZER_CACHE_SIZE)
+    _FIELD_CACHES[fn.__name__] = cache
+    return cache
+
+
+def configure_field_caches(default: int | None = None, **sizes: int) -> None:
+    """
+    Set cache size limits, e.g. configure_field_caches(4096, parse_dt=512).
+    `default` applies to every helper not named explicitly; 0 disables caching.
+    """
+    unknown = set(sizes) - set(_FIELD_CACHES)
+    if unknown:
+        raise ValueError(f"unknown field cache(s): {', '.join(sorted(unknown))}")
+    for name, cache in _FIELD_CACHES.items():
+        size = sizes.get(name, default)
+        if size is not None:
+            cache.resize(size)
+
+
+def clear_field_caches() -> None:
+    """Forget every memoized value (e.g. after the normalization rules change)."""
+    for cache in _FIELD_CACHES.values():
+        cache.clear()
+
+
+def field_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss counters and sizes per memoized field helper."""
+    return {name: cache.stats() for name, cache in _FIELD_CACHES.items()}
@@ -1,31 +1,45 @@
-from copy import deepcopy
 from typing import List
 from .base import Normalizer
 from .types import CITypes, Record
 from .rules import RuleNormalizer
-# from .ai_stub import AINormalizer  # placeholder for a future ML normalizer
+from .ai_stub import AINormalizer
+from app.settings import NORMALIZER_AI_ENABLED, NORMALIZER_COLUMNAR_THRESHOLD
 
 class NormalizerPipeline(Normalizer):
     """
     A chain of normalizers.
     Each stage takes the output of the previous stage,
     making it easy to mix rule-based and AI-based cleaning steps.
+
+    Batches of `columnar_threshold` records or more go through a stage's
+    `normalize_columnar` method when it has one.
     """
-    def __init__(self, stages: List[Normalizer]):
+    def __init__(self, stages: List[Normalizer], columnar_threshold: int = NORMALIZER_COLUMNAR_THRESHOLD):
         self.stages = stages
-    
+        self.columnar_threshold = columnar_threshold
+
     def normalize_record(self, kind: CITypes, rec: Record) -> Record:
-        out = deepcopy(rec)  # Don't mutate the input
+        return self.normalize_batch(kind, [rec])[0]
+
+    def normalize_owned(self, kind: CITypes, records: list[Record]) -> list[Record]:
+        # `normalize_batch` made the one copy per record; every stage works on it
+        columnar = len(records) >= self.columnar_threshold
         # Apply each normalizer in a sequence
         for stage in self.stages:
-            out = stage.normalize_record(kind, out)
-        return out
+            by_column = getattr(stage, "normalize_columnar", None) if columnar else None
+            records = by_column(kind, records) if by_column else stage.normalize_owned(kind, records)
+        return records
+
+_ai_stage: AINormalizer | None = None
 
 def get_default_normalizer() -> Normalizer:
     """
-    Factory for the default pipeline.
-    Currently just rule-based, but adding an AI stage is a one-line change.
+    Factory for the default pipeline: rule-based, followed by the AI stage
+    for unresolved values when NORMALIZER_AI_ENABLED is set.
     """
-    # Example for later:
-    # return NormalizerPipeline([RuleNormalizer(), AINormalizer(...)])
-    return NormalizerPipeline([RuleNormalizer()])
+    global _ai_stage
+    if not NORMALIZER_AI_ENABLED:
+        return NormalizerPipeline([RuleNormalizer()])
+    if _ai_stage is None:
+        _ai_stage = AINormalizer()  # one instance: it owns the on-disk answer cache
+    return NormalizerPipeline([RuleNormalizer(), _ai_stage])
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Tuple
+
+from app.settings import NORMALIZER_RULES_PATH, NORMALIZER_RULES_RELOAD_SECS
+
+log = logging.getLogger(__name__)
+
+NO_MATCH = object()   # sentinel: no rule matched
+_VALUE = ""           # trie key holding the value of a prefix ending at that node
+
+
+class FieldRules:
+    """
+    Compiled rules for one (kind, field): an exact-match dict, a prefix trie
+    (longest prefix wins) and an ordered list of substring rules.
+    Lookup cost depends on the length of the value, not on the number of rules,
+    except for `contains`, which is meant for a handful of fallbacks.
+    """
+    __slots__ = ("exact", "trie", "contains", "has_default", "default", "outputs")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.exact = {_key(k): v for k, v in (spec.get("exact") or {}).items()}
+        self.trie: Dict[str, Any] = {}
+        for prefix, value in (spec.get("prefix") or {}).items():
+            node = self.trie
+            for ch in _key(prefix):
+                node = node.setdefault(ch, {})
+            node[_VALUE] = value
+        self.contains: Tuple[Tuple[str, Any], ...] = tuple(
+            (_key(needle), value) for needle, value in (spec.get("contains") or [])
+        )
+        self.has_default = "default" in spec
+        self.default = spec.get("default")
+        # distinct canonical values this table can produce
+        outputs = [*self.exact.values(), *_trie_values(self.trie), *(v for _, v in self.contains)]
+        if self.has_default:
+            outputs.append(self.default)
+        self.outputs: Tuple[Any, ...] = tuple(dict.fromkeys(outputs))
+
+    def match(self, value: Any) -> Any:
+        """Canonical value for `value`, or NO_MATCH."""
+        key = _key(value)
+        hit = self.exact.get(key, NO_MATCH)
+        if hit is not NO_MATCH:
+            return hit
+        node, hit = self.trie, NO_MATCH
+        for ch in key:
+            node = node.get(ch)
+            if node is None:
+                break
+            hit = node.get(_VALUE, hit)
+        if hit is not NO_MATCH:
+            return hit
+        for needle, out in self.contains:
+            if needle in key:
+                return out
+        return NO_MATCH
+
+    def apply(self, value: Any) -> Any:
+        """Canonical value, falling back to `default` or the value itself."""
+        hit = self.match(value)
+        if hit is not NO_MATCH:
+            return hit
+        return self.default if self.has_default else value
+
+
+def _key(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+def _trie_values(node: Dict[str, Any]):
+    for ch, child in node.items():
+        if ch == _VALUE:
+            yield child
+        else:
+            yield from _trie_values(child)
+
+
+def compile_rules(spec: Dict[str, Any]) -> Dict[Tuple[str, str], FieldRules]:
+    """{"device": {"os": {...}}} -> {("device", "os"): FieldRules}"""
+    compiled: Dict[Tuple[str, str], FieldRules] = {}
+    for kind, fields in spec.items():
+        if kind.startswith("_"):
+            continue
+        if not isinstance(fields, dict):
+            raise ValueError(f"rules for kind {kind!r} must be an object")
+        for field, rules in fields.items():
+            if not isinstance(rules, dict):
+                raise ValueError(f"rules for {kind}.{field} must be an object")
+            compiled[(kind, field)] = FieldRules(rules)
+    return compiled
+
+
+class RuleBook:
+    """
+    The compiled rule set loaded from a JSON file, re-read when the file's
+    mtime changes (checked at most every `reload_secs`). A file that fails to
+    parse on reload is logged and the previous rules stay in effect.
+    """
+    def __init__(self, path: Path | str, reload_secs: float = NORMALIZER_RULES_RELOAD_SECS):
+        self.path = Path(path)
+        self.reload_secs = reload_secs
+        self._lock = threading.Lock()
+        self._mtime = self._stat()
+        self._checked = time.monotonic()
+        self.tables = self._load()
+
+    def _stat(self) -> float | None:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _load(self) -> Dict[Tuple[str, str], FieldRules]:
+        with self.path.open(encoding="utf-8") as f:
+            return compile_rules(json.load(f))
+
+    def refresh(self) -> bool:
+        """
+        Reload if the file changed; cheap enough to call once per batch.
+        Returns True when new rules were loaded, so memoized results can be dropped.
+        """
+        now = time.monotonic()
+        if now - self._checked < self.reload_secs:
+            return False
+        with self._lock:
+            self._checked = now
+            mtime = self._stat()
+            if mtime is None or mtime == self._mtime:
+                return False
+            try:
+                tables = self._load()
+            except (OSError, ValueError) as e:
+                log.error("normalization rules %s not reloaded, keeping previous rules: %s", self.path, e)
+                self._mtime = mtime
+                return False
+            self.tables, self._mtime = tables, mtime
+        log.info("normalization rules reloaded from %s (%d tables)", self.path, len(tables))
+        return True
+
+    def get(self, kind: str, field: str) -> FieldRules | None:
+        return self.tables.get((kind, field))
+
+    def fields(self, kind: str) -> Iterable[Tuple[str, FieldRules]]:
+        return [(f, rules) for (k, f), rules in self.tables.items() if k == kind]
+
+
+_rulebook: RuleBook | None = None
+_rulebook_lock = threading.Lock()
+
+
+def get_rulebook() -> RuleBook:
+    """Process-wide rule book loaded from NORMALIZER_RULES_PATH."""
+    global _rulebook
+    if _rulebook is None:
+        with _rulebook_lock:
+            if _rulebook is None:
+                _rulebook = RuleBook(NORMALIZER_RULES_PATH)
+    return _rulebook
+
+
+def set_rulebook(book: RuleBook) -> RuleBook:
+    """Swap the process-wide rule book (tests, or a custom rules file)."""
+    global _rulebook
+    with _rulebook_lock:
+        _rulebook = book
+    return book
@@ -1,8 +1,9 @@
-from copy import deepcopy
 from datetime import datetime, timezone
 import re
-from typing import Optional
+from typing import Any, Callable, Optional
 from .base import Normalizer
+from .cache import clear_field_caches, field_cache
+from .rule_tables import NO_MATCH, RuleBook, get_rulebook, set_rulebook
 from .types import CITypes, Record
 
 class RuleNormalizer(Normalizer):
@@ -12,7 +13,41 @@ class RuleNormalizer(Normalizer):
     standardizes fields so the database stays consistent.
     """
     def normalize_record(self, kind: CITypes, rec: Record) -> Record:
-        r = deepcopy(rec)  # work on a copy so we don’t mutate the input
+        _refresh_rules()
+        # work on a copy so we don’t mutate the input; only top-level keys are replaced
+        return self._apply(kind, dict(rec))
+
+    def normalize_owned(self, kind: CITypes, records: list[Record]) -> list[Record]:
+        _refresh_rules()
+        extra = _extra_rules(kind)
+        # the pipeline already copied these records, so update them in place
+        for r in records:
+            self._apply(kind, r, extra)
+        return records
+
+    def normalize_columnar(self, kind: CITypes, records: list[Record]) -> list[Record]:
+        """
+        Column-at-a-time version of `normalize_owned` for large batches.
+        Each distinct string in a column is normalized once and mapped back,
+        so results are identical to the per-record path.
+        """
+        _refresh_rules()
+        if kind == "device":
+            _map_column(records, "os", "os", norm_os)
+            _map_column(records, "status", "status", norm_status)
+            _map_column(records, "encryption_status", "encryption", norm_bool_from_phrase)
+            _map_column(records, "assigned_to", "assigned_user", clean_name)
+            _map_column(records, "last_checkin", "last_checkin", _parse_utc_fast)
+        elif kind == "user":
+            _map_column(records, "status", "status", norm_status)
+            _map_column(records, "name", "name", clean_name)
+            _map_column(records, "last_login", "last_login", _parse_utc_fast)
+            _map_column(records, "email", "email", _clean_email, skip_falsy=True)
+        for field, rules in _extra_rules(kind):
+            _map_column(records, field, field, rules.apply, skip_missing=True)
+        return records
+
+    def _apply(self, kind: CITypes, r: Record, extra=None) -> Record:
         if kind == "device":
             r["os"] = norm_os(r.get("os"))
             r["status"] = norm_status(r.get("status"))
@@ -25,33 +60,60 @@ class RuleNormalizer(Normalizer):
             r["last_login"] = parse_dt(r.get("last_login"))
             if r.get("email"):
                 r["email"] = r["email"].strip().lower()
+        for field, rules in (_extra_rules(kind) if extra is None else extra):
+            if field in r:
+                r[field] = rules.apply(r[field])
         return r
 
 
+# --- Rule tables (rules.json) ---
+
+# (kind, field) tables consumed by the field helpers below rather than applied generically
+_HELPER_TABLES = {("device", "os"), ("device", "encryption_status")}
+
+
+def _refresh_rules() -> None:
+    """Pick up edits to the rules file; memoized helper results are stale after a reload."""
+    if get_rulebook().refresh():
+        clear_field_caches()
+
+
+def _extra_rules(kind: CITypes):
+    return [(f, rules) for f, rules in get_rulebook().fields(kind) if (kind, f) not in _HELPER_TABLES]
+
+
+def load_rules(path) -> RuleBook:
+    """Switch to the rules in `path` (compiled immediately, hot-reloaded afterwards)."""
+    book = set_rulebook(RuleBook(path))
+    clear_field_caches()
+    return book
+
+
 # --- Individual field helpers (rule-based string cleanups) ---
+# Memoized with bounded LRU caches; see cache.field_cache_stats() for hit rates.
 
+@field_cache
 def norm_status(s: Optional[str]):
     """Lower-case the status string if present."""
     return s.lower() if isinstance(s, str) else s
 
+@field_cache
 def norm_os(s: Optional[str]):
-    """Map messy OS names to a few canonical labels."""
+    """Map messy OS names to canonical labels (device.os rules); unknown names pass through."""
     if not s: return s
-    x = s.strip().lower()
-    if x.startswith("windows 10"): return "Windows 10"
-    if x.startswith("windows 11"): return "Windows 11"
-    if x in {"macos", "mac os", "osx", "mac os x"}: return "macOS"
-    return s
+    rules = get_rulebook().get("device", "os")
+    hit = rules.match(s) if rules else NO_MATCH
+    return s if hit is NO_MATCH else hit
 
+@field_cache
 def norm_bool_from_phrase(s: Optional[str]):
-    """Convert free-form yes/no strings into True/False/None."""
+    """Convert free-form yes/no strings into True/False/None (device.encryption_status rules)."""
     if s is None: return None
-    t = str(s).strip().lower()
-    if t in {"true","yes","y","1","enabled","on"}: return True
-    if t in {"false","no","n","0","disabled","off"}: return False
-    if "enabled" in t: return True   # fallback for phrases like "encryption enabled"
-    return None
+    rules = get_rulebook().get("device", "encryption_status")
+    hit = rules.match(s) if rules else NO_MATCH
+    return None if hit is NO_MATCH else hit
 
+@field_cache
 def parse_dt(z: Optional[str]):
     """Parse ISO-ish datetime strings into naive UTC datetime objects."""
     if not z:
@@ -64,7 +126,53 @@ def parse_dt(z: Optional[str]):
     except Exception:
         return None
 
+@field_cache
 def clean_name(n: Optional[str]):
     """Trim, collapse whitespace, and Title-case a name."""
     if not n: return n
     return re.sub(r"\s+", " ", n.strip()).title()
+
+
+# --- Columnar helpers (large batches) ---
+
+_MISSING = object()
+
+# ISO timestamps already in UTC ("...Z" / "...+00:00"): the common case from our feeds
+_UTC_ISO = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?(?:Z|\+00:00)\Z")
+
+
+def _map_column(records: list[Record], src: str, dst: str, fn: Callable[[Any], Any],
+                skip_falsy: bool = False, skip_missing: bool = False) -> None:
+    """
+    Normalize one column of `records`: every distinct string goes through `fn`
+    once and the rest are dictionary hits. Non-string values (None, numbers, lists)
+    are passed to `fn` directly so their results match the per-record path.
+    """
+    seen: dict[str, Any] = {}
+    for r in records:
+        if skip_missing and src not in r:
+            continue
+        v = r.get(src)
+        if skip_falsy and not v:
+            continue
+        if v.__class__ is str:
+            out = seen.get(v, _MISSING)
+            if out is _MISSING:
+                out = seen[v] = fn(v)
+        else:
+            out = fn(v)
+        r[dst] = out
+
+
+def _parse_utc_fast(z):
+    """`parse_dt` with a shortcut for UTC ISO strings: drop the suffix and parse as naive."""
+    if z.__class__ is str and _UTC_ISO.match(z):
+        try:
+            return datetime.fromisoformat(z[:-1] if z[-1] == "Z" else z[:-6])
+        except ValueError:
+            pass  # the regex only checks the shape: 2024-02-30 fits it; parse_dt decides
+    return parse_dt(z)
+
+
+def _clean_email(e):
+    return e.strip().lower()
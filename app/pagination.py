@@ -0,0 +1,96 @@
+"""
+Keyset (cursor) pagination for the list endpoints.
+
+A page is ordered by (sort column, primary key) and the cursor holds those
+two values for the last row sent; the next page starts strictly after
+them. With an index on (sort column, pk) every page is one index seek plus
+`limit` rows, however deep it is, unlike OFFSET which walks and discards
+every earlier row. Cursors are opaque to clients (base64url JSON) and tied
+to the sort they were issued for.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, and_, or_, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort: str, value: Any, pk: Any) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, pk], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, sort_col: InstrumentedAttribute,
+                  pk_col: InstrumentedAttribute) -> Tuple[Any, Any]:
+    """
+    (sort value, pk) from a cursor issued for `sort`, converted to the columns'
+    Python types; 400 if it's malformed, tampered with or for another sort.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, pk = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(400, "invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(400, f"cursor was issued for sort={cursor_sort!r}, not {sort!r}")
+    try:
+        value = _column_value(sort_col, value)
+        pk = _column_value(pk_col, pk)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "invalid cursor")
+    return value, pk
+
+
+def _column_value(col: InstrumentedAttribute, value: Any) -> Any:
+    """A JSON cursor value as `col` stores it; TypeError/ValueError if it can't be one."""
+    if value is None:
+        if col.nullable and not col.primary_key:
+            return None
+        raise TypeError(f"{col.key} can't be null")
+    if isinstance(col.type, DateTime):
+        if not isinstance(value, str):
+            raise TypeError(f"{col.key} must be an ISO-8601 string")
+        return datetime.fromisoformat(value)
+    expected = col.type.python_type
+    if isinstance(value, bool) is not (expected is bool) or not isinstance(value, expected):
+        raise TypeError(f"{col.key} must be {expected.__name__}")
+    return value
+
+
+def after(sort_col: InstrumentedAttribute, pk_col: InstrumentedAttribute, value: Any, pk: Any):
+    """
+    WHERE clause for rows after (value, pk) in ORDER BY sort_col, pk_col.
+    SQLite sorts NULLs first, so after a NULL come the remaining NULLs (by pk)
+    and then every non-NULL value.
+    """
+    if sort_col is pk_col:
+        return pk_col > pk
+    if value is None:
+        return or_(sort_col.is_not(None), and_(sort_col.is_(None), pk_col > pk))
+    # a row-value comparison is a single range seek on an index over (sort_col, pk_col)
+    return tuple_(sort_col, pk_col) > tuple_(value, pk)
+
+
+def keyset_page(q, sort: str, sort_col, pk_col, cursor: Optional[str], limit: int, offset: int = 0):
+    """
+    Apply ORDER BY (sort_col, pk_col), the cursor position (or legacy `offset`)
+    and LIMIT to query `q`. Returns (rows, next_cursor); next_cursor is None on
+    the last page.
+    """
+    if cursor:
+        q = q.filter(after(sort_col, pk_col, *decode_cursor(cursor, sort, sort_col, pk_col)))
+    order = [pk_col] if sort_col is pk_col else [sort_col, pk_col]
+    rows = q.order_by(*order).offset(offset).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, getattr(last, sort_col.key), getattr(last, pk_col.key))
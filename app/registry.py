@@ -0,0 +1,216 @@
+"""
+Process-wide app catalog cache.
+
+The apps table is small (a few hundred rows) and read on every Okta ingest
+chunk and every app lookup, so it is loaded once per database and kept in
+memory. Writers never touch the registry directly: names created inside a
+transaction are staged on the Session and only published when it commits;
+a rollback drops them.
+
+Apps written by another process (the import CLI, another worker) never pass
+through those hooks, so the read endpoints call `fresh_app_registry()`: it
+compares count(*) and max(app_id) of the apps table with the loaded snapshot
+(one single-row query) and reloads on a mismatch. Ingest skips that check; an
+insert it wrongly skips is caught by ON CONFLICT and triggers a reload.
+In-place edits by raw SQL still need `invalidate_app_registries()`.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, object_session
+
+from app.db import sqlite_path
+from app.models import App
+
+log = logging.getLogger(__name__)
+
+_STAGED = "app_registry_staged"     # Session.info key: {name: AppInfo} created in this transaction
+_RELOAD = "app_registry_reload"     # Session.info key: reload the catalog after commit
+
+
+@dataclass(frozen=True)
+class AppInfo:
+    """The columns of one `apps` row; attribute names match the App model."""
+    app_id: Optional[int]
+    name: str
+    owner: Optional[str] = None
+    type: Optional[str] = None
+
+
+Signature = Tuple[int, Optional[int]]  # (count(*), max(app_id)) of the apps table
+
+
+def _signature(apps: Iterable[AppInfo]) -> Signature:
+    ids = [a.app_id for a in apps]
+    return len(ids), max((i for i in ids if i is not None), default=None)
+
+
+class AppRegistry:
+    """name -> AppInfo for one database, loaded on first use."""
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._by_name: Optional[Dict[str, AppInfo]] = None
+        self._signature: Optional[Signature] = None  # of the rows in _by_name
+
+    def _apps(self) -> Dict[str, AppInfo]:
+        apps = self._by_name
+        if apps is None:
+            with self._lock:
+                if self._by_name is None:
+                    # loaded while holding the lock so a concurrent publish can't be lost
+                    with self.engine.connect() as conn:
+                        rows = conn.execute(select(App.app_id, App.name, App.owner, App.type))
+                        self._by_name = {r.name: AppInfo(*r) for r in rows}
+                        self._signature = _signature(self._by_name.values())
+                    log.info("app registry loaded: %d apps", len(self._by_name))
+                apps = self._by_name
+        return apps
+
+    def get(self, name: str) -> Optional[AppInfo]:
+        return self._apps().get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._apps()
+
+    def by_id(self, app_id: int) -> Optional[AppInfo]:
+        return next((a for a in self._apps().values() if a.app_id == app_id), None)
+
+    def all(self) -> List[AppInfo]:
+        """Every app in app_id order (the table's natural order)."""
+        return sorted(self._apps().values(), key=lambda a: a.app_id or 0)
+
+    def publish(self, staged: Dict[str, AppInfo]) -> None:
+        with self._lock:
+            if self._by_name is None:
+                return  # not loaded yet; the first load will see the committed rows
+            apps = {**self._by_name, **staged}
+            self._by_name = apps  # readers see the old or the new dict, never a mix
+            self._signature = _signature(apps.values())
+
+    def revalidate(self, db: Session) -> None:
+        """Reload on next use if the apps table no longer matches the loaded snapshot."""
+        if self._by_name is None:
+            return  # the first lookup loads it anyway
+        row = db.execute(select(func.count(), func.max(App.app_id)).select_from(App)).one()
+        if tuple(row) != self._signature:
+            log.info("app registry out of date (%s in database, %s loaded): reloading",
+                     tuple(row), self._signature)
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._by_name = None
+            self._signature = None
+
+
+# --------------------------------------------------------------------
+# One registry per database
+# --------------------------------------------------------------------
+_registries: Dict[str, AppRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def registry_key(engine: Engine) -> str:
+    """Same key for every engine on one database (e.g. the read-write and read-only SQLite engines)."""
+    if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        return f"sqlite:{sqlite_path(engine.url)}"
+    return engine.url.render_as_string(hide_password=False)
+
+
+def app_registry(db: Session) -> AppRegistry:
+    """The registry for the database `db` is bound to."""
+    engine = db.get_bind()
+    engine = getattr(engine, "engine", engine)  # a Connection bind -> its Engine
+    key = registry_key(engine)
+    registry = _registries.get(key)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.setdefault(key, AppRegistry(engine))
+    return registry
+
+
+def fresh_app_registry(db: Session) -> AppRegistry:
+    """`app_registry(db)`, first checked against the apps table so other processes' writes show up."""
+    registry = app_registry(db)
+    registry.revalidate(db)
+    return registry
+
+
+def invalidate_app_registries() -> None:
+    """Forget every loaded catalog; the next lookup reloads it from the database."""
+    with _registries_lock:
+        for registry in _registries.values():
+            registry.invalidate()
+
+
+# --------------------------------------------------------------------
+# Staging: publish on commit, drop on rollback
+# --------------------------------------------------------------------
+def stage_apps(db: Session, apps: Iterable[AppInfo]) -> None:
+    """Record apps created in `db`'s transaction; they become visible when it commits."""
+    staged = db.info.setdefault(_STAGED, {})
+    for info in apps:
+        staged[info.name] = info
+
+
+def unknown_apps(db: Session, names: Iterable[str]) -> List[str]:
+    """Names neither in the registry nor created earlier in this transaction (order kept)."""
+    registry = app_registry(db)
+    staged = db.info.get(_STAGED) or {}
+    return [n for n in dict.fromkeys(names) if staged.get(n) is None and n not in registry]
+
+
+def stage_reload(db: Session) -> None:
+    """The transaction changed apps in a way we can't track row by row: reload after commit."""
+    db.info[_RELOAD] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged(session: Session) -> None:
+    if session.in_nested_transaction():
+        return  # a savepoint was released; the outer transaction can still roll back
+    staged = session.info.pop(_STAGED, None)
+    reload = session.info.pop(_RELOAD, False)
+    if not staged and not reload:
+        return
+    registry = app_registry(session)
+    if reload:
+        registry.invalidate()
+    else:
+        registry.publish(staged)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_staged(session: Session) -> None:
+    session.info.pop(_STAGED, None)
+    session.info.pop(_RELOAD, None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _savepoint_rolled_back(session: Session, previous_transaction) -> None:
+    # names staged inside a savepoint that was rolled back may not exist; we don't
+    # track which savepoint staged what, so forget them all and reload after commit
+    if previous_transaction.nested and session.info.pop(_STAGED, None):
+        stage_reload(session)
+
+
+# ORM writes to App (seed scripts, admin code) keep the registry in step too
+@event.listens_for(App, "after_insert")
+def _stage_orm_app(mapper, connection, target: App) -> None:
+    session = object_session(target)
+    if session is not None:
+        stage_apps(session, [AppInfo(target.app_id, target.name, target.owner, target.type)])
+
+
+@event.listens_for(App, "after_update")
+@event.listens_for(App, "after_delete")
+def _stage_orm_app_change(mapper, connection, target: App) -> None:
+    # renames and deletes are rare: just reload the catalog after commit
+    session = object_session(target)
+    if session is not None:
+        stage_reload(session)
@@ -1,124 +1,550 @@
+import hashlib
+import json
 import logging
-from sqlalchemy import select, text
-from sqlalchemy.exc import IntegrityError, StatementError
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, OperationalError, StatementError
 from sqlalchemy.orm import Session
-from app.models import Device, User
+from app.changelog import change_entries, record_changes
+from app.db import begin_write
+from app.models import App, CIFingerprint, Device, User, UserApp, UserGroup
 from app.normalizers import get_default_normalizer
+from app.registry import AppInfo, stage_apps, stage_reload, unknown_apps
+from app.settings import INGEST_CHUNK_SIZE
+from app.stats import STAT_DIMENSIONS, apply_stat_deltas, stat_deltas
 
 log = logging.getLogger(__name__)
 
-def update_or_insert_devices(
-    db: Session, records: list[dict], normalizer=None
-) -> tuple[int, list[dict]]:
+# Columns rewritten when an incoming device_id already exists
+DEVICE_UPDATE_COLUMNS = (
+    "hostname", "ip_address", "os", "assigned_user",
+    "location", "encryption", "status", "last_checkin",
+)
+
+
+def _chunked(seq: list, size: int):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _digest(row: dict, columns: tuple[str, ...]) -> str:
+    """Stable fingerprint of the values a write would store."""
+    payload = json.dumps([row[c] for c in columns], default=str, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _stored_rows(db: Session, kind: str, pk, ids: list[str], columns: tuple = ()) -> dict:
     """
-    Idempotent upsert by *device_id only*. Hostnames are allowed to collide.
-    If device_id exists -> update that row; else create a new row.
+    {ci_id: row mapping} for the given CIs that exist: "digest" (None if never
+    fingerprinted) plus the requested `columns` of the CI itself.
+    Joined from the CI table itself, so a row deleted behind ingest's back
+    never looks unchanged.
+    """
+    fp = CIFingerprint
+    stmt = (
+        select(pk.label("ci_id"), fp.digest, *columns)
+        .outerjoin(fp, (fp.kind == kind) & (fp.ci_id == pk))
+        .where(pk.in_(ids))
+    )
+    return {row.ci_id: row._mapping for row in db.execute(stmt)}
+
+
+def _store_digests(db: Session, kind: str, digests: dict[str, str]) -> None:
+    stmt = sqlite_insert(CIFingerprint.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CIFingerprint.kind, CIFingerprint.ci_id],
+        set_={"digest": stmt.excluded.digest},
+    )
+    db.execute(stmt, [{"kind": kind, "ci_id": k, "digest": d} for k, d in digests.items()])
+
+
+def _device_upsert_stmt():
+    """
+    INSERT ... ON CONFLICT(device_id) DO UPDATE, executed with a list of rows.
+    SQLite runs the list as one prepared statement (executemany); a literal
+    multi-VALUES statement would be re-compiled by SQLAlchemy for every chunk.
+    """
+    stmt = sqlite_insert(Device.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=[Device.device_id],
+        set_={c: stmt.excluded[c] for c in DEVICE_UPDATE_COLUMNS},
+    )
+
+
+def _with_line(error: dict, lines: list[int] | None, i: int) -> dict:
+    """Tag a record's error with its source line if the caller has one, else its index in the batch."""
+    if lines is not None:
+        error["line"] = lines[i]
+    else:
+        error["index"] = i
+    return error
+
+
+def _text(value, field: str) -> str:
+    """A text field, stripped ("" if missing); TypeError if it isn't a string, e.g. a numeric email."""
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise TypeError(f"{field} must be a string, not {type(value).__name__}")
+    return value.strip()
+
+
+def _normalize_each(normalizer, kind: str, records: list[dict]) -> list:
+    """
+    `normalizer.normalize_batch`, falling back to one record at a time if the
+    batch raises, so a value no rule copes with fails only its own record:
+    that record's slot holds the exception instead of a normalized dict.
+    """
+    try:
+        return normalizer.normalize_batch(kind, records)
+    except Exception:
+        log.warning("batch normalization of %d %s records failed; retrying record by record",
+                    len(records), kind, exc_info=True)
+    out: list = []
+    for r in records:
+        try:
+            out.append(normalizer.normalize_record(kind, r))
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+def prepare_device_rows(records: list[dict], normalizer=None,
+                        lines: list[int] | None = None) -> tuple[list[dict], list[dict]]:
+    """
+    Validate and normalize a batch of raw hardware records.
+    Returns (rows ready for the `devices` table, per-record errors). Each error
+    carries the record's `index` in `records`, or its source `line` when
+    `lines` (one per record, e.g. from a dump file) is given.
     """
     normalizer = normalizer or get_default_normalizer()
-    ok = 0
+    rows: list[dict] = []
     errors: list[dict] = []
 
-    for r in records:
-        did  = (r.get("device_id") or "").strip()
-        host = (r.get("hostname")  or "").strip()
+    def reject(i: int, did, host, msg: str) -> None:
+        log.warning("device record rejected: %s", msg)
+        errors.append(_with_line({"kind": "device", "device_id": did, "hostname": host, "error": msg}, lines, i))
+
+    valid: list[tuple[int, str, str]] = []
+    raw: list[dict] = []
+    for i, r in enumerate(records):
+        try:
+            did  = _text(r.get("device_id"), "device_id")
+            host = _text(r.get("hostname"), "hostname")
+        except TypeError as e:
+            reject(i, r.get("device_id"), r.get("hostname"), str(e))
+            continue
         if not did or not host:
-            msg = "device_id and hostname are required"
-            log.warning("device record rejected: %s", msg)
-            errors.append({"kind": "device", "device_id": did, "hostname": host, "error": msg})
+            reject(i, did, host, "device_id and hostname are required")
+            continue
+        valid.append((i, did, host))
+        raw.append(r)
+
+    # one normalizer call for the whole batch
+    for (i, did, host), norm in zip(valid, _normalize_each(normalizer, "device", raw)):
+        if isinstance(norm, Exception):
+            reject(i, did, host, f"normalization failed: {norm}")
             continue
+        # No hostname de-duplication: collisions are allowed
+        rows.append({
+            "device_id":     did,
+            "hostname":      host,
+            "ip_address":    norm.get("ip_address"),
+            "os":            norm.get("os"),
+            "assigned_user": norm.get("assigned_user"),
+            "location":      norm.get("location"),
+            "encryption":    norm.get("encryption"),
+            "status":        norm.get("status"),
+            "last_checkin":  norm.get("last_checkin"),
+        })
+
+    return rows, errors
 
-        norm = normalizer.normalize_record("device", r)
 
+def _write_device_chunk(db: Session, rows: list[dict]) -> int:
+    """
+    Upsert one chunk of prepared device rows, skipping rows whose fingerprint
+    matches what is stored, append the written ones to the change log and
+    move their ci_stats counts from the stored values to the new ones.
+    Returns how many rows were unchanged.
+    """
+    dids = list({row["device_id"] for row in rows})
+    stat_columns = tuple(getattr(Device, c) for c in STAT_DIMENSIONS["device"][1])
+    stored = _stored_rows(db, "device", Device.device_id, dids, stat_columns)
+    current = {did: row["digest"] for did, row in stored.items()}
+    existed = set(current)
+
+    changed: list[dict] = []
+    for row in rows:
+        digest = _digest(row, DEVICE_UPDATE_COLUMNS)
+        if current.get(row["device_id"]) == digest:
+            continue
+        # rows are applied in order, so a device_id repeated in one batch keeps its last record
+        current[row["device_id"]] = digest
+        changed.append(row)
+
+    if changed:
+        db.execute(_device_upsert_stmt(), changed)
+        _store_digests(db, "device", {row["device_id"]: current[row["device_id"]] for row in changed})
+        record_changes(db, "device", change_entries(changed, "device_id", existed))
+        after = {row["device_id"]: row for row in changed}  # last record per device wins
+        apply_stat_deltas(db, "device", stat_deltas("device", stored, after))
+    return len(rows) - len(changed)
+
+
+def upsert_device_rows(
+    db: Session, rows: list[dict], chunk_size: int = INGEST_CHUNK_SIZE
+) -> tuple[int, list[dict], int]:
+    """
+    Write prepared device rows with one upsert statement per chunk.
+    If a chunk fails, only that chunk is replayed row by row to isolate the bad record(s).
+    Returns (ok, errors, unchanged) where `unchanged` rows count as ok but weren't rewritten.
+    """
+    ok = unchanged = 0
+    errors: list[dict] = []
+
+    begin_write(db)
+    for chunk in _chunked(rows, chunk_size):
         try:
-            # per-record savepoint so one bad record doesn’t poison the batch
             with db.begin_nested():
-                row = db.get(Device, did)
-                if row is None:
-                    row = Device(device_id=did)
+                unchanged += _write_device_chunk(db, chunk)
+            ok += len(chunk)
+            continue
+        except OperationalError:
+            raise  # locked/busy database: the whole transaction failed, not a record
+        except (IntegrityError, StatementError, TypeError, ValueError):
+            log.warning("bulk device upsert failed for a chunk of %d rows; retrying row by row", len(chunk))
+
+        for row in chunk:
+            try:
+                # per-record savepoint so one bad record doesn't poison the batch
+                with db.begin_nested():
+                    unchanged += _write_device_chunk(db, [row])
+                ok += 1
+            except OperationalError:
+                raise  # OperationalError is a StatementError, but a busy database isn't this record's fault
+            except (IntegrityError, StatementError, TypeError, ValueError) as e:
+                # the savepoint is already rolled back; earlier rows stay in the transaction
+                log.exception("device upsert failed: device_id=%s hostname=%s", row["device_id"], row["hostname"])
+                errors.append({"kind": "device", "device_id": row["device_id"],
+                               "hostname": row["hostname"], "error": str(e)})
+
+    return ok, errors, unchanged
+
+
+def update_or_insert_devices(
+    db: Session, records: list[dict], normalizer=None, chunk_size: int = INGEST_CHUNK_SIZE
+) -> tuple[int, list[dict], int]:
+    """
+    Idempotent upsert by *device_id only*. Hostnames are allowed to collide.
+    If device_id exists -> update that row; else create a new row.
 
-                # No hostname de-duplication: collisions are allowed
-                row.hostname      = host
-                row.ip_address    = norm.get("ip_address")
-                row.os            = norm.get("os")
-                row.assigned_user = norm.get("assigned_user")
-                row.location      = norm.get("location")
-                row.encryption    = norm.get("encryption")
-                row.status        = norm.get("status")
-                row.last_checkin  = norm.get("last_checkin")
+    The whole batch is validated and normalized first, then written with one
+    INSERT ... ON CONFLICT(device_id) DO UPDATE per `chunk_size` rows.
+    Bad records are reported per record and never fail the batch.
+    Returns (ok, errors, unchanged).
+    """
+    rows, errors = prepare_device_rows(records, normalizer)
+    ok, write_errors, unchanged = upsert_device_rows(db, rows, chunk_size)
+    return ok, errors + write_errors, unchanged
 
-                db.merge(row)
-            ok += 1
 
-        except (IntegrityError, StatementError, TypeError, ValueError) as e:
-            db.rollback()
-            log.exception("device upsert failed: device_id=%s hostname=%s", did, host)
-            errors.append({"kind": "device", "device_id": did, "hostname": host, "error": str(e)})
+# Columns rewritten when an incoming user resolves to an existing row
+USER_UPDATE_COLUMNS = ("name", "email", "mfa_enabled", "last_login", "status", "groups")
 
-    return ok, errors
 
+def _user_upsert_stmt():
+    """INSERT ... ON CONFLICT(user_id) DO UPDATE, executed with a list of rows."""
+    stmt = sqlite_insert(User.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=[User.user_id],
+        set_={c: stmt.excluded[c] for c in USER_UPDATE_COLUMNS},
+    )
 
 
-def update_or_insert_okta(db: Session, records: list[dict], normalizer=None) -> tuple[int, list[dict]]:
+def prepare_okta_rows(records: list[dict], normalizer=None,
+                      lines: list[int] | None = None) -> tuple[list[dict], list[dict]]:
+    """
+    Validate and normalize a batch of raw Okta user records.
+    Returns (prepared user rows carrying their `apps` list, per-record errors).
+    Errors carry `index` or `line`, as in `prepare_device_rows`.
+    """
     normalizer = normalizer or get_default_normalizer()
-    ok = 0
+    rows: list[dict] = []
     errors: list[dict] = []
 
-    for r in records:
-        norm  = normalizer.normalize_record("user", r)
-        uid   = (norm.get("user_id") or r.get("user_id") or "").strip()
-        email = (norm.get("email") or "").strip().lower()
-        name  = (norm.get("name")  or "").strip()
+    def reject(i: int, uid, email, msg: str) -> None:
+        log.warning("okta record rejected: %s (uid=%s email=%s)", msg, uid, email)
+        errors.append(_with_line({"kind":"user","user_id":uid,"email":email,"error":msg}, lines, i))
+
+    # the identity fields are typed before the normalizer ever sees them
+    typed: list[int] = []
+    raw: list[dict] = []
+    for i, r in enumerate(records):
+        try:
+            for field in ("user_id", "email", "name"):
+                _text(r.get(field), field)
+        except TypeError as e:
+            reject(i, r.get("user_id"), r.get("email"), str(e))
+            continue
+        typed.append(i)
+        raw.append(r)
+
+    # one normalizer call for the whole batch
+    for i, r, norm in zip(typed, raw, _normalize_each(normalizer, "user", raw)):
+        if isinstance(norm, Exception):
+            reject(i, r.get("user_id"), r.get("email"), f"normalization failed: {norm}")
+            continue
+        try:
+            uid   = _text(norm.get("user_id") or r.get("user_id"), "user_id")
+            email = _text(norm.get("email"), "email").lower()
+            name  = _text(norm.get("name"), "name")
+        except TypeError as e:
+            reject(i, r.get("user_id"), r.get("email"), str(e))
+            continue
         if not uid or not email or not name:
-            msg = "user_id, email, and name are required"
-            log.warning("okta record rejected: %s (uid=%s email=%s)", msg, uid, email)
-            errors.append({"kind":"user","user_id":uid,"email":email,"error":msg})
+            reject(i, uid, email, "user_id, email, and name are required")
             continue
 
         try:
-            with db.begin_nested():  # savepoint
-                # resolve identity
-                row = db.get(User, uid)
-                email_owner = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
-
-                if row is None and email_owner is None:
-                    row = User(user_id=uid, email=email, name=name)
-                elif row is None and email_owner is not None:
-                    log.warning("email already exists, adopting existing row; email=%s new_uid=%s old_uid=%s",
-                                email, uid, email_owner.user_id)
-                    row = email_owner
-                elif row is not None and email_owner is not None and email_owner.user_id != row.user_id:
-                    log.warning("email conflict, using email owner; email=%s incoming_uid=%s owner_uid=%s",
-                                email, uid, email_owner.user_id)
-                    row = email_owner
-
-                # update fields
-                row.name        = name
-                row.email       = email
-                row.mfa_enabled = bool(r.get("mfa_enabled")) if r.get("mfa_enabled") is not None else None
-                row.last_login  = norm.get("last_login")
-                row.status      = norm.get("status")
-                groups          = r.get("groups") or []
-                row.groups      = ",".join(groups) if groups else None
-                db.merge(row)
-
-                # apps & links
-                for app_name in (r.get("apps") or []):
-                    app_name = str(app_name).strip()
-                    if not app_name:
-                        continue
-                    if not db.execute(text("SELECT 1 FROM apps WHERE name=:n"), {"n": app_name}).first():
-                        db.execute(text("INSERT INTO apps(name) VALUES (:n)"), {"n": app_name})
-                    if not db.execute(text(
-                        "SELECT 1 FROM user_apps WHERE user_id=:u AND app_name=:a"),
-                        {"u": row.user_id, "a": app_name}).first():
-                        db.execute(text(
-                            "INSERT INTO user_apps(user_id, app_name) VALUES (:u, :a)"),
-                            {"u": row.user_id, "a": app_name})
-
-            ok += 1
-        except (IntegrityError, StatementError, TypeError, ValueError) as e:
-            db.rollback()
-            log.exception("okta upsert failed: uid=%s email=%s", uid, email)
-            errors.append({"kind":"user","user_id":uid,"email":email,"error":str(e)})
-
-    return ok, errors
+            groups = r.get("groups") or []
+            if isinstance(groups, str):
+                groups = groups.split(",")
+            groups = list(dict.fromkeys(g for g in (str(g).strip() for g in groups) if g))
+            apps: list[str] = []
+            for app_name in (r.get("apps") or []):
+                app_name = str(app_name).strip()
+                if app_name and app_name not in apps:
+                    apps.append(app_name)
+            rows.append({
+                "user_id":     uid,
+                "name":        name,
+                "email":       email,
+                "mfa_enabled": bool(r.get("mfa_enabled")) if r.get("mfa_enabled") is not None else None,
+                "last_login":  norm.get("last_login"),
+                "status":      norm.get("status"),
+                "groups":      ",".join(groups) if groups else None,
+                "apps":        apps,
+                "group_names": groups,
+            })
+        except (TypeError, ValueError) as e:
+            reject(i, uid, email, str(e))
+
+    return rows, errors
+
+
+def _write_okta_chunk(db: Session, rows: list[dict]) -> int:
+    """
+    Upsert one chunk of prepared Okta rows in a fixed number of statements:
+    two IN lookups to resolve identities (and stored fingerprints), then one
+    statement each for users, user_apps, user_groups, fingerprints, ci_stats
+    and the change log. Apps are checked against the in-process registry; only unseen
+    names are inserted. Group membership is replaced, not merged: a changed
+    user's old user_groups rows are deleted first.
+    Returns how many rows were unchanged and skipped.
+    """
+    uids   = list({row["user_id"] for row in rows})
+    emails = list({row["email"] for row in rows})
+
+    # resolve identity: user_id -> email and email -> user_id for every row the chunk can touch
+    fp = CIFingerprint
+    stat_columns = tuple(getattr(User, c) for c in STAT_DIMENSIONS["user"][1])
+    ident = select(User.user_id, User.email, fp.digest, *stat_columns).outerjoin(
+        fp, (fp.kind == "user") & (fp.ci_id == User.user_id)
+    )
+    email_of: dict[str, str] = {}
+    owner_of: dict[str, str] = {}
+    digest_of: dict[str, str | None] = {}
+    stored: dict[str, dict] = {}
+    for cond in (User.user_id.in_(uids), User.email.in_(emails)):
+        for row in db.execute(ident.where(cond)):
+            email_of[row.user_id] = row.email
+            owner_of[row.email] = row.user_id
+            digest_of[row.user_id] = row.digest
+            stored[row.user_id] = row._mapping
+    existed = set(email_of)
+
+    user_rows: list[dict] = []
+    links: dict[tuple[str, str], None] = {}
+    groups_of: dict[str, list[str]] = {}
+    changed: dict[str, str] = {}
+    unchanged = 0
+    for row in rows:
+        uid, email = row["user_id"], row["email"]
+        owner = owner_of.get(email)
+        target = uid
+        if uid not in email_of and owner is not None:
+            log.warning("email already exists, adopting existing row; email=%s new_uid=%s old_uid=%s",
+                        email, uid, owner)
+            target = owner
+        elif uid in email_of and owner is not None and owner != uid:
+            log.warning("email conflict, using email owner; email=%s incoming_uid=%s owner_uid=%s",
+                        email, uid, owner)
+            target = owner
+
+        user_row = {"user_id": target, **{c: row[c] for c in USER_UPDATE_COLUMNS}}
+        # ingest only ever adds links, so an equal digest means every app is already linked
+        digest = _digest({**user_row, "apps": sorted(row["apps"])}, USER_UPDATE_COLUMNS + ("apps",))
+        if digest_of.get(target) == digest:
+            unchanged += 1
+            continue
+
+        # keep the maps current so later rows in the chunk see this write
+        old_email = email_of.get(target)
+        if old_email is not None and old_email != email and owner_of.get(old_email) == target:
+            del owner_of[old_email]
+        email_of[target] = email
+        owner_of[email] = target
+        digest_of[target] = changed[target] = digest
+
+        user_rows.append(user_row)
+        groups_of[target] = row["group_names"]  # the last row for a user wins, like the users upsert
+        for app_name in row["apps"]:
+            links[(target, app_name)] = None
+
+    if not user_rows:
+        return unchanged
+
+    # rows are applied in order, exactly like the old one-record-at-a-time loop
+    db.execute(_user_upsert_stmt(), user_rows)
+    record_changes(db, "user", change_entries(user_rows, "user_id", existed))
+    after = {row["user_id"]: row for row in user_rows}  # last record per user wins
+    apply_stat_deltas(db, "user", stat_deltas("user", stored, after))
+    if links:
+        # the registry knows the catalog; only names it has never seen go to the database
+        new_apps = unknown_apps(db, (a for _, a in links))
+        if new_apps:
+            # RETURNING only yields the apps this statement actually created
+            created = db.execute(
+                sqlite_insert(App.__table__).on_conflict_do_nothing(index_elements=[App.name])
+                .returning(App.app_id, App.name),
+                [{"name": a} for a in new_apps],
+            ).all()
+            record_changes(db, "app", [(name, "insert") for _, name in created])
+            stage_apps(db, [AppInfo(app_id, name) for app_id, name in created])
+            if len(created) < len(new_apps):
+                stage_reload(db)  # created behind the registry's back (another process)
+        db.execute(
+            sqlite_insert(UserApp.__table__).on_conflict_do_nothing(),
+            [{"user_id": u, "app_name": a} for u, a in links],
+        )
+    stale = [uid for uid in groups_of if uid in existed]
+    if stale:
+        db.execute(delete(UserGroup).where(UserGroup.user_id.in_(stale)))
+    memberships = [{"user_id": u, "group_name": g} for u, groups in groups_of.items() for g in groups]
+    if memberships:
+        db.execute(sqlite_insert(UserGroup.__table__).on_conflict_do_nothing(), memberships)
+    _store_digests(db, "user", changed)
+    return unchanged
+
+
+def upsert_okta_rows(
+    db: Session, rows: list[dict], chunk_size: int = INGEST_CHUNK_SIZE
+) -> tuple[int, list[dict], int]:
+    """
+    Write prepared Okta rows chunk by chunk.
+    If a chunk fails, only that chunk is replayed row by row to isolate the bad record(s).
+    Returns (ok, errors, unchanged) where `unchanged` rows count as ok but weren't rewritten.
+    """
+    ok = unchanged = 0
+    errors: list[dict] = []
+
+    begin_write(db)
+    for chunk in _chunked(rows, chunk_size):
+        try:
+            with db.begin_nested():
+                unchanged += _write_okta_chunk(db, chunk)
+            ok += len(chunk)
+            continue
+        except OperationalError:
+            raise  # locked/busy database: the whole transaction failed, not a record
+        except (IntegrityError, StatementError, TypeError, ValueError):
+            log.warning("bulk okta upsert failed for a chunk of %d rows; retrying row by row", len(chunk))
+
+        for row in chunk:
+            try:
+                with db.begin_nested():  # savepoint
+                    unchanged += _write_okta_chunk(db, [row])
+                ok += 1
+            except OperationalError:
+                raise  # as in upsert_device_rows: a busy database fails the batch
+            except (IntegrityError, StatementError, TypeError, ValueError) as e:
+                log.exception("okta upsert failed: uid=%s email=%s", row["user_id"], row["email"])
+                errors.append({"kind":"user","user_id":row["user_id"],"email":row["email"],"error":str(e)})
+
+    return ok, errors, unchanged
+
+
+def update_or_insert_okta(
+    db: Session, records: list[dict], normalizer=None, chunk_size: int = INGEST_CHUNK_SIZE
+) -> tuple[int, list[dict], int]:
+    """
+    Upsert Okta users plus their apps and user<->app links.
+
+    Identity rules (unchanged from the per-record version):
+      * new user_id and unknown email -> new row
+      * new user_id but the email already exists -> adopt the email owner's row
+      * known user_id whose email belongs to another user -> the email owner wins
+    Each chunk costs a handful of statements no matter how many users or apps it holds.
+    Returns (ok, errors, unchanged).
+    """
+    rows, errors = prepare_okta_rows(records, normalizer)
+    ok, write_errors, unchanged = upsert_okta_rows(db, rows, chunk_size)
+    return ok, errors + write_errors, unchanged
+
+
+# --------------------------------------------------------------------
+# Mixed batches
+# --------------------------------------------------------------------
+def kind_of(item: dict) -> str | None:
+    """
+    Quick classifier for incoming records.
+    Returns:
+      "hardware" if it looks like a device record,
+      "okta" if it looks like an Okta user record,
+      None if it doesn't match either schema.
+
+      This can be expanded to add more data types in the future.
+    """
+    if "device_id" in item and "hostname" in item:
+        return "hardware"
+    if "user_id" in item and "email" in item:
+        return "okta"
+    return None
+
+
+def ingest_records(db: Session, records: list[dict], normalizer=None) -> tuple[int, list[dict], int]:
+    """
+    Split records by `kind_of` and run each group through its batched upsert.
+    Both groups share the caller's transaction; bad records are reported per record,
+    those rejected before the write with their `index` in `records`.
+    Records of unknown kind are skipped, so callers should reject them first.
+    Returns (ingested, errors, unchanged).
+    """
+    normalizer = normalizer or get_default_normalizer()
+    hardware: list[dict] = []
+    okta: list[dict] = []
+    hardware_at: list[int] = []
+    okta_at: list[int] = []
+    for i, r in enumerate(records):
+        kind = kind_of(r)
+        if kind == "hardware":
+            hardware.append(r)
+            hardware_at.append(i)
+        elif kind == "okta":
+            okta.append(r)
+            okta_at.append(i)
+
+    ingested = unchanged = 0
+    errors: list[dict] = []
+    for group, positions, upsert in ((hardware, hardware_at, update_or_insert_devices),
+                                     (okta, okta_at, update_or_insert_okta)):
+        if group:
+            ok, errs, same = upsert(db, group, normalizer=normalizer)
+            ingested += ok
+            unchanged += same
+            for e in errs:
+                if "index" in e:
+                    e["index"] = positions[e["index"]]  # index in the group -> index in `records`
+            errors.extend(errs)
+    return ingested, errors, unchanged
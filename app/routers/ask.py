@@ -5,7 +5,7 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
-from app.db import get_db
+from app.db import get_read_db
 from app.nl.naturalsql_local import generate_sql
 
 # --------------------------------------------------------------------
@@ -21,7 +21,7 @@ class AskRequest(BaseModel):
 
 
 @router.post("/ask")
-def ask(req: AskRequest, db: Session = Depends(get_db)) -> Dict[str, Any]:
+def ask(req: AskRequest, db: Session = Depends(get_read_db)) -> Dict[str, Any]:
     """
     Accept a natural-language question, convert it to SQL, execute it,
     and return both the generated SQL and the result rows.
@@ -49,7 +49,7 @@ def ask(req: AskRequest, db: Session = Depends(get_db)) -> Dict[str, Any]:
         # Use the local NL->SQL generator to build a safe SELECT statement
         sql = generate_sql(question, limit=lim)
 
-        # Execute the query in read-only mode and fetch as dicts
+        # Execute on the read-only engine (mode=ro + query_only) and fetch as dicts
         result = db.execute(text(sql)).mappings().all()
         rows: List[Dict[str, Any]] = [dict(m) for m in result]
 
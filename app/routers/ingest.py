@@ -1,10 +1,25 @@
-from typing import List, Dict
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import logging
+import zlib
+from typing import AsyncIterator, List, Dict
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
+from app.admission import AdmissionController, IngestSlot, get_admission, ingest_slot, source_of, too_busy
 from app.db import get_db
-from app.repositories import update_or_insert_devices, update_or_insert_okta
+from app.jobs import IngestJobManager, get_job_manager
+from app.repositories import ingest_records, kind_of
 from app.normalizers import get_default_normalizer
+from app.settings import (
+    INGEST_JOB_MAX_PENDING,
+    INGEST_RETRY_AFTER_SECS,
+    INGEST_STREAM_BATCH,
+    INGEST_STREAM_MAX_LINE_BYTES,
+)
+
+log = logging.getLogger(__name__)
 
 # --------------------------------------------------------------------
 # Router setup
@@ -12,25 +27,23 @@ from app.normalizers import get_default_normalizer
 router = APIRouter(prefix="", tags=["ingest"])
 
 
-def _kind_of(item: Dict) -> str | None:
-    """
-    Quick classifier for incoming records.
-    Returns:
-      "hardware" if it looks like a device record,
-      "okta" if it looks like an Okta user record,
-      None if it doesn't match either schema.
-      
-      This can be expanded to add more data types in the future.
-    """
-    if "device_id" in item and "hostname" in item:
-        return "hardware"
-    if "user_id" in item and "email" in item:
-        return "okta"
-    return None
+def _payload_kinds(payload: List[Dict]) -> set[str]:
+    """Validate a JSON-array payload and return the record kinds it contains."""
+    # Validate top-level structure
+    if not isinstance(payload, list) or not payload:
+        raise HTTPException(400, "Payload must be a non-empty JSON array")
+
+    # Determine what kinds of records we have
+    kinds = { kind_of(p) for p in payload }
+    if None in kinds:
+        # At least one record doesn't match either schema
+        raise HTTPException(400, "Unknown record in payload (not hardware or okta)")
+    kinds.discard(None)  # just to be safe
+    return kinds
 
 
 @router.post("/ingest")
-def ingest(payload: List[Dict], db: Session = Depends(get_db)):
+def ingest(payload: List[Dict], db: Session = Depends(get_db), slot: IngestSlot = Depends(ingest_slot)):
     """
     Bulk-ingest hardware devices or Okta user records.
 
@@ -40,97 +53,271 @@ def ingest(payload: List[Dict], db: Session = Depends(get_db)):
         "okta" schema (user_id + email).
 
     Behavior:
-        * Homogeneous payload (all hardware or all okta):
-          → single bulk insert/update for speed.
-        * Mixed payload:
-          → processes each record individually so one bad record
-            doesn’t block others.
+        * Records are split by kind and each group goes through the
+          batched upsert for that kind, whether the payload is
+          homogeneous or mixed.
+        * Bad records are reported individually and never block the
+          rest of the batch; everything else is committed once.
+        * Admission control: when too many ingests are running or queued,
+          or the source is over its record rate, the request is refused
+          with 429 and a Retry-After header.
 
     Returns:
         {
           "ok": True,
           "source": "hardware" | "okta" | "mixed",
           "ingested": <count of successful rows>,
+          "unchanged": <successful rows identical to what is stored; not rewritten>,
           "failed": <count of failed rows>,
           "errors": [ ... up to 10 sample errors ... ]
         }
     """
-    # Validate top-level structure
-    if not isinstance(payload, list) or not payload:
-        raise HTTPException(400, "Payload must be a non-empty JSON array")
-
+    kinds = _payload_kinds(payload)
+    slot.charge(len(payload))
     normalizer = get_default_normalizer()
 
-    # Determine what kinds of records we have
-    kinds = { _kind_of(p) for p in payload }
-    if None in kinds:
-        # At least one record doesn't match either schema
-        raise HTTPException(400, "Unknown record in payload (not hardware or okta)")
-    kinds.discard(None)  # just to be safe
-
     try:
-        # Fast path: all records are the same kind
-        if len(kinds) == 1:
-            kind = next(iter(kinds))
-            if kind == "hardware":
-                ok, errors = update_or_insert_devices(db, payload, normalizer=normalizer)
-                db.commit()
-                return {
-                    "ok": True,
-                    "source": "hardware",
-                    "ingested": ok,
-                    "failed": len(errors),
-                    "errors": errors[:10],  # limit size of error list
-                }
-            else:  # "okta"
-                ok, errors = update_or_insert_okta(db, payload, normalizer=normalizer)
-                db.commit()
-                return {
-                    "ok": True,
-                    "source": "okta",
-                    "ingested": ok,
-                    "failed": len(errors),
-                    "errors": errors[:10],
-                }
-
-        # Mixed path: handle each record separately. 
-        # Commit successes one at a time so a bad record won’t abort the whole batch.
-        ingested = 0
-        errors: List[Dict] = []
-
-        for rec in payload:
-            kind = _kind_of(rec)
-            try:
-                if kind == "hardware":
-                    ok, errs = update_or_insert_devices(db, [rec], normalizer=normalizer)
-                else:  # "okta"
-                    ok, errs = update_or_insert_okta(db, [rec], normalizer=normalizer)
-
-                if ok == 1 and not errs:
-                    db.commit()
-                    ingested += 1
-                else:
-                    db.rollback()
-                    errors.extend(errs or [{"error": "Unknown validation error", "record": rec}])
-            except Exception as e:
-                # Roll back this record and log the failure
-                db.rollback()
-                errors.append({"error": str(e), "record": rec})
-
+        ingested, errors, unchanged = ingest_records(db, payload, normalizer)
+        db.commit()
         return {
             "ok": True,
-            "source": "mixed",
+            "source": next(iter(kinds)) if len(kinds) == 1 else "mixed",
             "ingested": ingested,
+            "unchanged": unchanged,
             "failed": len(errors),
-            "errors": errors[:10],
+            "errors": errors[:10],  # limit size of error list
         }
 
     # ------------------------------------------------------------
     # Global error handling
     # ------------------------------------------------------------
+    except OperationalError as e:
+        # database locked/busy past busy_timeout: nothing was written, the client should retry
+        db.rollback()
+        raise _db_busy(e)
     except ValueError as e:
         db.rollback()
         raise HTTPException(400, str(e))
     except Exception as e:
         db.rollback()
         raise HTTPException(500, f"Ingest failed: {e}")
+
+
+def _db_busy(e: OperationalError) -> HTTPException:
+    log.warning("ingest rolled back, database busy: %s", e.orig)
+    return HTTPException(503, f"Database busy, retry later: {e.orig}",
+                         headers={"Retry-After": str(max(1, round(INGEST_RETRY_AFTER_SECS)))})
+
+
+# --------------------------------------------------------------------
+# Streaming NDJSON ingest
+# --------------------------------------------------------------------
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+_INFLATE_STEP = 1 << 20  # max decompressed bytes produced per zlib call
+
+
+class _GzipBody:
+    """
+    Inflate a gzip body in bounded steps so a small body can't explode in memory.
+    Handles multi-member bodies (`cat a.gz b.gz`, pigz): each member that ends
+    hands its trailing bytes to a fresh decompressor.
+    """
+    def __init__(self):
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def inflate(self, data: bytes):
+        while data:
+            if self._inflater.eof:
+                self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            yield self._inflater.decompress(data, _INFLATE_STEP)
+            while self._inflater.unconsumed_tail:
+                yield self._inflater.decompress(self._inflater.unconsumed_tail, _INFLATE_STEP)
+            data = self._inflater.unused_data  # bytes after the end of this member
+
+    @property
+    def complete(self) -> bool:
+        """True once the last member seen has its end-of-stream trailer."""
+        return self._inflater.eof
+
+
+async def _ndjson_lines(request: Request, gzipped: bool) -> AsyncIterator[tuple[int, bytes | None]]:
+    """
+    Yield (line_no, line) pairs from the request body as it arrives.
+    Only the current partial line is buffered. A line longer than
+    INGEST_STREAM_MAX_LINE_BYTES is dropped and yielded as None.
+    """
+    inflater = _GzipBody() if gzipped else None
+    buf = b""
+    line_no = 0
+    too_long = False
+
+    async for raw in request.stream():
+        try:
+            pieces = inflater.inflate(raw) if inflater is not None else (raw,)
+            for piece in pieces:
+                parts = (buf + piece).split(b"\n")
+                buf = parts.pop()
+                for part in parts:
+                    line_no += 1
+                    yield line_no, (None if too_long else part)
+                    too_long = False
+                if len(buf) > INGEST_STREAM_MAX_LINE_BYTES:
+                    too_long, buf = True, b""
+        except zlib.error as e:
+            raise HTTPException(400, f"Invalid gzip body: {e}")
+    if inflater is not None and not inflater.complete:
+        # lines already yielded were committed; the rest of the body is lost
+        raise HTTPException(400, "truncated gzip body")
+
+    if buf or too_long:
+        yield line_no + 1, (None if too_long else buf)
+
+
+def _ingest_and_commit(db: Session, records: List[Dict], normalizer) -> tuple[int, List[Dict], int]:
+    """Upsert one streamed chunk and commit it, so memory and transaction size stay bounded."""
+    try:
+        result = ingest_records(db, records, normalizer)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+
+
+@router.post("/ingest/stream")
+async def ingest_stream(request: Request, db: Session = Depends(get_db),
+                        slot: IngestSlot = Depends(ingest_slot)):
+    """
+    Stream-ingest newline-delimited JSON (one hardware or Okta record per line).
+
+    Accepts:
+        Content-Type: application/x-ndjson
+        Content-Encoding: gzip (optional; multi-member bodies such as `cat a.gz b.gz` are fine)
+
+    Behavior:
+        * The body is parsed line by line as it arrives; it is never held in memory whole.
+        * Every INGEST_STREAM_BATCH records are normalized, upserted and committed,
+          so peak memory is one batch regardless of payload size.
+        * Bad lines (invalid JSON, unknown schema, too long) are counted as
+          failures with their line number and never block the rest.
+        * Takes an ingest slot like /ingest (429 when full). A source over its
+          record rate is slowed down between batches rather than refused.
+
+    Returns:
+        {
+          "ok": True,
+          "source": "stream",
+          "lines": <lines read>,
+          "chunks": <batches committed>,
+          "ingested": <count of successful rows>,
+          "unchanged": <successful rows identical to what is stored>,
+          "failed": <count of failed rows/lines>,
+          "errors": [ ... up to 10 sample errors ... ]
+        }
+    """
+    ctype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if ctype not in NDJSON_CONTENT_TYPES:
+        raise HTTPException(415, "Expected Content-Type: application/x-ndjson")
+    gzipped = request.headers.get("content-encoding", "").strip().lower() == "gzip"
+
+    normalizer = get_default_normalizer()
+    summary = {"ok": True, "source": "stream", "lines": 0, "chunks": 0,
+               "ingested": 0, "unchanged": 0, "failed": 0, "errors": []}
+
+    def _fail(errs: List[Dict]):
+        summary["failed"] += len(errs)
+        summary["errors"].extend(errs[: 10 - len(summary["errors"])])
+
+    async def _flush(batch: List[Dict], lines: List[int]):
+        await slot.throttle(len(batch))
+        try:
+            ok, errs, unchanged = await run_in_threadpool(_ingest_and_commit, db, batch, normalizer)
+        except OperationalError as e:
+            raise _db_busy(e)
+        except Exception as e:
+            log.exception("stream ingest failed after %d committed records", summary["ingested"])
+            raise HTTPException(500, f"Ingest failed after {summary['ingested']} committed records: {e}")
+        summary["chunks"] += 1
+        summary["ingested"] += ok
+        summary["unchanged"] += unchanged
+        for e in errs:
+            if "index" in e:
+                e["line"] = lines[e.pop("index")]  # report records by line, like the parse errors
+        _fail(errs)
+
+    batch: List[Dict] = []
+    batch_lines: List[int] = []
+    async for line_no, line in _ndjson_lines(request, gzipped):
+        summary["lines"] = line_no
+        if line is None:
+            _fail([{"line": line_no, "error": f"line longer than {INGEST_STREAM_MAX_LINE_BYTES} bytes"}])
+            continue
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError as e:
+            _fail([{"line": line_no, "error": f"invalid JSON: {e}"}])
+            continue
+        if not isinstance(rec, dict) or kind_of(rec) is None:
+            _fail([{"line": line_no, "error": "Unknown record (not hardware or okta)"}])
+            continue
+
+        batch.append(rec)
+        batch_lines.append(line_no)
+        if len(batch) >= INGEST_STREAM_BATCH:
+            await _flush(batch, batch_lines)
+            batch, batch_lines = [], []
+
+    if batch:
+        await _flush(batch, batch_lines)
+    if summary["lines"] == 0:
+        raise HTTPException(400, "Body must contain at least one NDJSON record")
+    return summary
+
+
+# --------------------------------------------------------------------
+# Background ingest jobs
+# --------------------------------------------------------------------
+@router.post("/ingest/jobs", status_code=202)
+def submit_ingest_job(payload: List[Dict], request: Request,
+                      jobs: IngestJobManager = Depends(get_job_manager),
+                      admission: AdmissionController = Depends(get_admission)):
+    """
+    Accept the same JSON array as /ingest into the background job queue
+    and return immediately. Poll GET /ingest/jobs/{job_id} for progress.
+    429 when INGEST_JOB_MAX_PENDING jobs are already queued or running,
+    or when the source is over its record rate.
+    """
+    _payload_kinds(payload)
+    if jobs.pending() >= INGEST_JOB_MAX_PENDING:
+        raise too_busy("Too many pending ingest jobs, retry later", INGEST_RETRY_AFTER_SECS)
+    IngestSlot(admission, source_of(request)).charge(len(payload))
+    return jobs.submit(payload).to_dict()
+
+
+@router.get("/ingest/jobs")
+def list_ingest_jobs(jobs: IngestJobManager = Depends(get_job_manager)):
+    """Summaries of queued, running and recently finished jobs (oldest first)."""
+    return [j.to_dict() for j in jobs.list()]
+
+
+@router.get("/ingest/jobs/{job_id}")
+def get_ingest_job(job_id: str, jobs: IngestJobManager = Depends(get_job_manager)):
+    """Status, progress, ingested/failed counts and sample errors for one job."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job.to_dict()
+
+
+@router.delete("/ingest/jobs/{job_id}")
+def cancel_ingest_job(job_id: str, jobs: IngestJobManager = Depends(get_job_manager)):
+    """
+    Cancel a job. Queued jobs never start; running jobs stop after the
+    batch in progress, keeping what was already committed.
+    """
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job.to_dict()
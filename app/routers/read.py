@@ -1,20 +1,81 @@
+import bisect
 from typing import Any, Dict, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, literal_column, select
 
-from app.db import get_db
-from app.models import User, Device, App, UserApp
+from app.changelog import read_changes
+from app.db import get_read_db
+from app.export import EXPORT_EXTENSIONS, EXPORT_FORMATS, export_stream, negotiate_format
+from app.models import User, Device, App, UserApp, UserGroup
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, keyset_page
+from app.registry import AppInfo, fresh_app_registry
+from app.search import MIN_TERM, SEARCH_TABLES, contains_rowids, search
+from app.settings import CHANGE_LOG_PAGE_MAX
+from app.stats import STAT_DIMENSIONS, read_stats
 
 router = APIRouter(prefix="", tags=["read"])
 
+# -------------------------------------------------------------------
+# Batched prefetch: related rows for a whole page in one IN query each.
+# Results are grouped in rowid order, the order the per-row lookups used to return.
+# -------------------------------------------------------------------
+def _group_by_first(rows) -> Dict[Any, List[Any]]:
+    out: Dict[Any, List[Any]] = {}
+    for key, value in rows:
+        out.setdefault(key, []).append(value)
+    return out
+
+def _apps_by_user(db: Session, user_ids: List[str]) -> Dict[str, List[str]]:
+    """user_id -> linked app names (sorted by name, as the user_apps PK returns them)."""
+    if not user_ids:
+        return {}
+    return _group_by_first(db.execute(
+        select(UserApp.user_id, UserApp.app_name)
+        .where(UserApp.user_id.in_(user_ids))
+        .order_by(UserApp.user_id, UserApp.app_name)
+    ))
+
+def _devices_by_user(db: Session, user_ids: List[str]) -> Dict[str, List[str]]:
+    """user_id -> IDs of the devices assigned to it."""
+    if not user_ids:
+        return {}
+    return _group_by_first(db.execute(
+        select(Device.assigned_user, Device.device_id)
+        .where(Device.assigned_user.in_(user_ids))
+        .order_by(literal_column("devices.rowid"))
+    ))
+
+def _users_by_app(db: Session, app_names: List[str]) -> Dict[str, List[str]]:
+    """app name -> IDs of the users linked to it."""
+    if not app_names:
+        return {}
+    return _group_by_first(db.execute(
+        select(UserApp.app_name, UserApp.user_id)
+        .where(UserApp.app_name.in_(app_names))
+        .order_by(literal_column("user_apps.rowid"))
+    ))
+
+def _user_details(db: Session, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """user_id -> {user_id, name, email} for the assigned_user_details of devices."""
+    if not user_ids:
+        return {}
+    rows = db.execute(select(User.user_id, User.name, User.email).where(User.user_id.in_(user_ids)))
+    return {r.user_id: {"user_id": r.user_id, "name": r.name, "email": r.email} for r in rows}
+
 # -------------------------------------------------------------------
 # Helper serializers: turn ORM objects into plain dicts for JSON
 # -------------------------------------------------------------------
-def _user_to_dict(u: User, db: Session) -> Dict[str, Any]:
+def _users_to_dicts(users: List[User], db: Session) -> List[Dict[str, Any]]:
+    """User rows plus related apps and device IDs (two queries for the whole list)."""
+    uids = [u.user_id for u in users]
+    apps = _apps_by_user(db, uids)
+    devices = _devices_by_user(db, uids)
+    return [_user_to_dict(u, apps.get(u.user_id, []), devices.get(u.user_id, [])) for u in users]
+
+def _user_to_dict(u: User, app_names: List[str], device_ids: List[str]) -> Dict[str, Any]:
     """Return a user row plus related apps and device IDs."""
-    app_names = [ua.app_name for ua in db.query(UserApp).filter(UserApp.user_id == u.user_id).all()]
-    devices = db.query(Device).filter(Device.assigned_user == u.user_id).all()
     return {
         "user_id": u.user_id,
         "name": u.name,
@@ -24,16 +85,16 @@ def _user_to_dict(u: User, db: Session) -> Dict[str, Any]:
         "status": u.status,
         "groups": u.groups,
         "apps": app_names,
-        "devices": [d.device_id for d in devices],
+        "devices": device_ids,
     }
 
-def _device_to_dict(d: Device, db: Session) -> Dict[str, Any]:
+def _devices_to_dicts(devices: List[Device], db: Session) -> List[Dict[str, Any]]:
+    """Device rows plus assigned-user details (one query for the whole list)."""
+    users = _user_details(db, list({d.assigned_user for d in devices if d.assigned_user}))
+    return [_device_to_dict(d, users.get(d.assigned_user) if d.assigned_user else None) for d in devices]
+
+def _device_to_dict(d: Device, user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     """Return a device row and, if present, basic info about the assigned user."""
-    user = None
-    if d.assigned_user:
-        u = db.query(User).filter(User.user_id == d.assigned_user).first()
-        if u:
-            user = {"user_id": u.user_id, "name": u.name, "email": u.email}
     return {
         "device_id": d.device_id,
         "hostname": d.hostname,
@@ -47,82 +108,152 @@ def _device_to_dict(d: Device, db: Session) -> Dict[str, Any]:
         "last_checkin": d.last_checkin,
     }
 
-def _app_to_dict(a: App, db: Session) -> Dict[str, Any]:
+def _apps_to_dicts(apps: List[App | AppInfo], db: Session) -> List[Dict[str, Any]]:
+    """App rows (ORM objects or registry entries) plus user IDs (one query for the whole list)."""
+    users = _users_by_app(db, [a.name for a in apps])
+    return [_app_to_dict(a, users.get(a.name, [])) for a in apps]
+
+def _app_to_dict(a: App | AppInfo, user_ids: List[str]) -> Dict[str, Any]:
     """Return an app row plus IDs of users who have it."""
-    uids = [ua.user_id for ua in db.query(UserApp).filter(UserApp.app_name == a.name).all()]
     return {
         "app_id": a.app_id,
         "name": a.name,
         "owner": a.owner,
         "type": a.type,
-        "users": uids,
+        "users": user_ids,
     }
 
 # -------------------------------------------------------------------
 # List endpoints
+# Pages are ordered by (sort, primary key). Pass the X-Next-Cursor header of a
+# response as `cursor` to get the next page; it is absent on the last page.
+# `offset` still works but gets slower with depth and can't be combined with `cursor`.
 # -------------------------------------------------------------------
+USER_SORTS = {"user_id": User.user_id, "name": User.name, "last_login": User.last_login}
+DEVICE_SORTS = {"device_id": Device.device_id, "hostname": Device.hostname, "last_checkin": Device.last_checkin}
+APP_SORTS = ("app_id", "name")
+
+def _sort_pattern(sorts) -> str:
+    return "^(" + "|".join(sorts) + ")$"
+
+def _check_paging(cursor: Optional[str], offset: int) -> None:
+    if cursor and offset:
+        raise HTTPException(400, "use either cursor or offset, not both")
+
+def _set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
 @router.get("/users")
 def list_users(
     status: Optional[str] = Query(None, description="Exact user status match"),
     mfa: Optional[bool] = Query(None, description="True/False for MFA enabled"),
     app: Optional[str] = Query(None, description="User has app (name contains, case-insensitive)"),
+    group: Optional[str] = Query(None, description="User is a member of this group (exact name)"),
+    sort: str = Query("user_id", pattern=_sort_pattern(USER_SORTS), description="Order by this column, then user_id"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     limit: int = Query(100, ge=1, le=2000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    response: Response = None,
+    db: Session = Depends(get_read_db),
 ) -> List[Dict[str, Any]]:
     """
     List users with optional filters:
       - status
       - mfa_enabled
       - app name substring
+      - group membership
     """
+    _check_paging(cursor, offset)
     q = db.query(User)
     if status:
         q = q.filter(User.status == status)
     if mfa is not None:
         q = q.filter(User.mfa_enabled == mfa)
     if app:
-        # Filter by users linked to apps matching the name substring
-        ua_sub = (
-            db.query(UserApp.user_id)
-            .join(App, App.name == UserApp.app_name)
-            .filter(func.lower(UserApp.app_name).like(f"%{app.lower()}%"))
-            .subquery()
-        )
-        q = q.filter(User.user_id.in_(ua_sub))
-    q = q.offset(offset).limit(limit)
-    return [_user_to_dict(u, db) for u in q.all()]
+        # Filter by users linked to apps matching the name substring; the names
+        # come from the app registry, the links through the user_apps.app_name index
+        needle = app.lower()
+        names = [a.name for a in fresh_app_registry(db).all() if needle in a.name.lower()]
+        q = q.filter(User.user_id.in_(select(UserApp.user_id).where(UserApp.app_name.in_(names))))
+    if group:
+        # served by ix_user_groups_group, not a LIKE over users.groups
+        q = q.filter(User.user_id.in_(select(UserGroup.user_id).where(UserGroup.group_name == group)))
+    users, next_cursor = keyset_page(q, sort, USER_SORTS[sort], User.user_id, cursor, limit, offset)
+    _set_next_cursor(response, next_cursor)
+    return _users_to_dicts(users, db)
 
 @router.get("/devices")
 def list_devices(
     status: Optional[str] = Query(None, description="Exact device status match"),
     location: Optional[str] = Query(None, description="Location contains, case-insensitive"),
+    sort: str = Query("device_id", pattern=_sort_pattern(DEVICE_SORTS), description="Order by this column, then device_id"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     limit: int = Query(100, ge=1, le=2000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    response: Response = None,
+    db: Session = Depends(get_read_db),
 ) -> List[Dict[str, Any]]:
     """List devices with optional filters on status and location."""
+    _check_paging(cursor, offset)
     q = db.query(Device)
     if status:
         q = q.filter(Device.status == status)
-    if location:
+    if location and len(location) >= MIN_TERM:
+        q = q.filter(literal_column("devices.rowid").in_(contains_rowids("device", "location", location)))
+    elif location:
         q = q.filter(func.lower(Device.location).like(f"%{location.lower()}%"))
-    q = q.offset(offset).limit(limit)
-    return [_device_to_dict(d, db) for d in q.all()]
+    devices, next_cursor = keyset_page(q, sort, DEVICE_SORTS[sort], Device.device_id, cursor, limit, offset)
+    _set_next_cursor(response, next_cursor)
+    return _devices_to_dicts(devices, db)
 
 @router.get("/apps")
 def list_apps(
     q: Optional[str] = Query(None, description="Name contains, case-insensitive"),
+    sort: str = Query("app_id", pattern=_sort_pattern(APP_SORTS), description="Order by this column, then app_id"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     limit: int = Query(100, ge=1, le=2000),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    response: Response = None,
+    db: Session = Depends(get_read_db),
 ) -> List[Dict[str, Any]]:
-    """List apps by optional name substring."""
-    qq = db.query(App)
+    """List apps by optional name substring (served from the in-process app registry)."""
+    _check_paging(cursor, offset)
+    apps = fresh_app_registry(db).all()
     if q:
-        qq = qq.filter(func.lower(App.name).like(f"%{q.lower()}%"))
-    qq = qq.offset(offset).limit(limit)
-    return [_app_to_dict(a, db) for a in qq.all()]
+        needle = q.lower()
+        apps = [a for a in apps if needle in a.name.lower()]
+    def key(a):
+        return getattr(a, sort), a.app_id
+
+    apps.sort(key=key)
+    start = offset
+    if cursor:
+        start = bisect.bisect_right([key(a) for a in apps], decode_cursor(cursor, sort, getattr(App, sort), App.app_id))
+    page = apps[start:start + limit]
+    if start + limit < len(apps):
+        _set_next_cursor(response, encode_cursor(sort, *key(page[-1])))
+    return _apps_to_dicts(page, db)
+
+# -------------------------------------------------------------------
+# Full-text search
+# -------------------------------------------------------------------
+@router.get("/search")
+def search_cis(
+    q: str = Query(..., min_length=MIN_TERM, description=f"Text to find; terms under {MIN_TERM} characters are ignored"),
+    kind: Optional[List[str]] = Query(None, description="Restrict to these kinds (user, device, app)"),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+) -> List[Dict[str, Any]]:
+    """
+    Rank CIs of every kind whose hostname, location, name or email contains
+    each term of `q`. Hits at the start of a field come first, then bm25 rank.
+    Each hit: {"kind", "id", "fields", "score", "prefix"}; fetch the full CI with /ci/{id}?kind=<kind>.
+    """
+    unknown = set(kind or []) - set(SEARCH_TABLES)
+    if unknown:
+        raise HTTPException(422, f"unknown kind(s): {', '.join(sorted(unknown))}")
+    return search(db, q, kind, limit)
 
 # -------------------------------------------------------------------
 # Unified CI lookup
@@ -135,7 +266,7 @@ def get_ci(
         pattern="^(user|device|app)$",
         description="Restrict search to a specific type if desired",
     ),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ) -> Dict[str, Any]:
     """
     Fetch a single Configuration Item (CI) by ID.
@@ -146,41 +277,115 @@ def get_ci(
     if kind == "device":
         d = db.query(Device).filter(Device.device_id == ci_id).first()
         if not d: raise HTTPException(404, "Device not found")
-        return {"kind": "device", "item": _device_to_dict(d, db)}
+        return {"kind": "device", "item": _devices_to_dicts([d], db)[0]}
 
     if kind == "user":
         u = db.query(User).filter(User.user_id == ci_id).first()
         if not u: raise HTTPException(404, "User not found")
-        return {"kind": "user", "item": _user_to_dict(u, db)}
+        return {"kind": "user", "item": _users_to_dicts([u], db)[0]}
 
     if kind == "app":
-        a = db.query(App).filter(App.name == ci_id).first()
-        if not a:
-            # If name fails, try integer app_id
-            try:
-                aid = int(ci_id)
-                a = db.query(App).filter(App.app_id == aid).first()
-            except ValueError:
-                a = None
+        a = _find_app(ci_id, db)
         if not a: raise HTTPException(404, "App not found")
-        return {"kind": "app", "item": _app_to_dict(a, db)}
+        return {"kind": "app", "item": _apps_to_dicts([a], db)[0]}
 
     # Auto-detect search order
     d = db.query(Device).filter(Device.device_id == ci_id).first()
-    if d: return {"kind": "device", "item": _device_to_dict(d, db)}
+    if d: return {"kind": "device", "item": _devices_to_dicts([d], db)[0]}
 
     u = db.query(User).filter(User.user_id == ci_id).first()
-    if u: return {"kind": "user", "item": _user_to_dict(u, db)}
-
-    a = db.query(App).filter(App.name == ci_id).first()
-    if a: return {"kind": "app", "item": _app_to_dict(a, db)}
+    if u: return {"kind": "user", "item": _users_to_dicts([u], db)[0]}
 
-    # Final attempt: numeric app_id
-    try:
-        aid = int(ci_id)
-        a2 = db.query(App).filter(App.app_id == aid).first()
-        if a2: return {"kind": "app", "item": _app_to_dict(a2, db)}
-    except ValueError:
-        pass
+    # Then app name, and finally numeric app_id
+    a = _find_app(ci_id, db)
+    if a: return {"kind": "app", "item": _apps_to_dicts([a], db)[0]}
 
     raise HTTPException(404, "CI not found")
+
+
+def _find_app(ci_id: str, db: Session) -> Optional[AppInfo]:
+    """App by name, else by integer app_id; answered by the app registry after its freshness check."""
+    registry = fresh_app_registry(db)
+    a = registry.get(ci_id)
+    if a is None:
+        try:
+            a = registry.by_id(int(ci_id))
+        except ValueError:
+            a = None
+    return a
+
+# -------------------------------------------------------------------
+# Summary counts
+# -------------------------------------------------------------------
+@router.get("/stats")
+def get_stats(
+    kind: Optional[str] = Query(None, pattern="^(user|device)$", description="Only this CI kind"),
+    group_by: Optional[List[str]] = Query(
+        None, description="Dimensions to break down: device os/location/encryption/status, user mfa_enabled/status"
+    ),
+    db: Session = Depends(get_read_db),
+) -> Dict[str, Any]:
+    """
+    CI counts per value of each dimension, from the ci_stats counters that
+    ingest maintains (no table scan):
+        {"device": {"total": 120, "os": [{"value": "macOS", "count": 80}, ...], ...}, "user": {...}}
+    """
+    kinds = [kind] if kind else list(STAT_DIMENSIONS)
+    if group_by:
+        known = {d for k in kinds for d in STAT_DIMENSIONS[k][1]}
+        unknown = set(group_by) - known
+        if unknown:
+            raise HTTPException(422, f"unknown group_by: {', '.join(sorted(unknown))}")
+        # only the kinds that have one of the requested dimensions
+        kinds = [k for k in kinds if set(group_by) & set(STAT_DIMENSIONS[k][1])]
+    return read_stats(db, kinds, group_by)
+
+# -------------------------------------------------------------------
+# Bulk export
+# -------------------------------------------------------------------
+@router.get("/export/{kind}")
+def export_cis(
+    kind: str = Path(..., pattern="^(users|devices|apps)$"),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv|arrow)$", description="Overrides the Accept header"),
+    accept: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+) -> StreamingResponse:
+    """
+    Every CI of `kind`, streamed in chunks from a server-side cursor (flat memory).
+    Format by `format` or Accept: application/x-ndjson (default), text/csv, or
+    application/vnd.apache.arrow.stream (406 if the server lacks pyarrow).
+    List fields (apps, devices, users) are JSON arrays in NDJSON and CSV cells.
+    """
+    fmt = negotiate_format(format, accept)
+    # the stream opens its own connection: the request session is closed before the body is sent
+    body = export_stream(db.get_bind(), kind, fmt)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[fmt][0],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{EXPORT_EXTENSIONS[fmt]}"'},
+    )
+
+# -------------------------------------------------------------------
+# Delta sync
+# -------------------------------------------------------------------
+@router.get("/changes")
+def list_changes(
+    since: int = Query(0, ge=0, description="Cursor from the previous call (0 = from the beginning)"),
+    limit: int = Query(500, ge=1, le=CHANGE_LOG_PAGE_MAX),
+    db: Session = Depends(get_read_db),
+) -> Dict[str, Any]:
+    """
+    CIs changed by ingest after `since`, in change order.
+
+    Returns:
+        {
+          "changes": [{"seq", "kind", "id", "op", "changed_at"}, ...],
+          "next_cursor": <pass as `since` next time>,
+          "has_more": True if another page is ready,
+          "reset": True if entries after `since` were pruned by retention;
+                   do a full resync, then continue from `next_cursor`
+        }
+    Rows that ingest found unchanged are not logged. Fetch the current
+    state of a CI with /ci/{id}?kind=<kind>.
+    """
+    return read_changes(db, since, limit)
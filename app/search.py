@@ -0,0 +1,145 @@
+"""
+Full-text search over CIs (SQLite FTS5, trigram tokenizer).
+
+Each CI table has an external-content FTS table over its text columns,
+keyed by the CI table's rowid and kept in sync by triggers, so every write
+path (bulk ingest, ORM, raw SQL) updates it in the same transaction.
+The trigram tokenizer matches any substring of 3+ characters, which also
+lets `col LIKE '%abc%'` on an FTS column use the index instead of scanning
+the CI table.
+
+devices and users have TEXT primary keys, so their rowids are implicit and
+VACUUM may renumber them: run `python -m app rebuild-search` after a VACUUM.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import column, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+MIN_TERM = 3  # shortest term the trigram index can answer
+
+
+@dataclass(frozen=True)
+class SearchTable:
+    kind: str                   # CI kind reported by /search
+    source: str                 # CI table
+    pk: str                     # CI id column
+    columns: Tuple[str, ...]    # indexed text columns
+    weights: Tuple[float, ...]  # bm25 weight per column
+
+    @property
+    def fts(self) -> str:
+        return f"{self.source}_fts"
+
+
+SEARCH_TABLES: Dict[str, SearchTable] = {
+    "device": SearchTable("device", "devices", "device_id", ("hostname", "location"), (2.0, 1.0)),
+    "user": SearchTable("user", "users", "user_id", ("name", "email"), (2.0, 1.0)),
+    "app": SearchTable("app", "apps", "app_id", ("name",), (1.0,)),
+}
+
+
+# --------------------------------------------------------------------
+# Schema (created by migration 4)
+# --------------------------------------------------------------------
+def _ddl(t: SearchTable) -> List[str]:
+    cols = ", ".join(t.columns)
+    new = ", ".join(f"new.{c}" for c in t.columns)
+    old = ", ".join(f"old.{c}" for c in t.columns)
+    delete_old = f"INSERT INTO {t.fts}({t.fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old});"
+    insert_new = f"INSERT INTO {t.fts}(rowid, {cols}) VALUES (new.rowid, {new});"
+    changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in t.columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {t.fts} USING fts5("
+        f"{cols}, content='{t.source}', content_rowid='rowid', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {t.fts}_ai AFTER INSERT ON {t.source} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {t.fts}_ad AFTER DELETE ON {t.source} BEGIN {delete_old} END",
+        # only when an indexed value changes: the ingest upsert SETs every column,
+        # so UPDATE OF alone would re-index each row whose status or checkin moved
+        f"CREATE TRIGGER IF NOT EXISTS {t.fts}_au AFTER UPDATE OF {cols} ON {t.source} "
+        f"WHEN {changed} BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def create_search_index(conn: Connection) -> None:
+    """Create the FTS tables and triggers (idempotent) and index the existing rows."""
+    for t in SEARCH_TABLES.values():
+        for stmt in _ddl(t):
+            conn.exec_driver_sql(stmt)
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn: Connection) -> None:
+    """Re-read every CI table into its FTS index."""
+    for t in SEARCH_TABLES.values():
+        conn.exec_driver_sql(f"INSERT INTO {t.fts}({t.fts}) VALUES ('rebuild')")
+
+
+# --------------------------------------------------------------------
+# Queries
+# --------------------------------------------------------------------
+def match_expression(q: str) -> Optional[str]:
+    """
+    FTS5 query for free text: every whitespace-separated term must occur
+    (as a substring), terms shorter than MIN_TERM are ignored.
+    None if no term is long enough.
+    """
+    terms = [t for t in q.split() if len(t) >= MIN_TERM]
+    if not terms:
+        return None
+    return " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def contains_rowids(kind: str, col: str, needle: str) -> TextClause:
+    """
+    SELECT of the rowids whose `col` contains `needle` (case-insensitive),
+    answered by the trigram index; use with `<table>.rowid IN (...)`.
+    Same semantics as `lower(col) LIKE '%needle%'` (needle needs MIN_TERM characters).
+    """
+    t = SEARCH_TABLES[kind]
+    if col not in t.columns:
+        raise ValueError(f"{col!r} is not indexed for {kind}")
+    return (
+        text(f"SELECT rowid FROM {t.fts} WHERE {col} LIKE :needle")
+        .bindparams(needle=f"%{needle}%")
+        .columns(column("rowid"))
+    )
+
+
+def search(db: Session, q: str, kinds: Optional[List[str]] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Best matches for `q` across CI kinds. Matches at the start of a field
+    come first, then bm25 rank (lower is better; weights favor names).
+    """
+    expr = match_expression(q)
+    if expr is None:
+        return []
+    first = q.split()[0]
+    hits: List[Dict[str, Any]] = []
+    for t in SEARCH_TABLES.values():
+        if kinds and t.kind not in kinds:
+            continue
+        weights = ", ".join(str(w) for w in t.weights)
+        cols = ", ".join(f"s.{c}" for c in t.columns)
+        prefix = " OR ".join(f"s.{c} LIKE :prefix" for c in t.columns)
+        rows = db.execute(
+            text(
+                f"SELECT s.{t.pk} AS id, {cols}, bm25({t.fts}, {weights}) AS score, ({prefix}) AS is_prefix "
+                f"FROM {t.fts} JOIN {t.source} s ON s.rowid = {t.fts}.rowid "
+                f"WHERE {t.fts} MATCH :expr ORDER BY is_prefix DESC, score LIMIT :limit"
+            ),
+            {"expr": expr, "prefix": f"{first}%", "limit": limit},
+        ).mappings()
+        for r in rows:
+            hits.append({
+                "kind": t.kind,
+                "id": r["id"],
+                "fields": {c: r[c] for c in t.columns},
+                "score": r["score"],
+                "prefix": bool(r["is_prefix"]),
+            })
+    hits.sort(key=lambda h: (not h["prefix"], h["score"]))
+    return hits[:limit]
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Smaller Modelll!! Everything else breaks my laptop sorry
@@ -9,3 +10,87 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 HF_HOME = PROJECT_ROOT / "hf-cache"
 TRANSFORMERS_CACHE = HF_HOME / "transformers"
 TRANSFORMERS_CACHE.mkdir(parents=True, exist_ok=True)
+
+# Database engine. DATABASE_URL defaults to the local SQLite file; pool settings apply to file databases.
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cmdb.sqlite3")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Read endpoints and /ask use a separate read-only engine with its own pool. For SQLite the
+# read URL defaults to DATABASE_URL opened with mode=ro; set DATABASE_READ_URL for a replica.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "10"))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", "20"))
+
+# SQLite storage profile applied to every new connection (see app/db.py SQLITE_PROFILES):
+#   "wal" (default), "durable" (WAL + synchronous=FULL) or "legacy" (SQLite's own defaults).
+# Individual PRAGMAs can be overridden, e.g. SQLITE_MMAP_SIZE=0.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "wal")
+SQLITE_PRAGMA_OVERRIDES = {
+    pragma: os.environ[f"SQLITE_{pragma.upper()}"]
+    for pragma in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout")
+    if os.getenv(f"SQLITE_{pragma.upper()}")
+}
+
+# Rows per INSERT ... ON CONFLICT statement during ingest (one executemany per chunk).
+# A failing chunk is replayed row by row, so smaller chunks make that retry cheaper.
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "500"))
+
+# /ingest/stream: records per normalize+upsert+commit round, and the longest NDJSON line accepted.
+INGEST_STREAM_BATCH = int(os.getenv("INGEST_STREAM_BATCH", "2000"))
+INGEST_STREAM_MAX_LINE_BYTES = int(os.getenv("INGEST_STREAM_MAX_LINE_BYTES", str(1 << 20)))
+
+# Background ingest jobs (/ingest/jobs): worker threads, records committed per step,
+# and how many finished jobs stay queryable before the oldest are forgotten.
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+INGEST_JOB_BATCH = int(os.getenv("INGEST_JOB_BATCH", "1000"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+INGEST_JOB_MAX_PENDING = int(os.getenv("INGEST_JOB_MAX_PENDING", "20"))  # queued+running; more -> 429
+
+# Ingest admission control: concurrent writers, requests allowed to wait for a slot (and for
+# how long) before getting 429 + Retry-After. Optional per-source rate in records/sec
+# (X-Ingest-Source header or client address; 0 disables) with a bucket of INGEST_SOURCE_BURST.
+INGEST_MAX_CONCURRENT = int(os.getenv("INGEST_MAX_CONCURRENT", "2"))
+INGEST_MAX_QUEUE = int(os.getenv("INGEST_MAX_QUEUE", "8"))
+INGEST_QUEUE_TIMEOUT_SECS = float(os.getenv("INGEST_QUEUE_TIMEOUT_SECS", "10"))
+INGEST_RETRY_AFTER_SECS = float(os.getenv("INGEST_RETRY_AFTER_SECS", "2"))
+INGEST_SOURCE_RATE = float(os.getenv("INGEST_SOURCE_RATE", "0"))
+INGEST_SOURCE_BURST = float(os.getenv("INGEST_SOURCE_BURST", "10000"))
+
+# Max distinct values memoized per rule-normalizer field helper (norm_os, parse_dt, ...).
+NORMALIZER_CACHE_SIZE = int(os.getenv("NORMALIZER_CACHE_SIZE", "4096"))
+# Batches at least this large are normalized column by column instead of record by record.
+NORMALIZER_COLUMNAR_THRESHOLD = int(os.getenv("NORMALIZER_COLUMNAR_THRESHOLD", "10000"))
+
+# Data-driven normalization rules (exact / prefix / contains per kind and field).
+NORMALIZER_RULES_PATH = Path(os.getenv("NORMALIZER_RULES_PATH", PROJECT_ROOT / "app" / "normalizers" / "rules.json"))
+NORMALIZER_RULES_RELOAD_SECS = float(os.getenv("NORMALIZER_RULES_RELOAD_SECS", "5"))
+
+# Optional model-backed stage for values the rules can't resolve (unknown OS names, unclear
+# encryption phrases). Answers are cached on disk so each distinct value is inferred once.
+NORMALIZER_AI_ENABLED = os.getenv("NORMALIZER_AI_ENABLED", "false").lower() in ("1", "true", "yes")
+NORMALIZER_AI_CACHE_PATH = Path(os.getenv("NORMALIZER_AI_CACHE_PATH", PROJECT_ROOT / "ai-normalizer-cache.json"))
+NORMALIZER_AI_MAX_VALUES = int(os.getenv("NORMALIZER_AI_MAX_VALUES", "32"))  # values per model call
+
+# Change log (GET /changes). Entries superseded by a newer one for the same CI are compacted
+# away; entries older than CHANGE_LOG_RETENTION_DAYS, or beyond the newest
+# CHANGE_LOG_MAX_ENTRIES, are pruned (consumers behind that point are told to resync).
+# The server compacts every CHANGE_LOG_COMPACT_INTERVAL_SECS (0 = only via the CLI).
+CHANGE_LOG_RETENTION_DAYS = float(os.getenv("CHANGE_LOG_RETENTION_DAYS", "30"))
+CHANGE_LOG_MAX_ENTRIES = int(os.getenv("CHANGE_LOG_MAX_ENTRIES", "1000000"))
+CHANGE_LOG_COMPACT_INTERVAL_SECS = float(os.getenv("CHANGE_LOG_COMPACT_INTERVAL_SECS", "3600"))
+CHANGE_LOG_PAGE_MAX = int(os.getenv("CHANGE_LOG_PAGE_MAX", "5000"))
+
+# In-memory response cache for the GET read endpoints, keyed by (path, query, data version).
+# Commits that write through this process bump the data version; writers in other processes
+# (e.g. `python -m app import`) are picked up once entries reach RESPONSE_CACHE_TTL_SECS
+# (0 = no expiry). RESPONSE_CACHE_MAX_ENTRIES=0 disables the cache (ETags are still sent).
+# Bodies over RESPONSE_CACHE_MAX_BODY_BYTES aren't cached; least recently used entries are
+# evicted once all cached bodies together exceed RESPONSE_CACHE_MAX_BYTES.
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BODY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BODY_BYTES", "2000000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 << 20)))
+RESPONSE_CACHE_TTL_SECS = float(os.getenv("RESPONSE_CACHE_TTL_SECS", "60"))
+
+# Bulk export (GET /export/{kind}): rows fetched from the cursor and written per chunk / Arrow batch.
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "2000"))
@@ -0,0 +1,114 @@
+"""
+Summary counters behind GET /stats.
+
+ci_stats holds one row per (kind, dimension, value) with the number of
+CIs that have that value, e.g. ("device", "os", '"macOS"', 812). The ingest
+upserts keep it current with deltas computed from the values they replace,
+so reading a breakdown costs O(groups) and nothing is ever recounted on
+the write path. Values are stored JSON-encoded so NULL, booleans and
+strings stay distinct. Writes that bypass app/repositories.py (seed
+scripts, raw SQL) aren't counted: `python -m app rebuild-stats` recounts.
+"""
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import CIStat, Device, User
+
+log = logging.getLogger(__name__)
+
+# kind -> model and the columns counted for it
+STAT_DIMENSIONS: Dict[str, Tuple[Any, Tuple[str, ...]]] = {
+    "device": (Device, ("os", "location", "encryption", "status")),
+    "user": (User, ("mfa_enabled", "status")),
+}
+
+Deltas = Counter  # (dimension, encoded value) -> change in count
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value)
+
+
+def stat_deltas(kind: str, before: Mapping[str, Optional[Mapping[str, Any]]],
+                after: Mapping[str, Mapping[str, Any]]) -> Deltas:
+    """
+    Count changes for writing `after` (ci_id -> new row) over `before`
+    (ci_id -> stored row, missing or None for new CIs).
+    """
+    dims = STAT_DIMENSIONS[kind][1]
+    deltas: Deltas = Counter()
+    for ci_id, new in after.items():
+        old = before.get(ci_id)
+        for dim in dims:
+            if old is not None:
+                if old[dim] == new[dim]:
+                    continue
+                deltas[(dim, _encode(old[dim]))] -= 1
+            deltas[(dim, _encode(new[dim]))] += 1
+    return deltas
+
+
+def apply_stat_deltas(db, kind: str, deltas: Deltas) -> None:
+    """Add `deltas` to ci_stats in one executemany upsert (in the caller's transaction)."""
+    rows = [{"kind": kind, "dimension": dim, "value": value, "count": n}
+            for (dim, value), n in deltas.items() if n]
+    if not rows:
+        return
+    stmt = sqlite_insert(CIStat.__table__)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[CIStat.kind, CIStat.dimension, CIStat.value],
+            set_={"count": CIStat.__table__.c["count"] + stmt.excluded["count"]},
+        ),
+        rows,
+    )
+
+
+def rebuild_stats(db) -> Dict[str, int]:
+    """
+    Recount every counter from the CI tables (Session or Connection; the caller commits).
+    Returns the number of groups per kind.
+    """
+    db.execute(delete(CIStat))
+    groups: Dict[str, int] = {}
+    for kind, (model, dims) in STAT_DIMENSIONS.items():
+        rows = []
+        for dim in dims:
+            col = getattr(model, dim)
+            for value, n in db.execute(select(col, func.count()).group_by(col)):
+                rows.append({"kind": kind, "dimension": dim, "value": _encode(value), "count": n})
+        if rows:
+            db.execute(sqlite_insert(CIStat.__table__), rows)
+        groups[kind] = len(rows)
+    log.info("ci_stats rebuilt: %s", groups)
+    return groups
+
+
+def read_stats(db, kinds: Iterable[str], group_by: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    {kind: {"total": n, <dimension>: [{"value", "count"}, ...]}} for each kind,
+    biggest groups first; `group_by` limits the dimensions (all by default).
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+    for kind in kinds:
+        all_dims = STAT_DIMENSIONS[kind][1]
+        dims = [d for d in all_dims if not group_by or d in group_by]
+        rows = db.execute(
+            select(CIStat.dimension, CIStat.value, CIStat.count)
+            .where(CIStat.kind == kind, CIStat.dimension.in_(sorted({*dims, all_dims[0]})), CIStat.count > 0)
+            .order_by(CIStat.dimension, CIStat.count.desc(), CIStat.value)
+        ).all()
+        by_dim: Dict[str, List[Dict[str, Any]]] = {}
+        for dim, value, n in rows:
+            by_dim.setdefault(dim, []).append({"value": json.loads(value), "count": n})
+        # every CI has exactly one value per dimension, so any dimension sums to the total
+        result: Dict[str, Any] = {"total": sum(g["count"] for g in by_dim.get(all_dims[0], []))}
+        for dim in dims:
+            result[dim] = by_dim.get(dim, [])
+        out[kind] = result
+    return out
@@ -0,0 +1,142 @@
+"""
+Read-endpoint benchmark for the secondary indexes (migration 2 in
+app/migrations.py): loads a database with --devices devices and --users
+Okta users, times each list endpoint without the indexes, applies the
+migration in place and times them again.
+
+Run from the project root:
+    python -m bench.bench_read_endpoints --devices 100000 --users 50000
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from sqlalchemy.orm import sessionmaker
+
+from app.db import get_read_db, make_engine
+from app.main import app
+from app.migrations import MIGRATIONS, run_migrations
+from app.models import Device, SchemaMigration, User, UserApp
+from app.normalizers import get_default_normalizer
+from app.repositories import update_or_insert_devices, update_or_insert_okta
+from client.gen_data import gen_hardware_record, gen_okta_user_record
+
+SECONDARY = 2  # the migration being measured
+INDEXED = (Device.__table__, User.__table__, UserApp.__table__)
+
+ENDPOINTS = [
+    ("/users?status=suspended", "User.status"),
+    ("/users?mfa=false", "User.mfa_enabled"),
+    ("/users?app=datadog", "UserApp.app_name"),
+    ("/users", "Device.assigned_user (per user)"),
+    ("/devices?status=retired", "Device.status"),
+    ("/apps?q=slack", "UserApp.app_name (per app)"),
+]
+
+
+def _load(Session, n_devices: int, n_users: int) -> None:
+    normalizer = get_default_normalizer()
+    users = []
+    for i in range(n_users):
+        rec = gen_okta_user_record()
+        rec["user_id"] = f"U_{i:07d}"
+        rec["email"] = f"user{i}@bench.example.com"  # generated names repeat; emails must not
+        rec["status"] = "SUSPENDED" if random.random() < 0.02 else "ACTIVE"
+        users.append(rec)
+    devices = []
+    for i in range(n_devices):
+        rec = gen_hardware_record()
+        rec["device_id"] = f"B-{i:07d}"
+        rec["assigned_to"] = f"U_{random.randrange(n_users):07d}"
+        devices.append(rec)
+    with Session() as db:
+        update_or_insert_okta(db, users, normalizer)
+        update_or_insert_devices(db, devices, normalizer)
+        db.commit()
+
+
+def _drop_secondary_indexes(engine) -> None:
+    """Put the database back in its pre-migration-2 state."""
+    with engine.begin() as conn:
+        for table in INDEXED:
+            for index in table.indexes:
+                index.drop(conn, checkfirst=True)
+        conn.execute(delete(SchemaMigration).where(SchemaMigration.version >= SECONDARY))
+        conn.exec_driver_sql("ANALYZE")
+
+
+def _time_endpoints(client: TestClient, repeat: int) -> dict:
+    out = {}
+    for path, _ in ENDPOINTS:
+        client.get(path).raise_for_status()  # warm the page cache
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            client.get(path).raise_for_status()
+            samples.append(time.perf_counter() - t0)
+        out[path] = statistics.median(samples) * 1000
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--devices", type=int, default=100000)
+    ap.add_argument("--users", type=int, default=50000)
+    ap.add_argument("--repeat", type=int, default=5, help="requests per endpoint (median is reported)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = make_engine(f"sqlite:///{path}")
+    run_migrations(engine, target=SECONDARY - 1)
+    Session = sessionmaker(bind=engine, autoflush=False, future=True)
+
+    def _get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_read_db] = _get_db
+    try:
+        t0 = time.perf_counter()
+        _load(Session, args.devices, args.users)
+        print(f"loaded {args.devices} devices, {args.users} users in {time.perf_counter() - t0:.1f}s")
+
+        with TestClient(app) as client:
+            _drop_secondary_indexes(engine)
+            before = _time_endpoints(client, args.repeat)
+
+            t0 = time.perf_counter()
+            applied = run_migrations(engine)
+            with engine.begin() as conn:
+                conn.exec_driver_sql("ANALYZE")
+            names = {m.version: m.name for m in MIGRATIONS}
+            print(f"applied {[names[v] for v in applied]} in {time.perf_counter() - t0:.2f}s")
+            after = _time_endpoints(client, args.repeat)
+
+        print(f"\n{'endpoint':<26} {'index':<32} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+        for p, index in ENDPOINTS:
+            print(f"{p:<26} {index:<32} {before[p]:>10.1f} {after[p]:>10.1f} {before[p] / after[p]:>7.1f}x")
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    main()
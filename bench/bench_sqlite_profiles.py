@@ -0,0 +1,135 @@
+"""
+SQLite storage-profile benchmark under mixed load: writer threads ingest
+device chunks (normalize + bulk upsert + commit) while reader threads run
+/devices-style queries. Reports write throughput, read latency and
+"database is locked" errors for each profile in app/db.py SQLITE_PROFILES.
+
+Run from the project root:
+    python -m bench.bench_sqlite_profiles --seconds 10 --writers 2 --readers 4
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.db import SQLITE_PROFILES, make_engine
+from app.migrations import run_migrations
+from app.models import Device
+from app.normalizers import get_default_normalizer
+from app.repositories import update_or_insert_devices
+from client.gen_data import gen_hardware_record
+
+
+def _records(start: int, n: int, id_space: int) -> list[dict]:
+    out = []
+    for _ in range(n):
+        rec = gen_hardware_record()
+        rec["device_id"] = f"P-{random.randrange(start, start + id_space):07d}"
+        out.append(rec)
+    return out
+
+
+def run_profile(profile: str, args) -> dict:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = make_engine(f"sqlite:///{path}", profile=profile, pool_size=args.writers + args.readers)
+    run_migrations(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, future=True)
+    normalizer = get_default_normalizer()
+
+    with Session() as db:  # start from a populated table
+        update_or_insert_devices(db, _records(0, args.rows, args.rows), normalizer)
+        db.commit()
+
+    stop = time.perf_counter() + args.seconds
+    lock = threading.Lock()
+    stats = {"written": 0, "write_errors": 0, "reads": [], "read_errors": 0}
+
+    def writer(seed: int):
+        random.seed(seed)
+        while time.perf_counter() < stop:
+            db = Session()
+            try:
+                ok, _, _ = update_or_insert_devices(db, _records(0, args.chunk, args.rows * 2), normalizer)
+                db.commit()
+                with lock:
+                    stats["written"] += ok
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    stats["write_errors"] += 1
+            finally:
+                db.close()
+
+    def reader(seed: int):
+        rnd = random.Random(seed)
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            db = Session()
+            try:
+                status = rnd.choice(["active", "retired"])
+                db.execute(select(Device).where(Device.status == status).limit(100)).all()
+                db.execute(select(func.count()).select_from(Device).where(Device.location.like("%on%"))).scalar()
+                with lock:
+                    stats["reads"].append(time.perf_counter() - t0)
+            except OperationalError:
+                with lock:
+                    stats["read_errors"] += 1
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(100 + i,)) for i in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
+
+    reads = sorted(stats["reads"]) or [0.0]
+    pct = lambda p: reads[min(len(reads) - 1, int(len(reads) * p))] * 1000
+    return {
+        "profile": profile,
+        "writes_per_sec": stats["written"] / args.seconds,
+        "write_errors": stats["write_errors"],
+        "reads_per_sec": len(stats["reads"]) / args.seconds,
+        "read_p50_ms": statistics.median(reads) * 1000,
+        "read_p95_ms": pct(0.95),
+        "read_p99_ms": pct(0.99),
+        "read_errors": stats["read_errors"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES), choices=list(SQLITE_PROFILES))
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--readers", type=int, default=4)
+    ap.add_argument("--rows", type=int, default=20000, help="devices loaded before the run")
+    ap.add_argument("--chunk", type=int, default=1000, help="records per writer commit")
+    args = ap.parse_args()
+
+    print(f"{'profile':<9} {'writes/s':>10} {'w-err':>6} {'reads/s':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'r-err':>6}")
+    for profile in args.profiles:
+        r = run_profile(profile, args)
+        print(f"{r['profile']:<9} {r['writes_per_sec']:>10.0f} {r['write_errors']:>6} {r['reads_per_sec']:>9.0f} "
+              f"{r['read_p50_ms']:>8.1f} {r['read_p95_ms']:>8.1f} {r['read_p99_ms']:>8.1f} {r['read_errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
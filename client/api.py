@@ -6,6 +6,14 @@ S = requests.Session(); S.headers.update({"Content-Type":"application/json"})
 
 def healthz():   r=S.get(f"{API}/healthz",timeout=10); r.raise_for_status(); return r.json()
 def ingest(b):   r=S.post(f"{API}/ingest",json=b,timeout=60); r.raise_for_status(); return r.json()
+def ingest_stream(lines, gz=False):
+    """POST an iterable of NDJSON lines (bytes) to /ingest/stream without building the body in memory."""
+    h={"Content-Type":"application/x-ndjson"}
+    if gz: h["Content-Encoding"]="gzip"
+    r=requests.post(f"{API}/ingest/stream",data=lines,headers=h,timeout=600); r.raise_for_status(); return r.json()
+def ingest_job(b):      r=S.post(f"{API}/ingest/jobs",json=b,timeout=60); r.raise_for_status(); return r.json()
+def ingest_job_status(job_id): r=S.get(f"{API}/ingest/jobs/{job_id}",timeout=10); r.raise_for_status(); return r.json()
+def cancel_ingest_job(job_id): r=S.delete(f"{API}/ingest/jobs/{job_id}",timeout=10); r.raise_for_status(); return r.json()
 def users(**p):  r=S.get(f"{API}/users", params=p,timeout=30); r.raise_for_status(); return r.json()
 def devices(**p):r=S.get(f"{API}/devices",params=p,timeout=30); r.raise_for_status(); return r.json()
 def ci(ci_id: str, kind: str | None = None):
@@ -17,6 +25,22 @@ def ci(ci_id: str, kind: str | None = None):
     return r.json()
 
 def apps(**p):   r=S.get(f"{API}/apps",   params=p,timeout=30); r.raise_for_status(); return r.json()
+def iter_all(path, **p):
+    """Yield every row of /users, /devices or /apps (with any filters), following X-Next-Cursor."""
+    p.setdefault("limit", 2000)
+    while True:
+        r=S.get(f"{API}/{path.strip('/')}", params=p, timeout=30); r.raise_for_status()
+        yield from r.json()
+        cursor=r.headers.get("X-Next-Cursor")
+        if not cursor: return
+        p["cursor"]=cursor
+def export(kind, path, fmt="ndjson"):
+    """Download GET /export/{kind} (users, devices, apps) to `path` chunk by chunk."""
+    with S.get(f"{API}/export/{kind}", params={"format":fmt}, stream=True, timeout=600) as r:
+        r.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in r.iter_content(chunk_size=1 << 16): f.write(chunk)
+    return path
 def ask(q,limit=100):
     r=S.post(f"{API}/ask",json={"q":q,"limit":int(limit)},timeout=90); r.raise_for_status(); return r.json()
 
@@ -190,6 +190,15 @@ with cU:
             st.success(resp)
         except Exception as e:
             st.error(e)
+    # Large files: queue them server-side instead of holding the request open
+    if up and st.button("Queue uploaded JSON as background job", key="btn_upload_job"):
+        try:
+            up.seek(0)
+            job = API.ingest_job(json.load(up))
+            st.session_state.last_job_id = job["job_id"]
+            st.success(job)
+        except Exception as e:
+            st.error(e)
 
 with cP:
     payload_text = st.text_area("Paste JSON array", height=180, key="ing_textarea",
@@ -201,3 +210,26 @@ with cP:
             st.success(resp)
         except Exception as e:
             st.error(e)
+
+st.divider()
+
+# ------------------------
+# Background ingest jobs
+# ------------------------
+st.caption("Check or cancel a background ingest job")
+job_id = st.text_input("Job id", value=st.session_state.get("last_job_id", ""), key="ing_job_id")
+cJ1, cJ2 = st.columns(2)
+with cJ1:
+    if job_id and st.button("Refresh job status", key="btn_job_status"):
+        try:
+            job = API.ingest_job_status(job_id)
+            st.progress(float(job.get("progress", 0.0)))
+            show_json(job)
+        except Exception as e:
+            st.error(e)
+with cJ2:
+    if job_id and st.button("Cancel job", key="btn_job_cancel"):
+        try:
+            show_json(API.cancel_ingest_job(job_id))
+        except Exception as e:
+            st.error(e)
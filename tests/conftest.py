@@ -1,14 +1,19 @@
 # tests/conftest.py
 import os
 import tempfile
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, text
+from sqlalchemy import event, text
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.db import Base, get_db
-from app.models import User, Device, App, UserApp
+from app.db import get_db, get_read_db, make_engine
+from app.migrations import run_migrations
+from app.models import User, Device, App, UserApp, UserGroup
+from app.registry import invalidate_app_registries
+from app.cache import response_cache
 
 
 # --- Temporary SQLite DB file for the whole test session ---
@@ -26,8 +31,8 @@ def tmp_db_url():
 
 @pytest.fixture(scope="session")
 def engine(tmp_db_url):
-    eng = create_engine(tmp_db_url, connect_args={"check_same_thread": False}, future=True)
-    Base.metadata.create_all(bind=eng)
+    eng = make_engine(tmp_db_url)
+    run_migrations(eng)
     return eng
 
 
@@ -51,6 +56,9 @@ def override_get_db(db_session):
         finally:
             pass
     app.dependency_overrides[get_db] = _get_db
+    # reads share the session so tests see their own uncommitted seed data
+    app.dependency_overrides[get_read_db] = _get_db
+    response_cache.clear()
     yield
     app.dependency_overrides.clear()
 
@@ -61,20 +69,49 @@ def client():
         yield c
 
 
+# --- SQL sent to the test database, for statement-count assertions ---
+@pytest.fixture
+def count_statements(engine):
+    """
+    `with count_statements() as statements:` collects every SQL statement run on
+    the test engine inside the block; commits are recorded as "COMMIT".
+    """
+    @contextmanager
+    def counting():
+        statements = []
+        on_execute = lambda conn, cursor, stmt, params, ctx, many: statements.append(stmt)
+        on_commit = lambda conn: statements.append("COMMIT")
+        event.listen(engine, "before_cursor_execute", on_execute)
+        event.listen(engine, "commit", on_commit)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", on_execute)
+            event.remove(engine, "commit", on_commit)
+    return counting
+
+
 # --- Utility: clear tables in FK-safe order (and reset autoincrement) ---
 def _clear_all(db):
     # child → parent order
     db.execute(text("DELETE FROM user_apps"))
+    db.execute(text("DELETE FROM user_groups"))
     db.execute(text("DELETE FROM devices"))
     db.execute(text("DELETE FROM users"))
     db.execute(text("DELETE FROM apps"))
+    db.execute(text("DELETE FROM ci_fingerprints"))
+    db.execute(text("DELETE FROM ci_stats"))
+    db.execute(text("DELETE FROM change_log"))
+    db.execute(text("DELETE FROM change_log_state"))
     # reset autoincrement for SQLite (optional but nice for predictability)
     try:
-        db.execute(text("DELETE FROM sqlite_sequence WHERE name IN ('apps')"))
+        db.execute(text("DELETE FROM sqlite_sequence WHERE name IN ('apps', 'change_log')"))
     except Exception:
         # not critical if sqlite_sequence doesn't exist
         pass
     db.commit()
+    # raw deletes bypass the in-process app registry
+    invalidate_app_registries()
 
 
 # --- The seed fixture you wanted ---
@@ -108,11 +145,13 @@ def seed_sample(db_session):
     db_session.add_all(apps)
     db_session.commit()
 
-    # 3) User ↔ App links (FK to users.user_id and apps.name)
+    # 3) User ↔ App links (FK to users.user_id and apps.name) and group memberships
     links = [
         UserApp(user_id="U001", app_name="Slack"),
         UserApp(user_id="U002", app_name="Slack"),
         UserApp(user_id="U001", app_name="Okta"),
+        UserGroup(user_id="U001", group_name="staff"),
+        UserGroup(user_id="U002", group_name="staff"),
     ]
     db_session.add_all(links)
     db_session.commit()
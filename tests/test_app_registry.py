@@ -0,0 +1,73 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app.cache import response_cache
+from app.db import make_engine
+from app.models import App, UserApp
+from app.registry import app_registry
+from app.repositories import update_or_insert_okta
+
+
+def _user(i, apps):
+    return {"user_id": f"reg_{i}", "name": f"Reg {i}", "email": f"reg{i}@example.com", "apps": apps}
+
+
+def test_known_apps_skip_the_database(client, count_statements, seed_sample):
+    def apps_statements(fn):
+        with count_statements() as seen:
+            result = fn()
+        return result, [s for s in seen if " apps" in s and "user_apps" not in s]
+
+    # the catalog is read once, on first use
+    r, stmts = apps_statements(lambda: client.post("/ingest", json=[_user(1, ["Slack"])]))
+    assert r.status_code == 200 and len(stmts) == 1 and stmts[0].startswith("SELECT")
+    r, stmts = apps_statements(lambda: client.post("/ingest", json=[_user(1, ["Slack", "Okta"])]))
+    assert r.json()["ingested"] == 1 and stmts == []
+
+    r, stmts = apps_statements(lambda: client.post("/ingest", json=[_user(2, ["Slack", "Zoom"])]))
+    assert r.json()["ingested"] == 1
+    assert len(stmts) == 1 and stmts[0].startswith("INSERT INTO apps")
+
+    # reads are answered from the registry too, after a one-row freshness check
+    # (the insert above was published on commit, so the catalog isn't reloaded)
+    r, stmts = apps_statements(lambda: client.get("/apps", params={"q": "zo"}))
+    assert [a["name"] for a in r.json()] == ["Zoom"] and len(stmts) == 1 and "count(*)" in stmts[0]
+    r, stmts = apps_statements(lambda: client.get("/ci/Zoom"))
+    assert r.json()["kind"] == "app" and r.json()["item"]["users"] == ["reg_2"] and len(stmts) == 1
+    app_id = r.json()["item"]["app_id"]
+    assert client.get(f"/ci/{app_id}", params={"kind": "app"}).json()["item"]["name"] == "Zoom"
+
+
+def test_rolled_back_apps_never_reach_the_registry(engine, seed_sample):
+    Session = sessionmaker(bind=engine, autoflush=False, future=True)
+    db = Session()
+    try:
+        update_or_insert_okta(db, [_user(3, ["Ghost"])])
+        db.rollback()
+        assert "Ghost" not in app_registry(db)
+
+        update_or_insert_okta(db, [_user(3, ["Ghost"])])
+        db.commit()
+        assert app_registry(db).get("Ghost").app_id == db.query(App).filter_by(name="Ghost").one().app_id
+    finally:
+        db.close()
+
+
+def test_apps_written_by_another_process_become_visible(client, db_session, tmp_db_url, seed_sample):
+    assert [a["name"] for a in client.get("/apps").json()] == ["Slack", "Okta"]  # registry loaded
+
+    # another process (the import CLI, another worker) has its own engine and never
+    # runs this process's commit hooks
+    other = make_engine(tmp_db_url)
+    try:
+        with other.begin() as conn:
+            conn.execute(insert(App), [{"name": "Zoom"}])
+            conn.execute(insert(UserApp), [{"user_id": "U002", "app_name": "Zoom"}])
+    finally:
+        other.dispose()
+    response_cache.clear()
+    db_session.commit()  # requests share this session here; end its read snapshot like a new request would
+
+    assert [a["name"] for a in client.get("/apps").json()] == ["Slack", "Okta", "Zoom"]
+    assert client.get("/ci/Zoom").json()["item"]["users"] == ["U002"]
+    assert [u["user_id"] for u in client.get("/users", params={"app": "zoom"}).json()] == ["U002"]
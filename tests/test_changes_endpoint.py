@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from app.changelog import compact_change_log
+from app.models import ChangeLog
+
+
+def _pull(client, since, limit=100):
+    r = client.get("/changes", params={"since": since, "limit": limit})
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_changes_are_logged_in_order_and_paged(client, seed_sample):
+    # seed_sample writes straight to the tables, so the change log starts empty
+    client.post("/ingest", json=[{"device_id": "CH-1", "hostname": "ch-1"},
+                                 {"device_id": "CH-2", "hostname": "ch-2"}])
+    client.post("/ingest", json=[{"user_id": "ch_u", "name": "Ch User", "email": "ch@example.com",
+                                  "apps": ["ChangeApp"]}])
+
+    out = _pull(client, 0)
+    assert [(c["kind"], c["id"], c["op"]) for c in out["changes"]] == [
+        ("device", "CH-1", "insert"), ("device", "CH-2", "insert"),
+        ("user", "ch_u", "insert"), ("app", "ChangeApp", "insert"),
+    ]
+    assert out["has_more"] is False and out["reset"] is False
+    cursor = out["next_cursor"]
+
+    # unchanged records are not logged; changed ones are logged as updates
+    client.post("/ingest", json=[{"device_id": "CH-1", "hostname": "ch-1"},
+                                 {"device_id": "CH-2", "hostname": "ch-2", "status": "retired"}])
+    out = _pull(client, cursor)
+    assert [(c["id"], c["op"]) for c in out["changes"]] == [("CH-2", "update")]
+    assert _pull(client, out["next_cursor"])["changes"] == []
+
+    page = _pull(client, 0, limit=2)
+    assert [c["id"] for c in page["changes"]] == ["CH-1", "CH-2"] and page["has_more"] is True
+    assert _pull(client, page["next_cursor"], limit=2)["changes"][0]["id"] == "ch_u"
+
+
+def test_compaction_keeps_latest_entry_and_flags_pruned_cursors(client, db_session, seed_sample):
+    for status in ("active", "retired", "active"):
+        client.post("/ingest", json=[{"device_id": "CP-1", "hostname": "cp", "status": status}])
+    client.post("/ingest", json=[{"device_id": "CP-2", "hostname": "cp2"}])
+
+    result = compact_change_log(db_session, retention_days=None, max_entries=None)
+    db_session.commit()
+    assert result == {"compacted": 2, "pruned": 0, "remaining": 2}
+    out = _pull(client, 0)
+    assert [(c["id"], c["op"]) for c in out["changes"]] == [("CP-1", "update"), ("CP-2", "insert")]
+
+    # age out CP-1's entry: a consumer behind it must resync
+    old = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=90)
+    db_session.execute(update(ChangeLog).where(ChangeLog.ci_id == "CP-1").values(changed_at=old))
+    assert compact_change_log(db_session, retention_days=30, max_entries=None)["pruned"] == 1
+    db_session.commit()
+    assert _pull(client, 0)["reset"] is True
+    fresh = _pull(client, 3)
+    assert fresh["reset"] is False and [c["id"] for c in fresh["changes"]] == ["CP-2"]
@@ -0,0 +1,52 @@
+import json
+
+from sqlalchemy.orm import sessionmaker
+
+from app import cli
+from app.models import Device, User, UserApp
+
+
+def test_cli_import_ndjson_and_csv(tmp_path, engine, db_session, monkeypatch, capsys):
+    monkeypatch.setattr(cli, "engine", engine)
+    monkeypatch.setattr(cli, "SessionLocal", sessionmaker(bind=engine, autoflush=False, future=True))
+
+    nd = tmp_path / "dump.ndjson"
+    nd.write_text("\n".join([
+        json.dumps({"device_id": "CLI-1", "hostname": "cli-1", "os": "Windows 11 Pro"}),
+        json.dumps({"user_id": "cli_u1", "name": "cli user", "email": "CLI1@example.com", "apps": ["Slack"]}),
+        "{broken",
+    ]) + "\n")
+    csv_file = tmp_path / "users.csv"
+    csv_file.write_text(
+        "user_id,name,email,apps,groups,mfa_enabled\n"
+        "cli_u2,csv user,cli2@example.com,Slack;Zoom,HR;IT,false\n"
+    )
+
+    assert cli.main(["import", str(nd), str(csv_file), "--workers", "1", "--chunk-size", "2"]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert (out["records"], out["ingested"], out["failed"]) == (4, 3, 1)
+
+    assert db_session.get(Device, "CLI-1").os == "Windows 11"
+    u2 = db_session.get(User, "cli_u2")
+    assert (u2.name, u2.mfa_enabled, u2.groups) == ("Csv User", False, "HR,IT")
+    apps = {ua.app_name for ua in db_session.query(UserApp).filter(UserApp.user_id == "cli_u2")}
+    assert apps == {"Slack", "Zoom"}
+
+
+def test_cli_import_counts_each_record_once_and_reports_lines(tmp_path, engine, monkeypatch, capsys):
+    monkeypatch.setattr(cli, "engine", engine)
+    monkeypatch.setattr(cli, "SessionLocal", sessionmaker(bind=engine, autoflush=False, future=True))
+
+    nd = tmp_path / "mixed.ndjson"
+    nd.write_text("\n".join([
+        json.dumps({"device_id": "CLI-OK", "hostname": "cli-ok"}),
+        json.dumps({"device_id": "CLI-BAD", "hostname": ""}),   # rejected by validation
+        "",
+        json.dumps({"something": "else"}),                      # unknown kind
+    ]) + "\n")
+
+    assert cli.main(["import", str(nd), "--workers", "1"]) == 0
+    out = json.loads(capsys.readouterr().out)
+    assert (out["records"], out["ingested"], out["failed"]) == (3, 1, 2)
+    assert sorted(e["line"] for e in out["errors"]) == [2, 4]
+    assert next(e for e in out["errors"] if e["line"] == 2)["device_id"] == "CLI-BAD"
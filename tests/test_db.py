@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db import get_db, make_engine, sqlite_pragmas
+from app.main import app
+
+
+def test_storage_profile_is_applied_on_connect(engine):
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+        assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+
+    assert sqlite_pragmas("legacy", {"synchronous": "normal"})["synchronous"] == "NORMAL"
+    with pytest.raises(ValueError):
+        sqlite_pragmas("wal", {"journal_mode": "wal; DROP TABLE users"})
+    with pytest.raises(ValueError):
+        sqlite_pragmas("fastest")
+
+
+def test_locked_database_returns_503_not_per_record_errors(client, tmp_db_url, engine):
+    impatient = make_engine(tmp_db_url, overrides={"busy_timeout": 50})
+    db = sessionmaker(bind=impatient, autoflush=False, future=True)()
+    test_db = app.dependency_overrides[get_db]
+    app.dependency_overrides[get_db] = lambda: db
+    blocker = engine.raw_connection()
+    try:
+        blocker.cursor().execute("BEGIN IMMEDIATE")  # another writer holds the lock
+        r = client.post("/ingest", json=[{"device_id": f"LK-{i}", "hostname": "lk"} for i in range(3)])
+        assert r.status_code == 503 and "Retry-After" in r.headers
+    finally:
+        app.dependency_overrides[get_db] = test_db
+        blocker.rollback()
+        blocker.close()
+        db.close()
+        impatient.dispose()
+
+    assert client.post("/ingest", json=[{"device_id": "LK-1", "hostname": "lk"}]).status_code == 200
+
+
+def test_read_engine_is_read_only(client, tmp_db_url, seed_sample, monkeypatch):
+    from app.db import get_read_db, make_read_engine
+    from app.routers import ask
+
+    ro = make_read_engine(tmp_db_url, read_url="")
+    db = sessionmaker(bind=ro, autoflush=False, future=True)()
+    app.dependency_overrides[get_read_db] = lambda: db
+    try:
+        assert client.get("/users", params={"status": "active"}).status_code == 200
+
+        # even SQL that got past the generator's guardrails can't write
+        monkeypatch.setattr(ask, "generate_sql", lambda q, limit=100: "DELETE FROM users")
+        r = client.post("/ask", json={"q": "remove everyone"})
+        assert r.status_code == 400 and "readonly" in r.json()["detail"]
+
+        monkeypatch.setattr(ask, "generate_sql", lambda q, limit=100: "SELECT COUNT(*) AS n FROM users")
+        assert client.post("/ask", json={"q": "how many users"}).json()["rows"] == [{"n": 3}]
+    finally:
+        db.close()
+        ro.dispose()
+
+
+@pytest.mark.parametrize("kind", ["device", "okta"])
+def test_locked_database_during_row_replay_is_not_a_record_error(kind, db_session, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    from app import repositories
+
+    def flaky_write(db, rows):
+        if len(rows) > 1:
+            raise ValueError("bad row somewhere in the chunk")  # forces the row-by-row replay
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    if kind == "device":
+        monkeypatch.setattr(repositories, "_write_device_chunk", flaky_write)
+        rows, _ = repositories.prepare_device_rows([{"device_id": f"RP-{i}", "hostname": "rp"} for i in range(3)])
+        upsert = repositories.upsert_device_rows
+    else:
+        monkeypatch.setattr(repositories, "_write_okta_chunk", flaky_write)
+        rows, _ = repositories.prepare_okta_rows(
+            [{"user_id": f"rp{i}", "name": "Rp", "email": f"rp{i}@example.com"} for i in range(3)])
+        upsert = repositories.upsert_okta_rows
+    with pytest.raises(OperationalError):
+        upsert(db_session, rows)
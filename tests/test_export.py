@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app.export import export_stream, negotiate_format
+
+
+def _ndjson(r):
+    return [json.loads(line) for line in r.text.splitlines()]
+
+
+def test_export_ndjson_includes_related_rows(client, seed_sample):
+    r = client.get("/export/users")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert "etag" not in r.headers  # streamed, never held by the response cache
+    users = {u["user_id"]: u for u in _ndjson(r)}
+    assert list(users) == ["U001", "U002", "U003"]
+    assert users["U001"]["apps"] == ["Okta", "Slack"]
+    assert users["U001"]["devices"] == ["D001"]
+    assert users["U003"]["apps"] == [] and users["U003"]["mfa_enabled"] is False
+
+    devices = _ndjson(client.get("/export/devices"))
+    assert devices[1]["device_id"] == "D002"
+    assert devices[1]["assigned_user_name"] == "Bob"
+
+    apps = {a["name"]: a for a in _ndjson(client.get("/export/apps"))}
+    assert apps["Slack"]["users"] == ["U001", "U002"]
+
+
+def test_export_streams_in_chunks(seed_sample, engine):
+    chunks = list(export_stream(engine, "users", "ndjson", chunk_rows=1))
+    assert [json.loads(c)["user_id"] for c in chunks] == ["U001", "U002", "U003"]
+
+    chunks = list(export_stream(engine, "apps", "csv", chunk_rows=1))
+    assert chunks[0].startswith(b"app_id,name,owner,type,users\n") and len(chunks) == 2
+
+
+def test_export_csv_by_accept_header(client, seed_sample):
+    r = client.get("/export/devices", headers={"Accept": "application/json;q=0.5, text/csv"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    assert r.headers["content-disposition"] == 'attachment; filename="devices.csv"'
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [d["device_id"] for d in rows] == ["D001", "D002"]
+    assert rows[0]["encryption"] == "true" and rows[0]["assigned_user_email"] == "alice@example.com"
+
+    r = client.get("/export/users", params={"format": "csv"}, headers={"Accept": "application/x-ndjson"})
+    assert json.loads(next(csv.DictReader(io.StringIO(r.text)))["apps"]) == ["Okta", "Slack"]
+
+
+def test_export_arrow(client, seed_sample):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        r = client.get("/export/devices", params={"format": "arrow"})
+        assert r.status_code == 406
+        # asked for by Accept alongside another type: the other type is served
+        r = client.get("/export/devices", headers={"Accept": "application/vnd.apache.arrow.stream, text/csv;q=0.5"})
+        assert r.status_code == 200 and r.headers["content-type"].startswith("text/csv")
+        return
+    r = client.get("/export/devices", headers={"Accept": "application/vnd.apache.arrow.stream"})
+    assert r.status_code == 200
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.column("device_id").to_pylist() == ["D001", "D002"]
+    assert table.schema.field("encryption").type == pa.bool_()
+
+
+def test_negotiate_format():
+    assert negotiate_format(None, None) == "ndjson"
+    assert negotiate_format(None, "*/*") == "ndjson"
+    assert negotiate_format(None, "text/*") == "csv"
+    assert negotiate_format(None, "application/x-ndjson;q=0.2, text/csv;q=0.8") == "csv"
+    assert negotiate_format("arrow", "text/csv") == "arrow"
+    assert negotiate_format(None, "application/json") == "ndjson"  # most clients' default
+    assert negotiate_format(None, "application/json, text/plain, */*") == "ndjson"
+    with pytest.raises(Exception) as e:
+        negotiate_format(None, "text/html, text/csv;q=0")
+    assert e.value.status_code == 406
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, get_admission
+from app.main import app
+
+
+@pytest.fixture
+def admission():
+    def _install(**kw):
+        ctl = AdmissionController(**{"max_concurrent": 1, "max_queue": 0, "queue_timeout": 0.2,
+                                     "retry_after": 3, "rate": 0, "burst": 0, **kw})
+        app.dependency_overrides[get_admission] = lambda: ctl
+        return ctl
+    return _install
+
+
+def _devices(prefix, n):
+    return [{"device_id": f"{prefix}-{i}", "hostname": f"{prefix.lower()}-{i}"} for i in range(n)]
+
+
+def test_full_ingest_queue_is_rejected_with_retry_after(client, admission):
+    ctl = admission()
+    ctl._active = 1  # the only slot is busy and nobody may queue
+    r = client.post("/ingest", json=_devices("AC", 1))
+    assert r.status_code == 429 and r.headers["Retry-After"] == "3"
+    r = client.post("/ingest/stream", content=b"{}", headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 429
+
+    ctl._active = 0
+    assert client.post("/ingest", json=_devices("AC", 1)).status_code == 200
+    assert ctl.stats()["active"] == 0 and ctl.stats()["rejected"] == 2
+
+
+def test_per_source_rate_limit(client, admission):
+    admission(rate=0.01, burst=2)
+    headers = {"X-Ingest-Source": "collector-a"}
+    # a batch larger than the bucket is admitted once, then the source must wait
+    assert client.post("/ingest", json=_devices("RL", 5), headers=headers).status_code == 200
+    r = client.post("/ingest", json=_devices("RL", 1), headers=headers)
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) > 60
+    assert client.post("/ingest/jobs", json=_devices("RL", 1), headers=headers).status_code == 429
+    # other sources are unaffected
+    assert client.post("/ingest", json=_devices("RL", 1), headers={"X-Ingest-Source": "b"}).status_code == 200
+
+
+def test_slots_are_handed_to_waiters_in_order():
+    async def scenario():
+        ctl = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=1, rate=0)
+        await ctl.acquire()
+        waiter = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        assert ctl.stats()["queued"] == 1
+
+        with pytest.raises(Exception) as exc:  # queue full
+            await ctl.acquire()
+        assert exc.value.status_code == 429
+
+        ctl.release()  # hands the slot to the waiter
+        await asyncio.wait_for(waiter, 1)
+        assert ctl.stats()["active"] == 1 and ctl.stats()["queued"] == 0
+
+        ctl.queue_timeout = 0.05
+        with pytest.raises(Exception) as exc:  # waits, then times out
+            await ctl.acquire()
+        assert exc.value.status_code == 429 and ctl.stats()["queued"] == 0
+        ctl.release()
+        assert ctl.stats()["active"] == 0
+
+    asyncio.run(scenario())
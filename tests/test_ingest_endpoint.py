@@ -37,3 +37,182 @@ def test_ingest_overwrite(client):
     assert r.status_code == 200
     p = r.json()
     assert p['item']["mfa_enabled"] == True
+
+def test_ingest_devices_bulk_isolates_bad_records(client):
+    payload = [
+        {"device_id": "B-001", "hostname": "bulk-1", "os": "windows 11 pro", "status": "ACTIVE"},
+        {"device_id": "B-002", "hostname": ""},                            # fails validation
+        {"device_id": "B-003", "hostname": "bulk-3", "ip_address": {"v4": "10.0.0.1"}},  # fails at write
+        {"device_id": "B-004", "hostname": "bulk-4", "encryption_status": "BitLocker Enabled"},
+        {"device_id": "B-001", "hostname": "bulk-1b", "os": "macos"},      # repeated id: last one wins
+    ]
+    r = client.post("/ingest", json=payload)
+    assert r.status_code == 200
+    out = r.json()
+    assert out["ingested"] == 3
+    assert out["failed"] == 2
+    assert {e["device_id"] for e in out["errors"]} == {"B-002", "B-003"}
+
+    d1 = client.get("/ci/B-001", params={"kind": "device"}).json()["item"]
+    assert d1["hostname"] == "bulk-1b" and d1["os"] == "macOS"
+    d4 = client.get("/ci/B-004", params={"kind": "device"}).json()["item"]
+    assert d4["encryption"] is True
+    assert client.get("/ci/B-003", params={"kind": "device"}).status_code == 404
+
+def test_ingest_okta_keeps_email_adoption_rules(client, seed_sample):
+    payload = [
+        # unknown user_id with an existing email -> adopts U001's row
+        {"user_id": "U999", "name": "alice   adams", "email": "ALICE@example.com", "apps": ["Zoom"]},
+        # known user_id whose email belongs to U003 -> U003's row wins
+        {"user_id": "U002", "name": "Bob", "email": "adam@example.com", "apps": ["Slack", "Jira"]},
+    ]
+    r = client.post("/ingest", json=payload)
+    assert r.status_code == 200
+    assert r.json()["ingested"] == 2
+
+    assert client.get("/ci/U999", params={"kind": "user"}).status_code == 404
+    alice = client.get("/ci/U001", params={"kind": "user"}).json()["item"]
+    assert alice["name"] == "Alice Adams"
+    assert sorted(alice["apps"]) == ["Okta", "Slack", "Zoom"]
+
+    adam = client.get("/ci/U003", params={"kind": "user"}).json()["item"]
+    assert adam["name"] == "Bob"
+    assert sorted(adam["apps"]) == ["Jira", "Slack"]
+    assert client.get("/ci/Jira", params={"kind": "app"}).status_code == 200
+
+
+def test_ingest_okta_statement_count_is_per_chunk(client, count_statements):
+    payload = [
+        {"user_id": f"bulk_{i}", "name": f"User {i}", "email": f"bulk{i}@example.com",
+         "apps": ["Slack", "GitHub", f"Tool{i % 7}", "Zoom"], "groups": ["Engineering"]}
+        for i in range(200)
+    ]
+    with count_statements() as statements:
+        r = client.post("/ingest", json=payload)
+    assert r.status_code == 200
+    assert r.json()["ingested"] == 200
+    # 2 identity lookups + users + apps + user_apps + user_groups + fingerprints + ci_stats
+    # + 2 change-log appends, plus at most one app-catalog load; transaction/savepoint
+    # bookkeeping not counted
+    data = [s for s in statements if not s.startswith(("BEGIN", "SAVEPOINT", "RELEASE", "COMMIT"))]
+    assert len(data) <= 11, data
+
+def test_ingest_okta_replaces_group_memberships(client):
+    user = {"user_id": "grp_1", "name": "Group User", "email": "grp1@example.com",
+            "groups": ["Admins", "HR", "Admins"]}
+    assert client.post("/ingest", json=[user]).status_code == 200
+    assert [u["user_id"] for u in client.get("/users", params={"group": "Admins"}).json()] == ["grp_1"]
+
+    assert client.post("/ingest", json=[{**user, "groups": ["HR"]}]).status_code == 200
+    assert client.get("/users", params={"group": "Admins"}).json() == []
+    members = client.get("/users", params={"group": "HR"}).json()
+    assert [(u["user_id"], u["groups"]) for u in members] == [("grp_1", "HR")]
+
+def test_ingest_mixed_payload_is_batched(client, count_statements):
+    payload = []
+    for i in range(100):
+        payload.append({"device_id": f"MX-{i}", "hostname": f"mixed-{i}", "status": "Active"})
+        payload.append({"user_id": f"mx_{i}", "name": f"Mixed {i}", "email": f"mx{i}@example.com",
+                        "apps": ["Slack"]})
+    payload.append({"device_id": "MX-bad", "hostname": "  "})
+
+    with count_statements() as statements:
+        r = client.post("/ingest", json=payload)
+    assert r.status_code == 200
+    out = r.json()
+    assert out["source"] == "mixed"
+    assert out["ingested"] == 200
+    assert out["failed"] == 1 and out["errors"][0]["device_id"] == "MX-bad"
+    assert statements.count("COMMIT") == 1
+    assert client.get("/ci/MX-42", params={"kind": "device"}).json()["item"]["status"] == "active"
+    assert client.get("/ci/mx_42", params={"kind": "user"}).json()["item"]["apps"] == ["Slack"]
+
+def test_ingest_stream_ndjson_gzip(client, monkeypatch):
+    import gzip, json
+    from app.routers import ingest as ingest_router
+
+    monkeypatch.setattr(ingest_router, "INGEST_STREAM_BATCH", 3)
+    lines = [json.dumps({"device_id": f"ST-{i}", "hostname": f"stream-{i}", "os": "MacOS"}) for i in range(7)]
+    lines.insert(2, "{not json")
+    lines.insert(5, json.dumps({"foo": "bar"}))
+    lines.append(json.dumps({"user_id": "st_1", "name": "stream user", "email": "st1@example.com"}))
+    body = gzip.compress(("\n".join(lines) + "\n\n").encode())
+
+    r = client.post("/ingest/stream", content=body,
+                    headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert out["ingested"] == 8
+    assert out["failed"] == 2
+    assert [e["line"] for e in out["errors"]] == [3, 6]
+    assert out["chunks"] == 3
+    assert client.get("/ci/ST-6", params={"kind": "device"}).json()["item"]["os"] == "macOS"
+    assert client.get("/ci/st_1", params={"kind": "user"}).json()["item"]["name"] == "Stream User"
+
+
+def test_ingest_stream_gzip_multi_member_and_truncated(client):
+    import gzip, json
+
+    lines = [json.dumps({"device_id": f"GZ-{i}", "hostname": f"gz-{i}"}) for i in range(2000)]
+    text = "\n".join(lines) + "\n"
+    cut = len(text) // 2 + 7  # the member boundary falls inside a line
+    body = gzip.compress(text[:cut].encode()) + gzip.compress(text[cut:].encode())  # cat a.gz b.gz
+    headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+
+    # sent in small pieces so members also end and start mid-chunk
+    r = client.post("/ingest/stream", content=(body[i:i + 4096] for i in range(0, len(body), 4096)),
+                    headers=headers)
+    assert r.status_code == 200, r.text
+    assert (r.json()["lines"], r.json()["ingested"], r.json()["failed"]) == (2000, 2000, 0)
+
+    r = client.post("/ingest/stream", content=gzip.compress(text.encode())[:-12], headers=headers)
+    assert r.status_code == 400 and r.json()["detail"] == "truncated gzip body"
+
+
+def test_ingest_mixed_payload_isolates_badly_typed_records(client):
+    payload = [
+        {"device_id": "TY-1", "hostname": "ty-1"},
+        {"user_id": "ty_u1", "email": 123, "name": "x"},                  # numeric email
+        {"user_id": "ty_u2", "email": "ty2@example.com", "name": "y"},
+        {"device_id": "TY-2", "hostname": "ty-2", "assigned_to": 5},      # the normalizer can't cope
+        {"device_id": 7, "hostname": "ty-3"},                             # numeric device_id
+        {"device_id": "TY-4", "hostname": "ty-4"},
+    ]
+    r = client.post("/ingest", json=payload)
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert (out["ingested"], out["failed"]) == (3, 3)
+    assert sorted(e["index"] for e in out["errors"]) == [1, 3, 4]
+    assert "email must be a string" in next(e for e in out["errors"] if e["index"] == 1)["error"]
+    assert client.get("/ci/TY-4", params={"kind": "device"}).status_code == 200
+    assert client.get("/ci/ty_u2", params={"kind": "user"}).status_code == 200
+
+    # the stream reports the same errors by line
+    import json
+    body = "\n".join(json.dumps(rec) for rec in payload[:3]) + "\n"
+    r = client.post("/ingest/stream", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 200 and [e["line"] for e in r.json()["errors"]] == [2]
+
+
+def test_ingest_stream_rejects_json_array(client):
+    r = client.post("/ingest/stream", json=[{"device_id": "x", "hostname": "y"}])
+    assert r.status_code == 415
+
+def test_ingest_skips_unchanged_records(client):
+    payload = [
+        {"device_id": "FP-1", "hostname": "fp-1", "os": "macos", "status": "active"},
+        {"device_id": "FP-2", "hostname": "fp-2", "os": "macos", "status": "active"},
+        {"user_id": "fp_u1", "name": "Fp User", "email": "fp1@example.com", "apps": ["Slack", "Zoom"]},
+    ]
+    first = client.post("/ingest", json=payload).json()
+    assert (first["ingested"], first["unchanged"]) == (3, 0)
+
+    again = client.post("/ingest", json=payload).json()
+    assert (again["ingested"], again["unchanged"]) == (3, 3)
+
+    # app order alone is not a change; a new field value is
+    payload[1]["status"] = "retired"
+    payload[2]["apps"] = ["Zoom", "Slack"]
+    third = client.post("/ingest", json=payload).json()
+    assert (third["ingested"], third["unchanged"]) == (3, 2)
+    assert client.get("/ci/FP-2", params={"kind": "device"}).json()["item"]["status"] == "retired"
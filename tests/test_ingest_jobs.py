@@ -0,0 +1,85 @@
+import time
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.jobs import IngestJobManager, get_job_manager
+
+
+@pytest.fixture
+def jobs(engine):
+    manager = IngestJobManager(sessionmaker(bind=engine, autoflush=False, future=True), workers=1, batch_size=2)
+    app.dependency_overrides[get_job_manager] = lambda: manager
+    yield manager
+    manager.shutdown(wait=True)
+
+
+def _wait(client, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        out = client.get(f"/ingest/jobs/{job_id}").json()
+        if out["status"] in ("done", "failed", "cancelled"):
+            return out
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_ingest_job_runs_in_background(client, jobs):
+    payload = [{"device_id": f"JB-{i}", "hostname": f"job-{i}"} for i in range(5)]
+    payload.append({"device_id": "JB-bad", "hostname": ""})
+    r = client.post("/ingest/jobs", json=payload)
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+
+    out = _wait(client, job_id)
+    assert out["status"] == "done"
+    assert (out["total"], out["processed"], out["progress"]) == (6, 6, 1.0)
+    assert out["ingested"] == 5 and out["failed"] == 1
+    assert client.get("/ci/JB-4", params={"kind": "device"}).status_code == 200
+    assert any(j["job_id"] == job_id for j in client.get("/ingest/jobs").json())
+
+
+def test_ingest_job_cancel_and_validation(client, jobs):
+    assert client.post("/ingest/jobs", json=[{"foo": 1}]).status_code == 400
+    assert client.get("/ingest/jobs/nope").status_code == 404
+
+    # Hold the single worker so the second job is still queued when cancelled
+    jobs._pool.submit(time.sleep, 0.3)
+    job_id = client.post("/ingest/jobs", json=[{"device_id": "JC-1", "hostname": "h"}]).json()["job_id"]
+    r = client.delete(f"/ingest/jobs/{job_id}")
+    assert r.status_code == 200
+    assert r.json()["status"] == "cancelled"
+    time.sleep(0.4)
+    assert client.get(f"/ingest/jobs/{job_id}").json()["processed"] == 0
+
+
+def test_ingest_jobs_share_the_admission_slots(client, engine):
+    from app.admission import AdmissionController
+
+    ctl = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=1, rate=0)
+    manager = IngestJobManager(sessionmaker(bind=engine, autoflush=False, future=True),
+                               workers=1, batch_size=2, admission=ctl)
+    app.dependency_overrides[get_job_manager] = lambda: manager
+    try:
+        ctl._active = 1  # an /ingest request holds the only write slot
+        job_id = client.post("/ingest/jobs", json=[{"device_id": f"JA-{i}", "hostname": "h"} for i in range(3)]).json()["job_id"]
+        time.sleep(0.2)
+        out = client.get(f"/ingest/jobs/{job_id}").json()
+        assert out["status"] == "running" and out["processed"] == 0
+        assert ctl.stats()["queued"] == 1  # the job waits in line instead of writing
+
+        ctl.release()  # the request finishes and hands its slot to the job
+        assert _wait(client, job_id)["ingested"] == 3
+        assert (ctl.stats()["active"], ctl.stats()["queued"]) == (0, 0)
+
+        # a job cancelled while waiting for a slot gives up its place in line
+        ctl._active = 1
+        job_id = client.post("/ingest/jobs", json=[{"device_id": "JA-X", "hostname": "h"}]).json()["job_id"]
+        time.sleep(0.2)
+        client.delete(f"/ingest/jobs/{job_id}")
+        out = _wait(client, job_id)
+        assert (out["status"], out["processed"]) == ("cancelled", 0)
+        assert (ctl.stats()["active"], ctl.stats()["queued"]) == (1, 0)
+    finally:
+        manager.shutdown(wait=True)
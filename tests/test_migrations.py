@@ -0,0 +1,96 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from app.db import make_engine
+from app.migrations import MIGRATIONS, applied_versions, run_migrations
+
+
+@pytest.fixture
+def old_db_url():
+    """A database as created by the code before migrations: tables but no secondary indexes."""
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    raw = create_engine(f"sqlite:///{path}")
+    with raw.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (user_id VARCHAR PRIMARY KEY, name VARCHAR, "
+                             "email VARCHAR UNIQUE, mfa_enabled BOOLEAN, last_login DATETIME, "
+                             "status VARCHAR, groups VARCHAR)")
+        conn.exec_driver_sql("CREATE TABLE devices (device_id VARCHAR PRIMARY KEY, hostname VARCHAR, "
+                             "ip_address VARCHAR, os VARCHAR, assigned_user VARCHAR, location VARCHAR, "
+                             "encryption VARCHAR, status VARCHAR, last_checkin DATETIME)")
+        conn.exec_driver_sql("INSERT INTO users (user_id, name, status, groups) "
+                             "VALUES ('u1', 'Old Row', 'active', 'HR, IT,HR')")
+    raw.dispose()
+    yield f"sqlite:///{path}"
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
+
+
+def _indexed_columns(engine, table):
+    return {tuple(ix["column_names"]) for ix in inspect(engine).get_indexes(table)}
+
+
+def test_migrations_upgrade_an_existing_database_in_place(old_db_url):
+    engine = make_engine(old_db_url)
+    try:
+        assert run_migrations(engine) == [m.version for m in MIGRATIONS]
+
+        assert {("status", "user_id"), ("mfa_enabled", "user_id")} <= _indexed_columns(engine, "users")
+        assert {("status", "device_id"), ("assigned_user",)} <= _indexed_columns(engine, "devices")
+        assert ("app_name",) in _indexed_columns(engine, "user_apps")  # table created by the baseline
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT name FROM users").scalar() == "Old Row"
+            groups = conn.exec_driver_sql("SELECT group_name FROM user_groups WHERE user_id = 'u1'").scalars()
+            assert sorted(groups) == ["HR", "IT"]  # backfilled from users.groups
+
+        assert set(applied_versions(engine)) == {m.version for m in MIGRATIONS}
+        assert run_migrations(engine) == []  # already up to date
+    finally:
+        engine.dispose()
+
+
+def test_migrations_stop_at_target(old_db_url):
+    engine = make_engine(old_db_url)
+    try:
+        assert run_migrations(engine, target=1) == [1]
+        assert ("status", "device_id") not in _indexed_columns(engine, "devices")
+        assert run_migrations(engine) == [m.version for m in MIGRATIONS if m.version > 1]
+        assert ("status", "device_id") in _indexed_columns(engine, "devices")
+    finally:
+        engine.dispose()
+
+
+def _schema(engine):
+    """Tables -> (columns, {index name: (columns, unique)}), FTS shadow tables left out."""
+    insp = inspect(engine)
+    return {
+        t: ([c["name"] for c in insp.get_columns(t)],
+            {ix["name"]: (tuple(ix["column_names"]), bool(ix["unique"])) for ix in insp.get_indexes(t)})
+        for t in insp.get_table_names() if "_fts" not in t
+    }
+
+
+def test_new_and_upgraded_databases_get_the_same_schema(old_db_url, tmp_path):
+    from app.db import Base
+
+    fresh = make_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    upgraded = make_engine(old_db_url)
+    models = create_engine("sqlite://")
+    try:
+        assert run_migrations(fresh, target=1) == [1]
+        assert ("status", "device_id") not in _indexed_columns(fresh, "devices")  # added by migration 6, not 1
+        run_migrations(fresh)
+        run_migrations(upgraded)
+        Base.metadata.create_all(models)
+
+        assert _schema(fresh) == _schema(upgraded) == _schema(models)
+    finally:
+        fresh.dispose()
+        upgraded.dispose()
+        models.dispose()
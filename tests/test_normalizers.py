@@ -0,0 +1,193 @@
+import copy
+
+from app.normalizers import NormalizerPipeline, RuleNormalizer, get_default_normalizer
+
+DEVICE = {
+    "device_id": "D-1", "hostname": "h", "os": " Windows 10 Pro ", "status": "ACTIVE",
+    "encryption_status": "FileVault Enabled", "assigned_to": "  jane   DOE ",
+    "last_checkin": "2024-06-21T08:41:00Z", "tags": ["a", "b"],
+}
+USER = {"user_id": "u1", "name": "carlos  s.", "email": " C@Example.com ", "status": "Inactive",
+        "apps": ["Slack"], "groups": ["HR"]}
+
+
+def test_normalize_batch_matches_per_record_and_keeps_input():
+    pipe = get_default_normalizer()
+    before = copy.deepcopy([DEVICE, USER])
+
+    batch = pipe.normalize_batch("device", [DEVICE])
+    assert batch == [pipe.normalize_record("device", DEVICE)]
+    assert batch[0]["os"] == "Windows 10" and batch[0]["encryption"] is True
+    assert batch[0]["assigned_user"] == "Jane Doe"
+
+    users = pipe.normalize_batch("user", [USER, USER])
+    assert users[0] == users[1] == RuleNormalizer().normalize_record("user", USER)
+    assert users[0]["email"] == "c@example.com" and users[0]["status"] == "inactive"
+    assert users[0] is not users[1]
+
+    assert [DEVICE, USER] == before
+
+
+def test_pipeline_stages_share_one_copy():
+    seen = []
+
+    class Probe:
+        def normalize_owned(self, kind, records):
+            seen.extend(id(r) for r in records)
+            return records
+
+    pipe = NormalizerPipeline([RuleNormalizer(), Probe()])
+    out = pipe.normalize_batch("device", [DEVICE])
+    assert seen == [id(out[0])]
+    assert out[0] is not DEVICE
+
+
+def test_field_helpers_are_memoized_with_stats():
+    from app.normalizers import configure_field_caches, field_cache_stats
+    from app.normalizers.rules import norm_bool_from_phrase, norm_os
+    from app.settings import NORMALIZER_CACHE_SIZE
+
+    configure_field_caches(8)  # also resets counters
+    try:
+        for _ in range(5):
+            assert norm_os("Windows 11 Enterprise") == "Windows 11"
+        assert norm_bool_from_phrase(1) is True
+        assert norm_bool_from_phrase(1.0) is None  # typed cache: 1.0 is not 1
+        assert norm_bool_from_phrase(["yes"]) is None  # unhashable values bypass the cache
+
+        stats = field_cache_stats()
+        assert stats["norm_os"]["hits"] == 4 and stats["norm_os"]["misses"] == 1
+        assert stats["norm_os"]["maxsize"] == 8 and stats["norm_os"]["hit_rate"] == 0.8
+        assert stats["norm_bool_from_phrase"]["size"] == 2
+
+        for i in range(20):
+            norm_os(f"os {i}")
+        assert field_cache_stats()["norm_os"]["size"] == 8
+    finally:
+        configure_field_caches(NORMALIZER_CACHE_SIZE)
+
+
+def test_columnar_mode_matches_per_record():
+    import random
+
+    random.seed(7)
+    stamps = ["2024-06-21T08:41:00Z", "2024-06-21T08:41:00.5+00:00", "2024-06-21 10:00:00+02:00",
+              "2024-06-21", "2024-06-21Z", "garbage", "", None,
+              "2024-13-45T00:00:00Z", "2024-02-30 10:00:00+00:00", "2024-06-21T25:61:00Z"]  # impossible dates
+    oses = ["macos", "Mac OS X", " windows 10 pro", "Windows 11", "Ubuntu 22.04", "", None]
+    phrases = ["FileVault Enabled", "disabled", "YES", "0", 1, 1.0, True, None, "maybe"]
+    names = ["  jane   doe", "JOHN SMITH", "", None]
+    devices = [{"device_id": str(i), "hostname": "h", "os": random.choice(oses),
+                "status": random.choice(["ACTIVE", "Retired", None, 3]),
+                "encryption_status": random.choice(phrases), "assigned_to": random.choice(names),
+                "last_checkin": random.choice(stamps)} for i in range(300)]
+    users = [{"user_id": str(i), "name": random.choice(names), "status": random.choice(["ACTIVE", None]),
+              "email": random.choice([" A@B.com", "x@y.io", "", None]), "last_login": random.choice(stamps)}
+             for i in range(300)]
+    for d in devices[::17]:
+        d.pop("os")  # missing keys behave like None
+
+    per_record = NormalizerPipeline([RuleNormalizer()], columnar_threshold=10**9)
+    columnar = NormalizerPipeline([RuleNormalizer()], columnar_threshold=1)
+    for kind, recs in (("device", devices), ("user", users)):
+        assert columnar.normalize_batch(kind, recs) == per_record.normalize_batch(kind, recs)
+
+
+def test_rules_file_compiles_and_hot_reloads(tmp_path):
+    import json, os
+    from app.normalizers.rules import load_rules, norm_os
+    from app.settings import NORMALIZER_RULES_PATH
+
+    path = tmp_path / "rules.json"
+    rules = {
+        "device": {"os": {"exact": {"osx": "macOS"},
+                          "prefix": {"windows": "Windows", "windows 11": "Windows 11"},
+                          "contains": [["ubuntu", "Linux"]]}},
+        "user": {"status": {"exact": {"enabled": "active"}, "default": "unknown"}},
+    }
+    path.write_text(json.dumps(rules))
+    book = load_rules(path)
+    try:
+        book.reload_secs = 0
+        rn = RuleNormalizer()
+        assert norm_os("Windows 11 Pro") == "Windows 11"          # longest prefix wins
+        assert norm_os("windows server") == "Windows"
+        assert norm_os("Server Ubuntu 22.04") == "Linux"
+        assert norm_os("Plan9") == "Plan9"                      # no match: unchanged
+        assert rn.normalize_record("user", {"status": "ENABLED"})["status"] == "active"
+        assert rn.normalize_record("user", {"status": "weird"})["status"] == "unknown"
+
+        rules["device"]["os"]["exact"]["plan9"] = "Plan 9"
+        path.write_text(json.dumps(rules))
+        os.utime(path, (1, 1))  # make sure the mtime differs from the first write
+        assert rn.normalize_record("device", {"os": "Plan9"})["os"] == "Plan 9"
+
+        path.write_text("{not json")  # a broken edit keeps the last good rules
+        os.utime(path, (2, 2))
+        assert rn.normalize_record("device", {"os": "Plan9"})["os"] == "Plan 9"
+    finally:
+        load_rules(NORMALIZER_RULES_PATH)
+
+
+def test_ai_stage_batches_unresolved_values_and_caches_answers(tmp_path):
+    from app.normalizers import AINormalizer
+    from app.normalizers.ai_stub import parse_numbered_answers
+
+    calls = []
+
+    class FakeModel:
+        def canonicalize(self, kind, field, values, examples):
+            calls.append((field, list(values)))
+            if field == "os":
+                assert "macOS" in examples
+                return ["Linux" if "ubuntu" in v.lower() else "unknown" for v in values]
+            return ["true" if "bitlocker" in v.lower() else None for v in values]
+
+    cache = tmp_path / "ai-cache.json"
+    pipe = NormalizerPipeline([RuleNormalizer(), AINormalizer(FakeModel(), cache_path=cache)])
+    devices = [
+        {"device_id": "1", "hostname": "a", "os": "Ubuntu 22.04", "encryption_status": "BitLocker on C:"},
+        {"device_id": "2", "hostname": "b", "os": "ubuntu  22.04", "encryption_status": "BitLocker on C:"},
+        {"device_id": "3", "hostname": "c", "os": "macos", "encryption_status": "yes"},
+        {"device_id": "4", "hostname": "d", "os": "Plan9", "encryption_status": "???"},
+    ]
+    out = pipe.normalize_batch("device", devices)
+
+    # only unresolved values, de-duplicated, one call per field
+    assert calls == [("os", ["Ubuntu 22.04", "Plan9"]), ("encryption", ["BitLocker on C:", "???"])]
+    assert [d["os"] for d in out] == ["Linux", "Linux", "macOS", "Plan9"]
+    assert [d["encryption"] for d in out] == [True, True, True, None]
+
+    # answers (including "don't know") persist: a new stage never asks again
+    calls.clear()
+    again = NormalizerPipeline([RuleNormalizer(), AINormalizer(FakeModel(), cache_path=cache)])
+    assert again.normalize_batch("device", devices) == out
+    assert calls == []
+
+    assert parse_numbered_answers("1: macOS\n3) Linux\nnoise\n2. unknown", 3) == ["macOS", "unknown", "Linux"]
+
+
+def test_ai_stage_does_not_serialize_batches_behind_one_inference():
+    import threading
+    from app.normalizers import AINormalizer
+
+    slow_started, release = threading.Event(), threading.Event()
+
+    class SlowModel:
+        def canonicalize(self, kind, field, values, examples):
+            if "Plan9" in values:
+                slow_started.set()
+                assert release.wait(5)
+            return ["Plan 9" if v == "Plan9" else "Haiku" for v in values]
+
+    stage = AINormalizer(SlowModel(), cache_path=None)
+    slow = threading.Thread(target=stage.normalize_record, args=("device", {"os": "Plan9"}))
+    slow.start()
+    try:
+        assert slow_started.wait(5)
+        # an unrelated value is answered while the first inference is still running
+        assert stage.normalize_record("device", {"os": "BeOS"})["os"] == "Haiku"
+    finally:
+        release.set()
+        slow.join()
+    assert stage.normalize_record("device", {"os": "Plan9"})["os"] == "Plan 9"
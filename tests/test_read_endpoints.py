@@ -4,6 +4,12 @@ def test_list_users(client, seed_sample):
     data = r.json()
     assert any(u["user_id"] == "U001" for u in data)
 
+def test_list_users_by_group(client, seed_sample):
+    r = client.get("/users", params={"group": "staff", "mfa": False})
+    assert r.status_code == 200
+    assert [u["user_id"] for u in r.json()] == ["U002"]
+    assert client.get("/users", params={"group": "Staff"}).json() == []  # exact match
+
 def test_list_devices(client, seed_sample):
     r = client.get("/devices")
     assert r.status_code == 200
@@ -32,3 +38,91 @@ def test_get_ci_app_by_name(client, seed_sample):
     r = client.get("/ci/Slack")
     assert r.status_code == 200
     assert r.json()["kind"] == "app"
+
+def test_list_endpoints_query_count_is_constant(client, seed_sample, count_statements, db_session):
+    from app.models import Device, User, UserApp
+
+    # enough extra rows that a per-row lookup would show up in the count
+    for i in range(20):
+        db_session.add(User(user_id=f"QC{i:02d}", name=f"Q {i}", email=f"qc{i}@example.com"))
+        db_session.add(UserApp(user_id=f"QC{i:02d}", app_name="Slack"))
+        db_session.add(Device(device_id=f"QD{i:02d}", hostname=f"qc{i}", assigned_user=f"QC{i:02d}"))
+    db_session.commit()
+
+    def count(path, **params):
+        with count_statements() as statements:
+            r = client.get(path, params=params)
+        assert r.status_code == 200
+        return len([s for s in statements if not s.startswith("BEGIN")]), r.json()
+
+    n_small, _ = count("/users", limit=1)
+    n_big, users = count("/users", limit=2000)
+    assert n_small == n_big <= 3  # page + apps + devices
+    assert next(u for u in users if u["user_id"] == "QC07")["devices"] == ["QD07"]
+    assert next(u for u in users if u["user_id"] == "U001")["apps"] == ["Okta", "Slack"]
+
+    n_small, _ = count("/devices", limit=1)
+    n_big, devices = count("/devices", limit=2000)
+    assert n_small == n_big <= 2  # page + assigned users
+    assert next(d for d in devices if d["device_id"] == "QD03")["assigned_user_details"]["name"] == "Q 3"
+
+    n, apps = count("/apps")
+    assert n <= 2  # one query for all user links, plus the app registry's load or freshness check
+    assert len(next(a for a in apps if a["name"] == "Slack")["users"]) == 22
+
+def test_cursor_pagination_walks_every_row_once(client, seed_sample, db_session):
+    from datetime import datetime, timedelta
+    from app.models import Device
+
+    base = datetime(2024, 1, 1)
+    for i in range(25):
+        checkin = None if i % 5 == 0 else base + timedelta(hours=i % 4)  # NULLs and ties
+        db_session.add(Device(device_id=f"PG{i:02d}", hostname=f"pg-{i % 3}", status="active",
+                              last_checkin=checkin))
+    db_session.commit()
+
+    for sort in ("device_id", "hostname", "last_checkin"):
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {"status": "active", "sort": sort, "limit": 4}
+            if cursor:
+                params["cursor"] = cursor
+            r = client.get("/devices", params=params)
+            assert r.status_code == 200
+            seen += [d["device_id"] for d in r.json()]
+            pages += 1
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert sorted(seen) == sorted(["D001", "D002"] + [f"PG{i:02d}" for i in range(25)]), sort
+        assert len(seen) == len(set(seen)) and pages == 7
+
+    r = client.get("/users", params={"limit": 2, "sort": "name"})
+    assert [u["name"] for u in r.json()] == ["Adam Smith", "Alice Adams"]
+    r = client.get("/users", params={"limit": 2, "sort": "name", "cursor": r.headers["X-Next-Cursor"]})
+    assert [u["name"] for u in r.json()] == ["Bob"] and "X-Next-Cursor" not in r.headers
+
+    r = client.get("/apps", params={"limit": 1, "sort": "name"})
+    assert [a["name"] for a in r.json()] == ["Okta"]
+    r = client.get("/apps", params={"limit": 1, "sort": "name", "cursor": r.headers["X-Next-Cursor"]})
+    assert [a["name"] for a in r.json()] == ["Slack"] and "X-Next-Cursor" not in r.headers
+
+    cursor = client.get("/devices", params={"limit": 1}).headers["X-Next-Cursor"]
+    assert client.get("/devices", params={"cursor": cursor, "sort": "hostname"}).status_code == 400
+    assert client.get("/devices", params={"cursor": "garbage!"}).status_code == 400
+    assert client.get("/devices", params={"cursor": cursor, "offset": 5}).status_code == 400
+
+    # well-formed but tampered cursors: values that don't fit the sort column are a 400, not a 500
+    from app.pagination import encode_cursor
+    for path, sort, value, pk in [
+        ("/devices", "last_checkin", "not-a-date", "D001"),
+        ("/users", "last_login", "2024-13-45T00:00:00", "U001"),
+        ("/users", "last_login", 42, "U001"),
+        ("/users", "name", None, "U001"),
+        ("/devices", "device_id", "D001", None),
+        ("/apps", "app_id", "1", "1"),
+        ("/apps", "name", "Okta", True),
+    ]:
+        tampered = encode_cursor(sort, value, pk)
+        assert client.get(path, params={"sort": sort, "cursor": tampered}).status_code == 400, (path, value, pk)
+    assert client.get("/devices", params={"sort": "ip_address"}).status_code == 422
@@ -0,0 +1,84 @@
+from app.cache import ResponseCache, CachedResponse, data_version
+
+
+def test_repeated_read_never_reaches_sqlite(client, seed_sample, count_statements):
+    first = client.get("/users", params={"limit": 1, "status": "active"})
+    assert first.status_code == 200 and first.headers["etag"]
+
+    # same query, parameters in another order
+    with count_statements() as statements:
+        again = client.get("/users", params={"status": "active", "limit": 1})
+    assert statements == []
+    assert again.json() == first.json()
+    assert again.headers["etag"] == first.headers["etag"]
+    assert again.headers["x-next-cursor"] == first.headers["x-next-cursor"]
+
+    assert client.get("/users", params={"limit": 2, "status": "inactive"}).json()[0]["user_id"] == "U003"
+    assert client.get("/ci/nope").status_code == 404  # errors pass through uncached
+    assert client.get("/ci/nope").status_code == 404
+
+
+def test_if_none_match_returns_304(client, seed_sample, count_statements):
+    etag = client.get("/devices").headers["etag"]
+
+    with count_statements() as statements:
+        r = client.get("/devices", headers={"If-None-Match": f'"x", W/{etag}'})
+    assert statements == []
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == etag
+
+    assert client.get("/devices", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_ingest_commit_invalidates(client, seed_sample):
+    before = client.get("/devices")
+    version = data_version()
+
+    dev = {"device_id": "RC-1", "hostname": "cache-host", "location": "Oslo"}
+    assert client.post("/ingest", json=[dev]).status_code == 200
+    assert data_version() > version
+
+    r = client.get("/devices", headers={"If-None-Match": before.headers["etag"]})
+    assert r.status_code == 200
+    assert "RC-1" in [d["device_id"] for d in r.json()]
+    assert r.headers["etag"] != before.headers["etag"]
+
+    # nothing changed: no new version, the cached response stays valid
+    version = data_version()
+    client.get("/devices")
+    assert data_version() == version
+
+
+def test_lru_bounds():
+    cache = ResponseCache(max_entries=2, max_body_bytes=4, ttl_secs=0)
+    entry = lambda body: CachedResponse(200, [], body, '"e"', 0.0)
+    v = data_version() + 1
+    cache.put(("/a", ""), v, entry(b"a"))
+    cache.put(("/b", ""), v, entry(b"b"))
+    assert cache.get(("/a", ""), v) is not None  # /a is now most recent
+    cache.put(("/c", ""), v, entry(b"c"))
+    assert cache.get(("/b", ""), v) is None
+    cache.put(("/big", ""), v, entry(b"too big"))
+    assert cache.get(("/big", ""), v) is None
+    cache.put(("/old", ""), v - 1, entry(b"o"))  # rendered before version v committed
+    assert cache.get(("/old", ""), v) is None
+    assert cache.get(("/a", ""), v + 1) is None  # a newer version empties the cache
+
+
+def test_lru_evicts_by_total_size():
+    cache = ResponseCache(max_entries=100, max_body_bytes=6, max_bytes=10, ttl_secs=0)
+    entry = lambda body: CachedResponse(200, [], body, '"e"', 0.0)
+    v = data_version() + 1
+    cache.put(("/a", ""), v, entry(b"aaaa"))
+    cache.put(("/b", ""), v, entry(b"bbbb"))
+    assert cache.get(("/a", ""), v) is not None  # /a is now most recent
+    cache.put(("/c", ""), v, entry(b"cccccc"))   # 14 bytes: the least recent, /b, goes
+    assert cache.get(("/b", ""), v) is None and cache.get(("/a", ""), v) is not None
+    assert cache.stats()["bytes"] == 10 and cache.stats()["entries"] == 2
+
+    cache.put(("/c", ""), v, entry(b"cc"))  # replacing an entry releases its old size: 6 bytes
+    cache.put(("/d", ""), v, entry(b"dddddd"))  # 12 bytes: /a goes
+    assert cache.get(("/a", ""), v) is None and cache.get(("/c", ""), v).body == b"cc"
+    assert cache.stats()["bytes"] == 8
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
@@ -0,0 +1,48 @@
+from sqlalchemy import text
+
+from app.search import match_expression
+
+
+def test_search_ranks_across_kinds(client, seed_sample):
+    r = client.get("/search", params={"q": "ada"})
+    assert r.status_code == 200
+    hits = [(h["kind"], h["id"]) for h in r.json()]
+    # "Adam Smith" starts with the term; "Alice Adams" only contains it
+    assert hits[:2] == [("user", "U003"), ("user", "U001")]
+
+    r = client.get("/search", params={"q": "host", "kind": "device"})
+    assert sorted(h["id"] for h in r.json()) == ["D001", "D002"]
+    assert r.json()[0]["fields"].keys() == {"hostname", "location"}
+
+    assert client.get("/search", params={"q": "slack"}).json()[0]["kind"] == "app"
+    assert client.get("/search", params={"q": 'ada" OR *'}).status_code == 200  # no FTS syntax errors
+    assert client.get("/search", params={"q": "ab"}).status_code == 422
+    assert client.get("/search", params={"q": "abc", "kind": "printer"}).status_code == 422
+
+
+def test_search_index_follows_ingest(client, seed_sample):
+    dev = {"device_id": "S-1", "hostname": "zebra-build-01", "location": "Reykjavik"}
+    assert client.post("/ingest", json=[dev]).status_code == 200
+    assert [h["id"] for h in client.get("/search", params={"q": "zebra"}).json()] == ["S-1"]
+
+    assert client.post("/ingest", json=[{**dev, "hostname": "okapi-build-01"}]).status_code == 200
+    assert client.get("/search", params={"q": "zebra"}).json() == []
+    assert [h["id"] for h in client.get("/search", params={"q": "okapi build"}).json()] == ["S-1"]
+
+
+def test_location_filter_uses_the_index(client, seed_sample, db_session):
+    client.post("/ingest", json=[{"device_id": "S-2", "hostname": "h", "location": "New York HQ"}])
+    r = client.get("/devices", params={"location": "YORK"})
+    assert [d["device_id"] for d in r.json()] == ["S-2"]
+    assert [d["device_id"] for d in client.get("/devices", params={"location": "N"}).json()] == ["D001", "S-2"]
+
+    plan = db_session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM devices_fts WHERE location LIKE '%york%'"
+    )).all()
+    assert any("VIRTUAL TABLE INDEX" in row[-1] for row in plan)
+
+
+def test_match_expression_quotes_terms():
+    assert match_expression("ab fooo") == '"fooo"'  # too short for the trigram index
+    assert match_expression('say "hi" there') == '"say" AND """hi""" AND "there"'
+    assert match_expression("a b") is None
@@ -0,0 +1,53 @@
+from sqlalchemy import text
+
+from app.stats import read_stats, rebuild_stats
+
+
+def _counts(stats, kind, dim):
+    return {g["value"]: g["count"] for g in stats[kind][dim]}
+
+
+def test_stats_follow_ingest_deltas(client, seed_sample, db_session):
+    rebuild_stats(db_session)  # the seed rows were added with the ORM, not through ingest
+    devices = [
+        {"device_id": "ST-1", "hostname": "a", "os": "MacOS", "status": "Active", "location": "SF"},
+        {"device_id": "ST-2", "hostname": "b", "os": "MacOS", "status": "Active", "location": "SF"},
+        {"device_id": "ST-3", "hostname": "c", "os": "Ubuntu 22.04", "status": "retired"},
+    ]
+    users = [{"user_id": f"st_{i}", "name": f"S {i}", "email": f"st{i}@example.com",
+              "mfa_enabled": i % 2 == 0, "status": "ACTIVE"} for i in range(3)]
+    assert client.post("/ingest", json=devices + users).status_code == 200
+
+    stats = client.get("/stats").json()
+    assert stats["device"]["total"] == 5 and stats["user"]["total"] == 6
+    assert _counts(stats, "device", "location") == {"SF": 3, "NY": 1, None: 1}
+    assert _counts(stats, "user", "mfa_enabled") == {True: 3, False: 3}
+    os_before = _counts(stats, "device", "os")
+
+    # an update moves one device between groups; a resync of unchanged rows moves nothing
+    devices[0]["status"] = "retired"
+    assert client.post("/ingest", json=devices + users).status_code == 200
+    r = client.get("/stats", params={"kind": "device", "group_by": "status"})
+    assert r.json() == {"device": {"total": 5, "status": [{"value": "active", "count": 3},
+                                                          {"value": "retired", "count": 2}]}}
+    assert _counts(client.get("/stats").json(), "device", "os") == os_before
+
+    assert client.get("/stats", params={"group_by": "mfa_enabled"}).json().keys() == {"user"}
+    assert client.get("/stats", params={"group_by": "color"}).status_code == 422
+
+
+def test_rebuild_matches_incremental_counts_and_fixes_drift(client, seed_sample, db_session):
+    rebuild_stats(db_session)
+    payload = [{"device_id": f"RB-{i}", "hostname": f"rb{i}", "os": ["MacOS", "Windows 11 Pro"][i % 2],
+                "status": "Active"} for i in range(10)]
+    payload[3] = {**payload[3], "device_id": "RB-1", "status": "retired"}  # same id twice in one batch
+    assert client.post("/ingest", json=payload).status_code == 200
+    incremental = read_stats(db_session, ["device", "user"])
+    assert incremental["device"]["total"] == 11
+
+    rebuild_stats(db_session)
+    assert read_stats(db_session, ["device", "user"]) == incremental
+
+    db_session.execute(text("DELETE FROM devices WHERE device_id = 'RB-0'"))  # behind ingest's back
+    rebuild_stats(db_session)
+    assert read_stats(db_session, ["device"])["device"]["total"] == 10